@@ -1,9 +1,14 @@
 import sys
 import os
+import argparse
 import numpy as np
 
 from utils.gui import run_gui
 from utils.database import nmlDB
+from utils.ml_export import export_ml_data_shards, load_ml_shards
+from utils.reanalyze import reanalyze_sessions, CHECKPOINT_FILE
+from utils.backup import run_backup
+from utils.version import ANALYSIS_SERVER_PORT
 
 
 def main():
@@ -13,31 +18,15 @@ def main():
 def pull_ml_data():
     db = nmlDB("nml.db")
 
-    all_classifier_list = []
-    all_data_list = []
+    # Streamed to disk shard by shard, the table never has to fit in memory
+    export_ml_data_shards(db, "ml_data_export")
 
-    all_crack = db.get_all_ml_data("CRACK")
-    for entry in all_crack:
-        after_img = np.frombuffer(entry.img, dtype=np.uint8)  # type:ignore
-        all_classifier_list.append(entry.classifier)
-        all_data_list.append(after_img)
+    for data, classifiers in load_ml_shards("ml_data_export"):
+        print(f"data shape = {data.shape}")
+        print(f"data example = {data}")
 
-    no_crack = db.get_all_ml_data("NO_CRACK")
-    for entry in no_crack:
-        after_img = np.frombuffer(entry.img, dtype=np.uint8)  # type:ignore
-        all_classifier_list.append(entry.classifier)
-        all_data_list.append(after_img)
-
-    np.save("test_data.npy", all_data_list)
-    np.save("test_classifiers.npy", all_classifier_list)
-
-    data = np.load("test_data.npy")
-    classifiers = np.load("test_classifiers.npy")
-    print(f"data shape = {data.shape}")
-    print(f"data example = {data}")
-
-    print(f"classifiers shape = {classifiers.shape}")
-    print(f"classifiers example = {classifiers}")
+        print(f"classifiers shape = {classifiers.shape}")
+        print(f"classifiers example = {classifiers}")
 
 
 def update_ml_data():
@@ -46,5 +35,45 @@ def update_ml_data():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="NML.ai")
+    parser.add_argument(
+        "--reanalyze",
+        action="store_true",
+        help="Re-score every archived image session with the current models, no GUI",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="Worker processes for --reanalyze"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=CHECKPOINT_FILE,
+        help="Progress file used to resume an interrupted --reanalyze",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run the headless analysis server that GUIs can share, no GUI",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Host for --serve")
+    parser.add_argument(
+        "--backup",
+        metavar="DEST",
+        help="Back nml.db and nml_img/ up into DEST, only copying what changed, no GUI",
+    )
+    parser.add_argument(
+        "--port", type=int, default=ANALYSIS_SERVER_PORT, help="Port for --serve"
+    )
+    args = parser.parse_args()
+
+    if args.reanalyze:
+        reanalyze_sessions(workers=args.workers, checkpoint_path=args.checkpoint)
+    elif args.backup:
+        run_backup(args.backup)
+    elif args.serve:
+        # Imported here so the GUI does not need the server
+        from utils.analysis_server import run_analysis_server
+
+        run_analysis_server(args.host, args.port)
+    else:
+        main()
     # update_ml_data()
@@ -0,0 +1,44 @@
+import json
+import base64
+import urllib.request
+from typing import Dict, Optional, Tuple, Union, Literal
+
+from utils.version import ANALYSIS_SERVER, ANALYSIS_TIMEOUT
+
+
+def analyze_image_remote(
+    img_path: str,
+    server: Optional[str] = ANALYSIS_SERVER,
+    highlight: bool = True,
+    timeout: float = ANALYSIS_TIMEOUT,
+) -> Tuple[
+    Union[Literal[0], Literal[1]], Dict[str, Tuple[str, float]], str, Dict[str, bytes]
+]:
+    """
+    Sends a raw capture to the headless analysis server. Returns the verdict, the
+    (fingerprint, crack probability) of every model that ran, the cascade path and the
+    highlighted images as encoded JPEG bytes keyed by file name suffix. Raises OSError
+    (URLError, HTTPError or a timeout) when the server cannot answer and ValueError,
+    KeyError or TypeError when its reply is truncated or malformed
+    """
+    with open(img_path, "rb") as f:
+        img_bytes = f.read()
+
+    request = urllib.request.Request(
+        f"http://{server}/analyze?highlight={int(highlight)}",
+        data=img_bytes,
+        headers={"Content-Type": "application/octet-stream"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        result = json.loads(response.read())
+
+    model_scores = {
+        model_name: (score["fingerprint"], score["crack_probability"])
+        for model_name, score in result["model_scores"].items()
+    }
+    highlights = {
+        suffix: base64.b64decode(encoded)
+        for suffix, encoded in result.get("highlights", {}).items()
+    }
+    return result["crack_detected"], model_scores, result["inference_path"], highlights
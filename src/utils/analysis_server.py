@@ -0,0 +1,204 @@
+import json
+import time
+import queue
+import base64
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+from utils.crack_detect import NMLModel, CrackDetectHighlight
+from utils.version import (
+    BETA_VERSION,
+    ANALYSIS_SERVER_PORT,
+    ANALYSIS_BATCH_SIZE,
+    ANALYSIS_BATCH_WINDOW_MS,
+)
+
+
+class AnalysisBatcher(threading.Thread):
+    """
+    Collects cropped images from every client connection and scores them together,
+    so concurrent requests share one forward pass per model
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = ANALYSIS_BATCH_SIZE,
+        batch_window_ms: int = ANALYSIS_BATCH_WINDOW_MS,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000
+        self._queue = queue.Queue()
+        self._run_flag = True
+
+    def submit(self, cropped_img: np.ndarray) -> Future:
+        future = Future()
+        self._queue.put((cropped_img, future))
+        return future
+
+    def _collect_batch(self, first_request):
+        batch = [first_request]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._run_flag = False
+                break
+            batch.append(request)
+        return batch
+
+    def run(self):
+        while self._run_flag:
+            first_request = self._queue.get()
+            if first_request is None:
+                break
+
+            batch = self._collect_batch(first_request)
+            try:
+                results = NMLModel.cascade_predict_crops([img for img, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+
+                # Score them one by one so only the request at fault fails
+                print(f"Batch of {len(batch)} failed ({e}), scoring one at a time")
+                for img, future in batch:
+                    self._score_one(img, future)
+                continue
+
+            print(f"Scored a batch of {len(batch)}")
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _score_one(self, cropped_img: np.ndarray, future: Future) -> None:
+        try:
+            future.set_result(NMLModel.cascade_predict_crops([cropped_img])[0])
+        except Exception as e:
+            future.set_exception(e)
+
+    def stop(self):
+        self._run_flag = False
+        self._queue.put(None)
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /analyze with an encoded raw capture (JPEG/PNG) as the body. Returns the verdict,
+    per model probabilities and, unless ?highlight=0, the highlighted images as base64 JPEG
+    """
+
+    server: "AnalysisServer"
+
+    def _send_json(self, status: int, body: dict) -> None:
+        encoded = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._send_json(404, {"error": "Not found"})
+            return
+        self._send_json(200, {"status": "ok", "beta_version": BETA_VERSION})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/analyze":
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        img_buffer = np.frombuffer(self.rfile.read(length), dtype=np.uint8)
+        img = cv2.imdecode(img_buffer, cv2.IMREAD_COLOR) if length else None
+        if img is None:
+            self._send_json(400, {"error": "Unable to decode image"})
+            return
+
+        # A crop cut short by a small image would fail the whole batch it lands in
+        cropped_img = NMLModel.ml_img_crop_v2(img)
+        _, _, h, w = NMLModel.ml_crop_box()
+        if cropped_img.shape[:2] != (h, w):
+            self._send_json(400, {"error": "Image is smaller than the model region"})
+            return
+
+        future = self.server.batcher.submit(cropped_img)
+        try:
+            ml_result, model_scores, inference_path = future.result()
+        except Exception as e:
+            print(f"Analysis failed: {e}")
+            self._send_json(500, {"error": f"Analysis failed: {e}"})
+            return
+
+        response = {
+            "crack_detected": ml_result,
+            "inference_path": inference_path,
+            "model_scores": {
+                model_name: {
+                    "fingerprint": fingerprint,
+                    "crack_probability": probability,
+                }
+                for model_name, (fingerprint, probability) in model_scores.items()
+            },
+        }
+
+        highlight = parse_qs(url.query).get("highlight", ["1"])[0] != "0"
+        if highlight:
+            cropped_img = CrackDetectHighlight.crop(img)
+            highlights = {"cropped": cropped_img}
+            for (
+                file_name_suffix,
+                sensitivity,
+            ) in CrackDetectHighlight.HIGHLIGHT_VARIANTS:
+                highlights[file_name_suffix] = CrackDetectHighlight.highlight_cracks(
+                    cropped_img, sensitivity
+                )
+            response["highlights"] = {
+                suffix: base64.b64encode(cv2.imencode(".jpg", highlighted)[1]).decode()
+                for suffix, highlighted in highlights.items()
+            }
+
+        self._send_json(200, response)
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, batcher: AnalysisBatcher) -> None:
+        super().__init__((host, port), AnalysisRequestHandler)
+        self.batcher = batcher
+
+
+def run_analysis_server(host: str = "127.0.0.1", port: int = ANALYSIS_SERVER_PORT):
+    """
+    Loads the models once and serves capture analysis to every GUI on this machine
+    """
+    # Warm up the models before accepting requests
+    NMLModel.get_shared("nmlModelV2")
+    if BETA_VERSION:
+        NMLModel.get_shared("nmlModelV3")
+
+    batcher = AnalysisBatcher()
+    batcher.start()
+    server = AnalysisServer(host, port, batcher)
+    print(f"Analysis server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down analysis server")
+    finally:
+        server.server_close()
+        batcher.stop()
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+from typing import Dict
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+from utils.exceptions import BackupRestarted
+from utils.version import BACKUP_MAX_RESTARTS, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+
+BACKUP_MANIFEST_FILE = "backup_manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def backup_database(
+    db_path: str,
+    dest_path: str,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    sleep: float = BACKUP_STEP_SLEEP,
+    max_restarts: int = BACKUP_MAX_RESTARTS,
+) -> None:
+    """
+    Copies a live database with SQLite's online backup API, a few pages per step so the
+    app keeps writing in between. The whole database is copied every run.
+
+    SQLite starts the copy over from the first page whenever another connection writes
+    to the database, so a busy app could keep it from ever finishing. After max_restarts
+    restarts it is copied in a single step instead, which blocks nothing in WAL
+    mode but reads the whole database at once. The copy only replaces dest_path once it
+    is complete
+    """
+    # Connecting would create an empty database and back that up
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"Database {db_path} does not exist")
+
+    tmp_path = f"{dest_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    restarts = 0
+    last_remaining = None
+
+    def between_steps(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        # Fewer pages left after every step, unless the copy started over
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise BackupRestarted(f"Backup restarted {restarts} times")
+        last_remaining = remaining
+        # SQLite only sleeps when the database is locked, pause here for the writers
+        if remaining:
+            time.sleep(sleep)
+
+    source = sqlite3.connect(db_path, timeout=5)
+    dest = sqlite3.connect(tmp_path)
+    try:
+        try:
+            source.backup(dest, pages=pages, sleep=sleep, progress=between_steps)
+        except BackupRestarted as e:
+            print(f"{e}, copying it in one step")
+            source.backup(dest, pages=-1)
+    finally:
+        dest.close()
+        source.close()
+    os.replace(tmp_path, dest_path)
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_manifest(manifest_path: str) -> Dict[str, dict]:
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_path: str, manifest: Dict[str, dict]) -> None:
+    # Write to a temporary file first so an interruption never leaves a corrupt manifest
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def backup_images(src_root: str, dest_root: str, manifest_path: str) -> int:
+    """
+    Copies the files under src_root that are new or changed since the last backup.
+    Files whose size and modification time match the manifest are skipped without being
+    read, the rest are hashed and only copied if their content changed. Files still being
+    written (*.tmp) are skipped, as are files removed while the backup runs. Returns the
+    number of files copied
+    """
+    old_manifest = load_manifest(manifest_path)
+    manifest = {}
+    copied = 0
+    finished = False
+
+    try:
+        for dir_path, _, file_names in os.walk(src_root):
+            for file_name in file_names:
+                if file_name.endswith(".tmp"):
+                    continue
+                src_path = os.path.join(dir_path, file_name)
+                rel_path = os.path.relpath(src_path, src_root)
+                dest_path = os.path.join(dest_root, rel_path)
+                try:
+                    stat = os.stat(src_path)
+
+                    entry = old_manifest.get(rel_path)
+                    backed_up = entry is not None and os.path.exists(dest_path)
+                    if (
+                        backed_up
+                        and entry["size"] == stat.st_size
+                        and entry["mtime_ns"] == stat.st_mtime_ns
+                    ):
+                        manifest[rel_path] = entry
+                        continue
+
+                    digest = file_digest(src_path)
+                    if not backed_up or entry["sha256"] != digest:
+                        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                        tmp_path = f"{dest_path}.tmp"
+                        shutil.copy2(src_path, tmp_path)
+                        os.replace(tmp_path, dest_path)
+                        copied += 1
+                except FileNotFoundError:
+                    # Renamed or deleted since it was listed
+                    continue
+
+                manifest[rel_path] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": digest,
+                }
+        finished = True
+    finally:
+        # Whatever was copied does not have to be copied again by the next run, files not
+        # reached yet keep their old entries
+        save_manifest(
+            manifest_path, manifest if finished else {**old_manifest, **manifest}
+        )
+    return copied
+
+
+def run_backup(
+    dest_dir: str, db_path: str = "nml.db", img_root: str = "nml_img"
+) -> None:
+    """
+    Backs up the database and the image folder into dest_dir
+    """
+    start_time = time.time()
+    os.makedirs(dest_dir, exist_ok=True)
+
+    backup_database(db_path, os.path.join(dest_dir, os.path.basename(db_path)))
+    copied = 0
+    if os.path.isdir(img_root):
+        copied = backup_images(
+            img_root,
+            os.path.join(dest_dir, os.path.basename(os.path.normpath(img_root))),
+            os.path.join(dest_dir, BACKUP_MANIFEST_FILE),
+        )
+
+    print(
+        f"Backup to {dest_dir} done in {time.time() - start_time:.1f}s, {copied} files copied"
+    )
+
+
+class BackupSignals(QObject):
+    finished = pyqtSignal()
+
+
+class BackupTask(QRunnable):
+    """
+    Runs a backup on a thread pool, off the GUI and camera threads
+    """
+
+    def __init__(
+        self, dest_dir: str, db_path: str = "nml.db", img_root: str = "nml_img"
+    ):
+        super().__init__()
+        self.dest_dir = dest_dir
+        self.db_path = db_path
+        self.img_root = img_root
+        self.signals = BackupSignals()
+
+    def run(self):
+        try:
+            run_backup(self.dest_dir, self.db_path, self.img_root)
+        except Exception as e:
+            print(f"Backup failed: {e}")
+        self.signals.finished.emit()
@@ -1,12 +1,19 @@
 import os
 import cv2
+from collections import deque
 from PyQt5.QtCore import QThread, pyqtSignal
 import numpy as np
 from typing import Optional
 
 from utils.exceptions import VideoNotOpened
 from utils.database import nmlDB
-from utils.version import BETA_VERSION, CAMERA_PORT
+from utils.quality import assess_capture_quality, crop_roi
+from utils.version import (
+    BETA_VERSION,
+    CAMERA_PORT,
+    CAPTURE_QUALITY_GATE,
+    TEMPORAL_INFERENCE_FRAMES,
+)
 
 # from utils.crack_detect import NMLModel
 
@@ -16,6 +23,7 @@ class VideoThread(QThread):
     error_image_signal = pyqtSignal(str)
     camera_available_signal = pyqtSignal(bool)
     capture_complete_signal = pyqtSignal(bool)
+    capture_rejected_signal = pyqtSignal(str)
 
     def __init__(self, user_uuid: str, database: nmlDB):
         super().__init__()
@@ -34,9 +42,18 @@ class VideoThread(QThread):
 
         self.internal_ml_img_counter = 0
 
+        # Model regions of the latest preview frames, scored together at capture time
+        self.recent_rois = deque(maxlen=max(TEMPORAL_INFERENCE_FRAMES, 1))
+
+        # PanoramaThread fed with every frame while a panorama is being recorded
+        self.panorama_thread = None
+
     def set_user(self, user_uuid) -> None:
         self.USER_UUID = user_uuid
 
+    def set_panorama_thread(self, panorama_thread) -> None:
+        self.panorama_thread = panorama_thread
+
     # def record_toggle(self) -> None:
     #     # TODO Dont think this is the right way to do it, maybe need to set up signal and slot
     #     if self._record_flag:
@@ -67,8 +84,9 @@ class VideoThread(QThread):
 
     def init_capture_image(self, image_name) -> int:
         self._DATABASE.check_set_filepath(self.USER_UUID)
+        # The row is committed by the writer thread, capturing does not wait on the disk
         self.image_session_id = self._DATABASE.insert_new_image_session(
-            self.USER_UUID, image_name
+            self.USER_UUID, image_name, wait=False
         )
         self._capture_flag = True
         return self.image_session_id
@@ -81,6 +99,14 @@ class VideoThread(QThread):
         )
         cv2.imwrite(img_path, video_frame)
 
+    def _save_recent_rois(self):
+        frames_path = os.path.join(
+            self._DATABASE.get_base_filepath(self.USER_UUID),
+            "raw",
+            f"{self.image_session_id}-frames.npy",
+        )
+        np.save(frames_path, np.stack(self.recent_rois))
+
     def _video_close(self) -> None:
         self.video.release()
         # TODO error on ubuntu with this
@@ -130,11 +156,37 @@ class VideoThread(QThread):
             # if self._record_flag:
             #     self.video_writer.write(frame)
 
+            # Read once, the GUI thread may clear it at any time
+            panorama_thread = self.panorama_thread
+            if panorama_thread is not None:
+                # Dropped instead of waiting when the stitcher is behind
+                panorama_thread.offer(frame)
+
+            if TEMPORAL_INFERENCE_FRAMES > 1:
+                # Only the small model region is copied, never the whole frame
+                self.recent_rois.append(np.array(crop_roi(frame)))
+
             # Capture the current image to file
             if self._capture_flag:
                 # TODO UNCOMMENT FOR NORMAL FUNCTIONALITY
                 self._capture_flag = False
+
+                # Ask for a retake instead of analyzing a blurry or badly exposed frame
+                if CAPTURE_QUALITY_GATE:
+                    quality = assess_capture_quality(frame)
+                    print(quality)
+                    if not quality.passed:
+                        self._DATABASE.delete_img_session(
+                            self.image_session_id, wait=False
+                        )
+                        self.capture_rejected_signal.emit(", ".join(quality.reasons))
+                        self.change_image_signal.emit(frame)
+                        continue
+
                 self._save_image(frame)
+                if TEMPORAL_INFERENCE_FRAMES > 1:
+                    # Saved before capture_complete_signal, the analysis reads it
+                    self._save_recent_rois()
 
                 # # TODO FOR ML DATA CAPTURE REMOVE AFTER
                 # if self.internal_ml_img_counter >= 10:
@@ -1,5 +1,7 @@
 import os
-from typing import Tuple, Any, Union, Literal
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Any, Union, Literal
 
 import cv2
 import keras
@@ -9,82 +11,217 @@ from time import time
 from PyQt5.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot, QThread
 
 from utils.database import nmlDB
-from utils.version import BETA_VERSION
+from utils.analysis_client import analyze_image_remote
+from utils.quality import roi_box
+from utils.temporal import aggregate_cascade_results
+from utils.version import (
+    BETA_VERSION,
+    CASCADE_UNCERTAINTY_BAND,
+    ANALYSIS_SERVER,
+    TEMPORAL_AGGREGATION,
+)
+
+# Models loaded once per process and shared between worker threads
+_shared_models = {}
+_shared_models_lock = threading.Lock()
 
 
 class NMLModel:
-    def __init__(self, model_name: str, data_base: nmlDB) -> None:
+    def __init__(self, model_name: str, data_base: Optional[nmlDB] = None) -> None:
         self._database = data_base
+        self.model_name = model_name
 
         self.crack_detect_model = keras.models.load_model(model_name)
         if not self.crack_detect_model:
             raise Exception("Model not found")
+        self.fingerprint = self.get_model_fingerprint(model_name)
         # print(self.crack_detect_model.summary())
 
     def predict(self, img_path: str, resize=False) -> Union[Literal[0], Literal[1]]:
+        if self.predict_proba(img_path, resize=resize) > 0.5:
+            return 1
+        else:
+            return 0
+
+    def predict_proba(self, img_path: str, resize=False) -> float:
+        """
+        Returns the probability of the image containing a crack instead of
+        collapsing the model output into a 0/1 answer
+        """
         cropped_img = self.ml_img_crop(img_path)
+        return float(self.predict_proba_batch([cropped_img], resize=resize)[0])
 
+    def predict_proba_batch(
+        self, cropped_imgs: List[np.ndarray], resize=False
+    ) -> np.ndarray:
+        """
+        Scores several cropped images with a single forward pass of the model
+        """
+        batch = np.array([self.preprocess(img, resize) for img in cropped_imgs])
+
+        # prediction = self.crack_detect_model.predict(batch)  # type: ignore
+        prediction = np.asarray(self.crack_detect_model(batch))  # type: ignore
+
+        print(prediction)
+        # Two class softmax output is [no crack, crack], single output is sigmoid
+        if prediction.shape[-1] > 1:
+            return prediction[:, 1]
+        return prediction[:, 0]
+
+    @classmethod
+    def preprocess(cls, cropped_img: np.ndarray, resize=False) -> np.ndarray:
         if resize:
-            print("Original Dimensions : ", cropped_img.shape)
+            # v2 model was trained on 158x158 images
             dim = (158, 158)
-
-            # resize image
             cropped_img = cv2.resize(cropped_img, dim, interpolation=cv2.INTER_AREA)
 
-            print("Resized Dimensions : ", cropped_img.shape)
+        # flatten and reduce img to pass into model, only the first channel is used
+        reduced_img = cropped_img[:, :, 0] if cropped_img.ndim == 3 else cropped_img
+        reduced_img = reduced_img.flatten()
 
-            # cv2.imshow("Resized image", resized)
-            # cv2.waitKey(0)
+        # Normalize data as this is what the model was trained with
+        return reduced_img.astype(float) / 255
 
-        # flatten and reduce img to pass into model
-        reduced_img = []
-        for row in cropped_img:
-            reduced = []
-            for col in row:
-                reduced.append(col[0])
-            reduced_img.append(reduced)
-        reduced_img = np.array(reduced_img).flatten()
+    @classmethod
+    def get_shared(cls, model_name: str) -> "NMLModel":
+        """
+        Returns a model that is loaded only once per process, instead of reloading it from
+        disk for every capture
+        """
+        with _shared_models_lock:
+            if model_name not in _shared_models:
+                _shared_models[model_name] = cls(model_name)
+            return _shared_models[model_name]
 
-        # Normalize data as this is what the model was trained with
-        reduced_img = reduced_img.astype(float) / 255
+    @classmethod
+    def cascade_predict(
+        cls, raw_img_path: str
+    ) -> Tuple[Union[Literal[0], Literal[1]], Dict[str, Tuple[str, float]], str]:
+        """
+        Runs the model cascade on a single raw image, see cascade_predict_crops
+        """
+        return cls.cascade_predict_crops([cls.ml_img_crop(raw_img_path)])[0]
 
-        reduced_img = np.array([reduced_img])
+    @classmethod
+    def temporal_predict(
+        cls, cropped_imgs: List[np.ndarray], aggregation: str = TEMPORAL_AGGREGATION
+    ) -> Tuple[Union[Literal[0], Literal[1]], Dict[str, Tuple[str, float]], str, float]:
+        """
+        Runs the model cascade over several frames of the same tooth as one batch and
+        combines them into one verdict, see aggregate_cascade_results
+        """
+        return aggregate_cascade_results(
+            cls.cascade_predict_crops(list(cropped_imgs)), aggregation
+        )
+
+    @classmethod
+    def session_predict(cls, raw_img_path: str) -> Tuple[
+        Union[Literal[0], Literal[1]],
+        Dict[str, Tuple[str, float]],
+        str,
+        Optional[float],
+    ]:
+        """
+        Uses the preview frames saved with the capture when there are any, otherwise the
+        raw image alone. The confidence is only known for frames, see temporal_predict
+        """
+        frames_path = cls.get_frames_path(raw_img_path)
+        if not os.path.isfile(frames_path):
+            return (*cls.cascade_predict(raw_img_path), None)
 
-        # prediction = self.crack_detect_model.predict(reduced_img)[0]  # type: ignore
-        prediction = self.crack_detect_model(reduced_img)[0]  # type: ignore
+        ml_result, model_scores, inference_path, confidence = cls.temporal_predict(
+            np.load(frames_path)
+        )
+        print(f"{inference_path} verdict confidence {confidence:.0%}")
+        return ml_result, model_scores, inference_path, confidence
 
-        print(prediction)
-        if np.argmax(prediction):
-            return 1
-        else:
-            return 0
+    @classmethod
+    def get_frames_path(cls, raw_img_path: str) -> str:
+        return f"{os.path.splitext(raw_img_path)[0]}-frames.npy"
+
+    @classmethod
+    def cascade_predict_crops(
+        cls, cropped_imgs: List[np.ndarray]
+    ) -> List[Tuple[Union[Literal[0], Literal[1]], Dict[str, Tuple[str, float]], str]]:
+        """
+        Runs the cheap v2 model (158x158) first and only escalates to the v3 model (325x325)
+        when the v2 crack probability falls inside CASCADE_UNCERTAINTY_BAND. Escalated captures
+        use the same rule as running both models, a crack from either model is a crack.
+
+        Every model runs once over the whole batch. Returns, per image, the verdict, the
+        (fingerprint, crack probability) of every model that ran and the path that was taken
+        """
+        if not BETA_VERSION:
+            model = cls.get_shared("nmlModelV2")
+            return [
+                (
+                    1 if probability > 0.5 else 0,
+                    {"nmlModelV2": (model.fingerprint, float(probability))},
+                    "v2",
+                )
+                for probability in model.predict_proba_batch(cropped_imgs)
+            ]
+
+        low, high = CASCADE_UNCERTAINTY_BAND
+
+        # v3 model uses 325x325 while v2 model uses 158x158, resize img to use in v2 prediction
+        model_v2 = cls.get_shared("nmlModelV2")
+        v2_probabilities = model_v2.predict_proba_batch(cropped_imgs, resize=True)
+        print(f"v2 model crack probabilities = {v2_probabilities}")
+
+        uncertain = [i for i, p in enumerate(v2_probabilities) if low < p < high]
+        v3_probabilities = {}
+        if uncertain:
+            model_v3 = cls.get_shared("nmlModelV3")
+            escalated = model_v3.predict_proba_batch(
+                [cropped_imgs[i] for i in uncertain]
+            )
+            print(f"v3 model crack probabilities = {escalated}")
+            v3_probabilities = dict(zip(uncertain, escalated))
+
+        results = []
+        for i, v2_probability in enumerate(v2_probabilities):
+            model_scores = {"nmlModelV2": (model_v2.fingerprint, float(v2_probability))}
+            if i not in v3_probabilities:
+                results.append((1 if v2_probability >= high else 0, model_scores, "v2"))
+                continue
+
+            v3_probability = float(v3_probabilities[i])
+            model_scores["nmlModelV3"] = (model_v3.fingerprint, v3_probability)
+            if v2_probability > 0.5 or v3_probability > 0.5:
+                results.append((1, model_scores, "v2->v3"))
+            else:
+                results.append((0, model_scores, "v2->v3"))
+
+        print(f"Cascade paths = {[path for _, _, path in results]}")
+        return results
+
+    @classmethod
+    def get_model_fingerprint(cls, model_name: str) -> str:
+        """
+        Short hash identifying the exact weights of a saved model, so stored scores can be
+        traced back to the model that produced them
+        """
+        fingerprint_path = os.path.join(model_name, "fingerprint.pb")
+        if not os.path.isfile(fingerprint_path):
+            fingerprint_path = os.path.join(model_name, "saved_model.pb")
+
+        with open(fingerprint_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+
+    @classmethod
+    def ml_crop_box(cls) -> Tuple[int, int, int, int]:
+        """(y, x, h, w) of the region the models look at"""
+        return roi_box(BETA_VERSION)
 
     @classmethod
     def ml_img_crop(cls, img_path: str) -> np.ndarray:
         img = cv2.imread(img_path)
-        y = 245  # Starting at top
-        x = 187  # Starting at left
-        h = 158  # Height
-        w = 158  # Width
-        if BETA_VERSION:
-            y = 815  # Starting at top
-            x = 445  # Starting at left
-            h = 325  # Height
-            w = 325  # Width
-        crop = img[y : y + h, x : x + w]
-        return crop
+        return cls.ml_img_crop_v2(img)
 
     @classmethod
     def ml_img_crop_v2(cls, img: np.ndarray) -> np.ndarray:
-        y = 245  # Starting at top
-        x = 187  # Starting at left
-        h = 158  # Height
-        w = 158  # Width
-        if BETA_VERSION:
-            y = 815  # Starting at top
-            x = 445  # Starting at left
-            h = 325  # Height
-            w = 325  # Width
+        y, x, h, w = cls.ml_crop_box()
         crop = img[y : y + h, x : x + w]
         return crop
 
@@ -115,36 +252,53 @@ class NMLModel:
     @classmethod
     def get_data_for_ml_v2(cls, img_array, db: nmlDB):
         croped_img_arr = cls.ml_img_crop_v2(img_array)
-        reduced_img = []
 
         # print(f"in ml = {croped_img_arr}")
         cv2.imshow("cropped img", croped_img_arr)
         cv2.waitKey(0)
 
-        reduced_img = np.array(croped_img_arr)
-        reduced_img = reduced_img.tobytes()
-
-        db.insert_ml_data(reduced_img, 1)
+        # Stored with its shape, crop box and model version so it can be read back as is
+        db.insert_ml_data(
+            np.array(croped_img_arr),
+            1,
+            compress=True,
+            crop=",".join(str(value) for value in cls.ml_crop_box()),
+            version="v3" if BETA_VERSION else "v2",
+        )
         db.get_ml_data_len()
 
-        # last_entry = np.frombuffer(db.get_all_ml_data()[-1].img, dtype=np.uint8)  # type: ignore
+        # last_entry = db.get_all_ml_data()[-1].get_img_array()
         # print(last_entry.shape)
 
 
 class CrackDetectHighlightSignals(QObject):
+    # Session ids are sent as str, they do not fit a C++ int
+    verdict_ready = pyqtSignal(str)
+    # (session id, "cropped" or a highlight variant) once the image is on disk
+    image_ready = pyqtSignal(str, str)
     finished = pyqtSignal(str)
 
 
 class CrackDetectHighlight(QRunnable):
+    # (file name suffix, canny threshold) of every highlighted image saved per session
+    # increasing the threshold makes the algorithm less sensitive, (less highlights)
+    # "normal" first, it is the one shown when a crack is found
+    HIGHLIGHT_VARIANTS = (("normal", 6), ("precise", 10))  # 20 and 40 original
+
     def __init__(self, database: nmlDB, img_session_id: int, user_uuid: str):
         super().__init__()
-        # Need to do this as db session will fail if called multiple times
-        self._database = nmlDB("nml.db")
+        # nmlDB hands every worker thread its own session from the shared pool
+        self._database = database
         self.image_session_id = img_session_id
         self.user_uuid = user_uuid
         self.signals = CrackDetectHighlightSignals()
         self.continueThread = True
 
+        # Filled in by the model run, (fingerprint, crack probability) per model and which models ran
+        self.model_scores = {}
+        self.inference_path = ""
+        self.confidence: Optional[float] = None
+
     @classmethod
     def crop(cls, img):
         y = 257  # Starting at top
@@ -163,9 +317,26 @@ class CrackDetectHighlight(QRunnable):
 
         return crop
 
-    def crack_detect_method_1(
-        self, bilateral_filter_sensitivity: int, file_name_suffix: str
-    ):
+    @classmethod
+    def get_raw_img_path(cls, user_uuid: str, image_session_id: int) -> str:
+        return os.path.join(
+            nmlDB.get_base_filepath(user_uuid), "raw", f"{image_session_id}.jpg"
+        )
+
+    @classmethod
+    def get_completed_img_path(
+        cls, user_uuid: str, image_session_id: int, file_name_suffix: str
+    ) -> str:
+        return os.path.join(
+            nmlDB.get_base_filepath(user_uuid),
+            "complete",
+            f"{image_session_id}-{file_name_suffix}.jpg",
+        )
+
+    @classmethod
+    def highlight_cracks(
+        cls, cropped_img: np.ndarray, bilateral_filter_sensitivity: int
+    ) -> np.ndarray:
         """
         Algo from https://github.com/shomnathsomu/crack-detection-opencv
         1. read image
@@ -177,26 +348,6 @@ class CrackDetectHighlight(QRunnable):
             - Morphological closing operator
             - Feature extraction
         """
-
-        print("Running crack detection...")
-
-        raw_img_path = os.path.join(
-            self._database.get_base_filepath(self.user_uuid),
-            "raw",
-            f"{self.image_session_id}.jpg",
-        )
-        completed_img_path = os.path.join(
-            self._database.get_base_filepath(self.user_uuid),
-            "complete",
-            f"{self.image_session_id}-{file_name_suffix}.jpg",
-        )
-
-        # Get absolute path of session_id, which is the image
-        src = cv2.imread(raw_img_path)
-
-        # Crop the image to hone in on the tooth
-        cropped_img = self.crop(src)
-
         blur = cv2.GaussianBlur(cropped_img, (11, 11), 0)
 
         # Apply logarithmic transform
@@ -231,80 +382,123 @@ class CrackDetectHighlight(QRunnable):
         result[np.where((result == [255, 255, 255]).all(axis=2))] = [0, 0, 255]
 
         # Overlay detected cracks onto original image
-        final_image = cv2.addWeighted(cropped_img, 0.6, result, 1, 0)
-        cv2.imwrite(completed_img_path, final_image)
+        return cv2.addWeighted(cropped_img, 0.6, result, 1, 0)
 
-        print("Finished crack detection!")
+    @classmethod
+    def write_completed_img(cls, completed_img_path: str, img_bytes: bytes) -> None:
+        # Readers only ever see a missing or a complete file, never a half written one
+        tmp_path = f"{completed_img_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(img_bytes)
+            os.replace(tmp_path, completed_img_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
-    def cropped_image_save(self):
+    @classmethod
+    def save_all_highlights(
+        cls,
+        user_uuid: str,
+        image_session_id: int,
+        image_saved: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """
+        Reads and crops the raw image once, then saves the plain cropped image and every
+        highlight variant to the complete folder. image_saved is called with the file name
+        suffix as soon as each image is written
+        """
+        src = cv2.imread(cls.get_raw_img_path(user_uuid, image_session_id))
 
-        raw_img_path = os.path.join(
-            self._database.get_base_filepath(self.user_uuid),
-            "raw",
-            f"{self.image_session_id}.jpg",
+        # Crop the image to hone in on the tooth, it is ready before any highlight
+        cropped_img = cls.crop(src)
+        cls.write_completed_img(
+            cls.get_completed_img_path(user_uuid, image_session_id, "cropped"),
+            cv2.imencode(".jpg", cropped_img)[1].tobytes(),
         )
-        completed_img_path = os.path.join(
-            self._database.get_base_filepath(self.user_uuid),
-            "complete",
-            f"{self.image_session_id}-cropped.jpg",
-        )
-
-        # Get absolute path of session_id, which is the image
-        src = cv2.imread(raw_img_path)
-
-        # Crop the image to hone in on the tooth
-        cropped_img = self.crop(src)
-        cv2.imwrite(completed_img_path, cropped_img)
+        if image_saved is not None:
+            image_saved("cropped")
+
+        for file_name_suffix, sensitivity in cls.HIGHLIGHT_VARIANTS:
+            print(f"Running {file_name_suffix} crack detection...")
+            highlighted_img = cls.highlight_cracks(cropped_img, sensitivity)
+            cls.write_completed_img(
+                cls.get_completed_img_path(
+                    user_uuid, image_session_id, file_name_suffix
+                ),
+                cv2.imencode(".jpg", highlighted_img)[1].tobytes(),
+            )
+            if image_saved is not None:
+                image_saved(file_name_suffix)
+        print("Finished crack detection!")
 
     @pyqtSlot()
     def run(self):
-
-        # TODO: determine if we can pass and share the model between worker threads or each thread loads their own
-        raw_img_path = os.path.join(
-            self._database.get_base_filepath(self.user_uuid),
-            "raw",
-            f"{self.image_session_id}.jpg",
-        )
-        completed_img_path = os.path.join(
-            self._database.get_base_filepath(self.user_uuid),
-            "complete",
-            f"{self.image_session_id}.jpg",
-        )
-
-        model_predictions = []
-        # load model
-        if BETA_VERSION:
-            # Resize img to use in v2 prediction
-            # v3 model uses 325x325 while v2 model uses 158x158
-            # Use old model and new model to predict crack
-            model_v2 = NMLModel("nmlModelV2", self._database)
-            ml_result = model_v2.predict(raw_img_path, resize=True)
-            print(f"v2 model predict = {ml_result}")
-            model_predictions.append(ml_result)
-
-            model_v3 = NMLModel("nmlModelV3", self._database)
-            ml_result = model_v3.predict(raw_img_path)
-            print(f"v3 model predict = {ml_result}")
-            model_predictions.append(ml_result)
-
+        raw_img_path = self.get_raw_img_path(self.user_uuid, self.image_session_id)
+
+        highlights = {}
+        remote_result = None
+        # The server only gets the captured image, saved preview frames are scored here
+        frames_saved = os.path.isfile(NMLModel.get_frames_path(raw_img_path))
+        if ANALYSIS_SERVER and not frames_saved:
+            # The shared analysis server also returns the highlighted images
+            try:
+                remote_result = analyze_image_remote(raw_img_path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Unreachable, timed out or a malformed reply, analyze the capture here
+                print(f"Analysis server unavailable ({e!r}), analyzing locally")
+
+        if remote_result is not None:
+            (
+                ml_result,
+                self.model_scores,
+                self.inference_path,
+                highlights,
+            ) = remote_result
         else:
-            model = NMLModel("nmlModelV2", self._database)
-            ml_result = model.predict(raw_img_path)
-            model_predictions.append(ml_result)
+            # Models are shared between worker threads, only the first capture loads them
+            (
+                ml_result,
+                self.model_scores,
+                self.inference_path,
+                self.confidence,
+            ) = NMLModel.session_predict(raw_img_path)
 
         # Update the database
         self._database.update_img_session_crack_detection(
-            self.image_session_id, ml_result
+            self.image_session_id,
+            ml_result,
+            self.model_scores,
+            self.confidence,
+            self.inference_path,
         )
 
-        if any(model_predictions):
+        # Give the connection back to the pool, this thread is done with the database
+        self._database.remove_session()
+
+        if ml_result:
             print("Crack Detected")
         else:
             print("No Crack")
 
-        self.crack_detect_method_1(10, "precise") # 40 original
-        self.crack_detect_method_1(6, "normal") # 20 original
-        self.cropped_image_save()
+        # The verdict is shown right away, the images fill in as they are saved
+        self.signals.verdict_ready.emit(str(self.image_session_id))
+
+        def image_saved(file_name_suffix: str) -> None:
+            self.signals.image_ready.emit(str(self.image_session_id), file_name_suffix)
+
+        if highlights:
+            for file_name_suffix, encoded_img in highlights.items():
+                self.write_completed_img(
+                    self.get_completed_img_path(
+                        self.user_uuid, self.image_session_id, file_name_suffix
+                    ),
+                    encoded_img,
+                )
+                image_saved(file_name_suffix)
+        else:
+            self.save_all_highlights(self.user_uuid, self.image_session_id, image_saved)
 
         # emit the finished signal to update image selector list
         self.signals.finished.emit(str(self.image_session_id))
@@ -314,7 +508,3 @@ class CrackDetectHighlight(QRunnable):
 
     def stop_thread(self):
         self.continueThread = False
-
-
-# if __name__ == "__main__":
-# crack_detect_method_1(1677963412788, "7e246217-c7b8-4b93-84ca-5c8319214db1", True)
@@ -1,20 +1,53 @@
 import os
 import uuid
+import atexit
 import time
-from datetime import datetime
-from typing import List, Optional, Union, Literal
+import zlib
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    Literal,
+)
 from sqlalchemy import (
+    insert,
+    select,
+    update,
     create_engine,
+    event,
     ForeignKey,
     Column,
     String,
     Integer,
+    Float,
     DateTime,
     LargeBinary,
+    Index,
+    inspect,
+    func,
+)
+from sqlalchemy.orm import (
+    Session,
+    sessionmaker,
+    declarative_base,
+    relationship,
+    scoped_session,
 )
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship, scoped_session
+from sqlalchemy.pool import QueuePool, StaticPool
+import numpy as np
 
+from utils.db_writer import DatabaseWriter
 from utils.exceptions import UserAlreadyCreated, UserNotFound, ImageSessionNotFound
+from utils.version import SQLITE_PRAGMAS
 
 Base = declarative_base()
 
@@ -51,16 +84,24 @@ class User(Base):
 
 class ImageSession(Base):
     __tablename__ = "image_sessions_table"
+    __table_args__ = (Index("ix_image_sessions_user_uuid_date", "user_uuid", "date"),)
 
     session_id = Column("session_id", Integer, primary_key=True, unique=True)
     date = Column("date", DateTime, default=datetime.now())
     image_name = Column("image_name", String, default="", unique=False)
     crack_detected = Column("crack_detected", Integer, unique=False)
+    # Confidence in the verdict when it was combined from several frames
+    confidence = Column("confidence", Float, unique=False)
+    # Models that decided the verdict, "v2" or "v2->v3" with " xN" for N frames
+    inference_path = Column("inference_path", String, unique=False)
     user_uuid = Column(
         String,
         ForeignKey("users_table.user_uuid"),
     )
     user = relationship("User", back_populates="image_sessions")
+    model_scores = relationship(
+        "ModelScore", back_populates="image_session", cascade="all, delete"
+    )
 
     def __init__(
         self, session_id, date, user_uuid, image_name="", crack_detected=-1
@@ -75,36 +116,317 @@ class ImageSession(Base):
         return f"ImageSession=({self.session_id}, {self.image_name}, {self.date}, {self.user_uuid}, {self.crack_detected}))"
 
 
+class ModelScore(Base):
+    __tablename__ = "model_scores_table"
+    __table_args__ = (
+        Index("ix_model_scores_session_id", "session_id"),
+        Index("ix_model_scores_model_probability", "model_name", "crack_probability"),
+    )
+
+    score_id = Column("score_id", Integer, primary_key=True, autoincrement=True)
+    session_id = Column(
+        Integer,
+        ForeignKey("image_sessions_table.session_id"),
+    )
+    model_name = Column("model_name", String, unique=False)
+    model_fingerprint = Column("model_fingerprint", String, unique=False)
+    crack_probability = Column("crack_probability", Float, unique=False)
+    image_session = relationship("ImageSession", back_populates="model_scores")
+
+    def __init__(
+        self, session_id, model_name, model_fingerprint, crack_probability
+    ) -> None:
+        self.session_id = session_id
+        self.model_name = model_name
+        self.model_fingerprint = model_fingerprint
+        self.crack_probability = crack_probability
+
+    def __repr__(self):
+        return f"ModelScore=({self.session_id}, {self.model_name}, {self.model_fingerprint}, {self.crack_probability}))"
+
+
 class MlData(Base):
     __tablename__ = "ml_data_table"
 
-    entry_id = Column("entry_id", Integer, primary_key=True, unique=True)
+    # Assigned by the database (SQLite rowid), always larger than every existing id
+    entry_id = Column(
+        "entry_id", Integer, primary_key=True, unique=True, autoincrement=True
+    )
     classifier = Column("classifier", Integer)
     img = Column("img", LargeBinary)
+    # Describe img so it can be read back without guessing, empty for legacy rows
+    shape = Column("shape", String)  # e.g. "325,325"
+    dtype = Column("dtype", String)  # e.g. "uint8"
+    compression = Column("compression", String)  # "zlib" or empty
+    crop = Column("crop", String)  # crop box "y,x,h,w" in the raw image
+    version = Column("version", String)  # model version the crop was made for
 
-    def __init__(self, entry_id, classifier, img) -> None:
+    def __init__(
+        self,
+        entry_id,
+        classifier,
+        img,
+        shape=None,
+        dtype=None,
+        compression=None,
+        crop=None,
+        version=None,
+    ) -> None:
         self.entry_id = entry_id
         self.classifier = classifier
         self.img = img
+        self.shape = shape
+        self.dtype = dtype
+        self.compression = compression
+        self.crop = crop
+        self.version = version
 
     def __repr__(self) -> str:
-        return f"MlData=({self.entry_id}, {self.classifier}, {self.img})"
+        return f"MlData=({self.entry_id}, {self.classifier}, {self.shape}, {self.dtype}, {self.compression}, {self.crop}, {self.version})"
+
+    def get_img_array(self) -> np.ndarray:
+        return decode_ml_img(self.img, self.shape, self.dtype, self.compression)  # type: ignore
+
+
+def encode_ml_img(
+    img: Union[bytes, np.ndarray],
+    compress: bool = False,
+    crop: Optional[str] = None,
+    version: Optional[str] = None,
+) -> dict:
+    """
+    Returns the MlData column values for an image. Arrays keep their shape and dtype,
+    raw bytes are stored as legacy flat uint8
+    """
+    shape = None
+    dtype = None
+    if isinstance(img, np.ndarray):
+        shape = ",".join(str(dim) for dim in img.shape)
+        dtype = str(img.dtype)
+        img = np.ascontiguousarray(img).tobytes()
+
+    compression = None
+    img = bytes(img)
+    if compress:
+        # Level 1 is the fastest zlib level and still shrinks the mostly smooth NIR crops
+        img = zlib.compress(img, 1)
+        compression = "zlib"
+
+    return {
+        "img": img,
+        "shape": shape,
+        "dtype": dtype,
+        "compression": compression,
+        "crop": crop,
+        "version": version,
+    }
+
+
+def decode_ml_img(
+    img: bytes,
+    shape: Optional[str] = None,
+    dtype: Optional[str] = None,
+    compression: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Returns the image stored in an MlData row with its original shape and dtype.
+    Uncompressed rows are viewed in place without copying
+    """
+    if compression == "zlib":
+        img = zlib.decompress(img)
+
+    img_array = np.frombuffer(img, dtype=np.dtype(dtype) if dtype else np.uint8)
+    if shape:
+        img_array = img_array.reshape([int(dim) for dim in shape.split(",")])
+    return img_array
+
+
+# ------------------- Shared engines -------------------
+# One engine, connection pool and session registry per database file for the whole process
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def _migrate(engine) -> None:
+    """
+    Brings databases created by older versions up to date. create_all only creates missing
+    tables, so columns and indexes added to existing tables are created here
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        # New nullable columns on existing tables
+        existing_columns = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name not in existing_columns:
+                print(f"Migrating: adding column {table.name}.{column.name}")
+                column_type = column.type.compile(dialect=engine.dialect)
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    )
+
+        existing_indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                print(f"Migrating: creating index {index.name}")
+                index.create(bind=engine)
+
+
+def _create_engine(db_name: str):
+    if db_name == ":memory:":
+        # Every new connection would open its own empty database, keep the one connection
+        engine = create_engine(
+            "sqlite://",
+            echo=False,
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+    else:
+        # Pooled connections are handed to whichever thread asks next
+        engine = create_engine(
+            f"sqlite:///{db_name}",
+            echo=False,
+            poolclass=QueuePool,
+            pool_size=5,
+            max_overflow=10,
+            connect_args={"check_same_thread": False},
+        )
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+
+    # Schema checks only happen when the engine is first created
+    Base.metadata.create_all(bind=engine)
+    _migrate(engine)
+    return engine, scoped_session(sessionmaker(bind=engine))
+
+
+def get_engine(db_name: str):
+    """
+    Returns the (engine, scoped session registry) of a database file, creating them on first use.
+    In memory databases are never shared, each call gets a fresh database
+    """
+    if db_name == ":memory:":
+        return _create_engine(db_name)
+
+    with _engines_lock:
+        if db_name not in _engines:
+            _engines[db_name] = _create_engine(db_name)
+        return _engines[db_name]
+
+
+# One writer thread per engine, started on the first queued write
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(engine) -> DatabaseWriter:
+    with _writers_lock:
+        writer = _writers.get(engine)
+        if writer is None or not writer.is_alive():
+            writer = DatabaseWriter(engine)
+            writer.start()
+            # Commit whatever is still queued when the app exits
+            atexit.register(writer.stop)
+            _writers[engine] = writer
+        return writer
 
 
 # ------------------- Wrapper to use DB -------------------
 class nmlDB:
     def __init__(self, db_name) -> None:
-        self.engine = create_engine(f"sqlite:///{db_name}", echo=False)
-        Base.metadata.create_all(bind=self.engine)
-        self.session_factory = sessionmaker(bind=self.engine)
-        self.Session = scoped_session(self.session_factory)
-        self.session = self.Session()
-
-    # def init_threads_session(self):
-    #     self.session_factory = sessionmaker(bind=self.engine)
-    #     self.Session = scoped_session(self.session_factory)
-    #     self.session = self.Session()
-    #     print(self.session)
+        self.db_name = db_name
+        self.engine, self.Session = get_engine(db_name)
+        # Called with (description, exception) when a write nobody waits on fails.
+        # Runs on the writer thread
+        self.on_write_failure: Optional[Callable[[str, Exception], None]] = None
+
+    @property
+    def session(self):
+        """
+        Session of the calling thread, every thread gets its own from the shared registry
+        """
+        return self.Session()
+
+    def remove_session(self) -> None:
+        """
+        Closes the calling thread's session and returns its connection to the pool
+        """
+        self.Session.remove()
+
+    def submit_write(self, write_fn: Callable[[Session], Any]) -> Future:
+        """
+        Queues write_fn(session) on the database's writer thread, which commits queued writes
+        together. In memory databases share a single connection so they are written in place
+        """
+        if self.db_name == ":memory:":
+            future = Future()
+            try:
+                result = write_fn(self.session)
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            return future
+
+        return get_writer(self.engine).submit(write_fn)
+
+    def _finish_write(self, future: Future, wait: bool, description: str) -> None:
+        """
+        Waits for the write, or reports it through on_write_failure if it fails later
+        """
+        if wait:
+            future.result()
+            return
+
+        def report_failure(done: Future) -> None:
+            e = done.exception()
+            if e is None:
+                return
+            print(f"{description} failed: {e}")
+            if self.on_write_failure is not None:
+                self.on_write_failure(description, e)
+
+        future.add_done_callback(report_failure)
+
+    def flush_writes(self) -> None:
+        """
+        Blocks until every write queued so far is committed
+        """
+        if self.db_name == ":memory:":
+            return
+        get_writer(self.engine).flush()
+
+    def checkpoint_wal(self, mode: str = "PASSIVE") -> Tuple[int, int, int]:
+        """
+        Copies the write ahead log back into the database file. PASSIVE never waits on
+        readers or writers. Returns (busy, log pages, checkpointed pages)
+        """
+        with self.engine.connect() as connection:
+            result = connection.exec_driver_sql(
+                f"PRAGMA wal_checkpoint({mode})"
+            ).first()
+        return tuple(result)  # type: ignore
+
+    def queue_checkpoint_wal(self, mode: str = "PASSIVE") -> Future:
+        """
+        Runs checkpoint_wal on the writer thread, between write batches, so a long
+        checkpoint never blocks the caller. Failures are reported like any queued write
+        """
+        future = self.submit_write(lambda session: self.checkpoint_wal(mode))
+        self._finish_write(future, False, "WAL checkpoint")
+        return future
 
     def _get_users_all(self) -> List[User]:
         results = self.session.query(User).all()
@@ -148,48 +470,180 @@ class nmlDB:
         else:
             return None
 
-    def insert_new_image_session(self, uuid: str, image_name: str = "") -> int:
+    def insert_new_image_session(
+        self, uuid: str, image_name: str = "", wait: bool = True
+    ) -> int:
+        """
+        Creates an image session and returns its id. With wait=False the id is returned
+        right away and the row is committed by the writer thread
+        """
         session_id = int(time.time() * 1000)
-        img_session = ImageSession(session_id, datetime.now(), uuid, image_name)
-        self.session.add(img_session)
-        self.session.commit()
+        date = datetime.now()
+
+        def write(session: Session) -> None:
+            session.add(ImageSession(session_id, date, uuid, image_name))
+
+        future = self.submit_write(write)
+        self._finish_write(future, wait, f"Creating image session {session_id}")
 
         return session_id
 
+    def delete_img_session(self, img_session_id: int, wait: bool = True) -> None:
+        def write(session: Session) -> None:
+            img_sess_res = session.get(ImageSession, img_session_id)
+            if not img_sess_res:
+                raise ImageSessionNotFound("This image session was not found")
+            session.delete(img_sess_res)
+
+        future = self.submit_write(write)
+        self._finish_write(future, wait, f"Deleting image session {img_session_id}")
+
     def get_all_img_sessions_for_uuid(self, uuid) -> List[ImageSession]:
+        # Served by the (user_uuid, date) index
         results = (
             self.session.query(ImageSession)
-            .filter(User.user_uuid == ImageSession.user_uuid)
-            .filter(User.user_uuid == uuid)
+            .populate_existing()
+            .filter(ImageSession.user_uuid == uuid)
+            .order_by(ImageSession.date, ImageSession.session_id)
             .all()
         )
         return results
 
-    def get_img_session_for_uuid(
-        self, uuid, desired_image_session: int
-    ) -> ImageSession:
+    def get_img_session_dates_for_uuid(self, uuid) -> List[Tuple[str, int]]:
+        """
+        Returns every day the user has image sessions on with the number of sessions that day,
+        grouped in SQL so no session is loaded
+        """
+        day = func.date(ImageSession.date)
         results = (
+            self.session.query(day, func.count(ImageSession.session_id))
+            .filter(ImageSession.user_uuid == uuid)
+            .group_by(day)
+            .order_by(day)
+            .all()
+        )
+        return [(date, count) for date, count in results]
+
+    def get_img_sessions_for_uuid_on_date(
+        self, uuid, date: str, offset: int = 0, limit: Optional[int] = None
+    ) -> List[ImageSession]:
+        """
+        Returns a page of the user's image sessions on date (YYYY-MM-DD), oldest first
+        """
+        day_start = datetime.fromisoformat(date)
+        day_end = day_start + timedelta(days=1)
+
+        # A range on date keeps the (user_uuid, date) index usable
+        query = (
             self.session.query(ImageSession)
-            .filter(User.user_uuid == ImageSession.user_uuid)
-            .filter(User.user_uuid == uuid)
-            .filter(ImageSession.session_id == desired_image_session)
-            .first()
+            .populate_existing()
+            .filter(ImageSession.user_uuid == uuid)
+            .filter(ImageSession.date >= day_start)
+            .filter(ImageSession.date < day_end)
+            .order_by(ImageSession.date, ImageSession.session_id)
+            .offset(offset)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def get_img_session_for_uuid(
+        self, uuid, desired_image_session: int
+    ) -> Optional[ImageSession]:
+        # Primary key lookup, then make sure the session belongs to the user. Refresh it in
+        # case the writer thread changed it since this session last loaded it
+        results = self.session.get(
+            ImageSession, desired_image_session, populate_existing=True
         )
+        if results is None or results.user_uuid != uuid:
+            return None
         return results
 
     def update_img_session_crack_detection(
-        self, img_session_id: int, crack_status: Union[Literal[0], Literal[1]]
+        self,
+        img_session_id: int,
+        crack_status: Union[Literal[0], Literal[1]],
+        model_scores: Optional[Dict[str, Tuple[str, float]]] = None,
+        confidence: Optional[float] = None,
+        inference_path: Optional[str] = None,
+        wait: bool = True,
     ) -> None:
-        img_sess_res = (
+        """
+        Sets the crack verdict of an image session. model_scores maps a model name to its
+        (fingerprint, crack probability), any previous scores of the session are replaced.
+        confidence is the confidence in the verdict, None when it is not known, and
+        inference_path records which models ran, see NMLModel.cascade_predict_crops
+        """
+
+        def write(session: Session) -> None:
+            img_sess_res = session.get(ImageSession, img_session_id)
+            if not img_sess_res:
+                raise ImageSessionNotFound("This image session was not found")
+
+            img_sess_res.crack_detected = crack_status
+            img_sess_res.confidence = confidence
+            img_sess_res.inference_path = inference_path
+            if model_scores is not None:
+                session.query(ModelScore).filter(
+                    ModelScore.session_id == img_session_id
+                ).delete()
+                for model_name, (fingerprint, probability) in model_scores.items():
+                    session.add(
+                        ModelScore(img_session_id, model_name, fingerprint, probability)
+                    )
+
+        future = self.submit_write(write)
+        self._finish_write(future, wait, f"Updating image session {img_session_id}")
+
+    def get_model_scores_for_session(self, img_session_id: int) -> Dict[str, float]:
+        """
+        Returns the crack probability of every model that scored the image session
+        """
+        results = (
+            self.session.query(ModelScore.model_name, ModelScore.crack_probability)
+            .filter(ModelScore.session_id == img_session_id)
+            .all()
+        )
+        return {model_name: probability for model_name, probability in results}
+
+    def get_img_sessions_above_threshold(
+        self,
+        model_name: str,
+        threshold: float,
+        uuid: Optional[str] = None,
+        model_fingerprint: Optional[str] = None,
+    ) -> List[ImageSession]:
+        """
+        Returns the image sessions where model_name scored a crack probability above threshold.
+        Lets an operating point be retuned without re-running inference on archived images
+        """
+        query = (
             self.session.query(ImageSession)
-            .filter(ImageSession.session_id == img_session_id)
-            .first()
+            .populate_existing()
+            .join(ModelScore, ModelScore.session_id == ImageSession.session_id)
+            .filter(ModelScore.model_name == model_name)
+            .filter(ModelScore.crack_probability > threshold)
         )
-        if not img_sess_res:
-            raise ImageSessionNotFound("This image session was not found")
+        if uuid is not None:
+            query = query.filter(ImageSession.user_uuid == uuid)
+        if model_fingerprint is not None:
+            query = query.filter(ModelScore.model_fingerprint == model_fingerprint)
+        return query.all()
 
-        img_sess_res.crack_detected = crack_status
-        self.session.commit()
+    def count_img_sessions_above_threshold(
+        self,
+        model_name: str,
+        threshold: float,
+        model_fingerprint: Optional[str] = None,
+    ) -> int:
+        query = (
+            self.session.query(func.count(ModelScore.score_id))
+            .filter(ModelScore.model_name == model_name)
+            .filter(ModelScore.crack_probability > threshold)
+        )
+        if model_fingerprint is not None:
+            query = query.filter(ModelScore.model_fingerprint == model_fingerprint)
+        return query.scalar()
 
     @classmethod
     def get_base_filepath(cls, user_uuid: str) -> str:
@@ -202,13 +656,62 @@ class nmlDB:
             os.makedirs(os.path.join(base_filepath, "raw"))
             os.makedirs(os.path.join(base_filepath, "complete"))
 
-    def insert_ml_data(self, img, classifier):
-        # TODO: May Need to reword session id to be more unique
-        entry_id = int(time.time() * 1000)
-        img = bytes(img)
-        ml_data = MlData(entry_id, classifier, img)
+    def insert_ml_data(
+        self,
+        img: Union[bytes, np.ndarray],
+        classifier,
+        compress: bool = False,
+        crop: Optional[str] = None,
+        version: Optional[str] = None,
+    ) -> int:
+        # entry_id is left to the database so rows in the same millisecond never collide
+        ml_data = MlData(
+            None, classifier, **encode_ml_img(img, compress, crop, version)
+        )
         self.session.add(ml_data)
         self.session.commit()
+        return ml_data.entry_id  # type: ignore
+
+    def bulk_insert_ml_data(
+        self,
+        entries: Iterable[Tuple[Union[bytes, np.ndarray], int]],
+        batch_size: int = 1000,
+        compress: bool = False,
+        crop: Optional[str] = None,
+        version: Optional[str] = None,
+    ) -> int:
+        """
+        Inserts (image, classifier) pairs with one transaction per batch_size rows
+        instead of one per row. Returns the number of rows inserted
+        """
+        start_time = time.time()
+        inserted = 0
+        batch = []
+
+        def flush_batch():
+            self.session.execute(insert(MlData), batch)
+            self.session.commit()
+
+        for img, classifier in entries:
+            batch.append(
+                {
+                    "classifier": classifier,
+                    **encode_ml_img(img, compress, crop, version),
+                }
+            )
+            if len(batch) >= batch_size:
+                flush_batch()
+                inserted += len(batch)
+                batch = []
+
+        if batch:
+            flush_batch()
+            inserted += len(batch)
+
+        elapsed = time.time() - start_time
+        if elapsed > 0:
+            print(f"Inserted {inserted} ml data rows ({inserted / elapsed:.0f} rows/s)")
+        return inserted
 
     def get_all_ml_data(
         self,
@@ -224,20 +727,151 @@ class nmlDB:
             results = self.session.query(MlData).all()
         return results
 
+    def iter_ml_data(
+        self,
+        classifier: Union[
+            Literal["ALL"], Literal["CRACK"], Literal["NO_CRACK"]
+        ] = "ALL",
+        batch_size: int = 1000,
+    ) -> Iterator[Tuple[int, int, np.ndarray]]:
+        """
+        Streams (entry_id, classifier, img array) rows batch_size at a time without building
+        ORM objects, so memory stays constant however large the table is
+        """
+        query = select(
+            MlData.entry_id,
+            MlData.classifier,
+            MlData.img,
+            MlData.shape,
+            MlData.dtype,
+            MlData.compression,
+        ).order_by(MlData.entry_id)
+        if classifier == "CRACK":
+            query = query.where(MlData.classifier == 1)
+        elif classifier == "NO_CRACK":
+            query = query.where(MlData.classifier == 0)
+
+        results = self.session.execute(query.execution_options(yield_per=batch_size))
+        for entry_id, entry_classifier, img, shape, dtype, compression in results:
+            yield entry_id, entry_classifier, decode_ml_img(
+                img, shape, dtype, compression
+            )
+
     def get_first_ml_data(self):
         return self.session.query(MlData).first()
 
     def get_ml_data_len(self):
-        ml_count = self.session.query(MlData).count()
+        ml_count = self.count_ml_data()
         print(ml_count)
         return ml_count
 
+    @classmethod
+    def _ml_data_filters(
+        cls,
+        classifier: Optional[int] = None,
+        start_id: Optional[int] = None,
+        stop_id: Optional[int] = None,
+        version: Optional[str] = None,
+    ) -> list:
+        filters = []
+        if classifier is not None:
+            filters.append(MlData.classifier == classifier)
+        if start_id is not None:
+            filters.append(MlData.entry_id >= start_id)
+        if stop_id is not None:
+            filters.append(MlData.entry_id < stop_id)
+        if version is not None:
+            filters.append(MlData.version == version)
+        return filters
+
+    def count_ml_data(
+        self,
+        classifier: Optional[int] = None,
+        start_id: Optional[int] = None,
+        stop_id: Optional[int] = None,
+        version: Optional[str] = None,
+    ) -> int:
+        """
+        Counts ml data rows matching every given filter with a single COUNT query
+        """
+        query = select(func.count(MlData.entry_id)).where(
+            *self._ml_data_filters(classifier, start_id, stop_id, version)
+        )
+        return self.session.execute(query).scalar_one()
+
+    def get_ml_data_ids(
+        self,
+        classifier: Optional[int] = None,
+        start_id: Optional[int] = None,
+        stop_id: Optional[int] = None,
+        version: Optional[str] = None,
+    ) -> List[int]:
+        """
+        Returns the entry ids matching every given filter without loading any image
+        """
+        query = (
+            select(MlData.entry_id)
+            .where(*self._ml_data_filters(classifier, start_id, stop_id, version))
+            .order_by(MlData.entry_id)
+        )
+        return list(self.session.execute(query).scalars())
+
+    def relabel_ml_data(
+        self,
+        new_label: int,
+        entry_ids: Optional[Iterable[int]] = None,
+        classifier: Optional[int] = None,
+        start_id: Optional[int] = None,
+        stop_id: Optional[int] = None,
+        version: Optional[str] = None,
+    ) -> int:
+        """
+        Sets the classifier of every row matching the given filters (entry id range
+        [start_id, stop_id), current classifier, version) and, if given, in entry_ids.
+        Runs as UPDATE statements in one transaction. Returns the number of rows changed
+        """
+        filters = self._ml_data_filters(classifier, start_id, stop_id, version)
+
+        if entry_ids is None:
+            statements = [update(MlData).where(*filters)]
+        else:
+            # Stay under SQLite's bound parameter limit for very long id lists
+            entry_ids = list(entry_ids)
+            statements = [
+                update(MlData).where(
+                    MlData.entry_id.in_(entry_ids[i : i + 900]), *filters
+                )
+                for i in range(0, len(entry_ids), 900)
+            ]
+
+        changed = 0
+        for statement in statements:
+            result = self.session.execute(
+                statement.values(classifier=new_label).execution_options(
+                    synchronize_session=False
+                )
+            )
+            changed += result.rowcount
+        self.session.commit()
+        return changed
+
     def change_ml_data_class_label(self, start, stop, new_label):
-        ml_data = self.session.query(MlData).slice(start, stop).all()
-        if not ml_data:
+        # Rows start to stop in table order, relabeled with one UPDATE
+        positional_ids = (
+            select(MlData.entry_id)
+            .order_by(MlData.entry_id)
+            .offset(start)
+            .limit(stop - start)
+        )
+        result = self.session.execute(
+            update(MlData)
+            .where(MlData.entry_id.in_(positional_ids.scalar_subquery()))
+            .values(classifier=new_label)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            self.session.rollback()
             raise Exception("This image session was not found")
-        for mld in ml_data:
-            mld.classifier = new_label
         self.session.commit()
 
 
@@ -0,0 +1,89 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session, sessionmaker
+
+
+class DatabaseWriter(threading.Thread):
+    """
+    Single background thread that applies write intents submitted from any thread.
+    Intents waiting in the queue are committed together in one transaction, so a burst of
+    writes costs one commit instead of one per row. Every intent gets a Future that
+    completes once its transaction is committed
+    """
+
+    def __init__(self, engine, max_batch_size: int = 256) -> None:
+        super().__init__(daemon=True)
+        self.session_factory = sessionmaker(bind=engine)
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+
+    def submit(self, write_fn: Callable[[Session], Any]) -> Future:
+        """
+        Queues write_fn(session), the Future holds its return value after the commit
+        """
+        future = Future()
+        self._queue.put((write_fn, future))
+        return future
+
+    def flush(self) -> None:
+        """
+        Blocks until everything submitted before this call is committed
+        """
+        self.submit(lambda session: None).result()
+
+    def stop(self) -> None:
+        """
+        Commits everything still queued, then stops the thread
+        """
+        if self.is_alive():
+            self._queue.put(None)
+            self.join()
+
+    def _apply(self, session: Session, batch) -> None:
+        results = []
+        try:
+            for write_fn, _ in batch:
+                results.append(write_fn(session))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) > 1:
+                # One intent failed, apply them one by one so only that one fails
+                for request in batch:
+                    self._apply(session, [request])
+                return
+            print(f"Database write failed: {e}")
+            _, future = batch[0]
+            future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def run(self):
+        session = self.session_factory()
+        run_flag = True
+        while run_flag:
+            request = self._queue.get()
+            if request is None:
+                break
+
+            # Group whatever else is already waiting into the same transaction
+            batch = [request]
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    run_flag = False
+                    break
+                batch.append(request)
+
+            self._apply(session, batch)
+            # Do not keep stale objects around between transactions
+            session.expunge_all()
+        session.close()
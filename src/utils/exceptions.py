@@ -12,3 +12,7 @@ class UserNotFound(Exception):
 
 class ImageSessionNotFound(Exception):
     pass
+
+
+class BackupRestarted(Exception):
+    pass
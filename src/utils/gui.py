@@ -1,10 +1,19 @@
 import os
 import sys
 import cv2
+import time
 import numpy as np
 
-from PyQt5.QtGui import QColor, QPixmap, QImage, QIcon
-from PyQt5.QtCore import QSize, Qt, QThreadPool, pyqtSlot
+from PyQt5.QtGui import QColor, QPixmap, QImage, QIcon, QPainter
+from PyQt5.QtCore import (
+    QRect,
+    QSize,
+    Qt,
+    QThreadPool,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot,
+)
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -22,13 +31,32 @@ from PyQt5.QtWidgets import (
     QTabWidget,
     QStackedLayout,
     QListWidget,
+    QListView,
     QGroupBox,
+    QCheckBox,
 )
 
 from utils.database import nmlDB
 from utils.camera import VideoThread
 from utils.crack_detect import NMLModel, CrackDetectHighlight
-from utils.version import BETA_VERSION
+from utils.backup import BackupTask
+from utils.image_cache import ScanImageLoader
+from utils.preview import PreviewRenderer
+from utils.live_overlay import LiveOverlayScheduler
+from utils.panorama import PanoramaThread
+from utils.tiled_viewer import TiledImageViewer
+from utils.quality import roi_box
+from utils.past_scans_model import (
+    PastScanRecord,
+    PastScanDatesModel,
+    PastScanSessionsModel,
+)
+from utils.version import (
+    BETA_VERSION,
+    SQLITE_CHECKPOINT_INTERVAL,
+    BACKUP_DIR,
+    BACKUP_INTERVAL,
+)
 
 
 class CreateNewUserDialog(QDialog):
@@ -79,6 +107,21 @@ class CreateNewUserDialog(QDialog):
         self.form_group_box.setLayout(form_layout)
 
 
+# The image the "Change Sensitivity" button shows next, with the text explaining it
+NEXT_SCAN_VARIANT = {
+    "cropped": ("normal", "The 'normal' image is shown (regular crack detection)"),
+    "normal": ("precise", "The 'precise' image is shown (precise crack detection)"),
+    "precise": ("cropped", "The original image is displayed"),
+}
+
+
+def filler_pixmap() -> QPixmap:
+    """Grey square shown while there is no image or it is still loading"""
+    filler = QPixmap(400, 400)
+    filler.fill(QColor(0, 0, 0, 25))
+    return filler
+
+
 class PreviewImageDialog(QDialog):
     def __init__(self, user_uuid, image_session, database, parent=None):
         super().__init__(parent=parent)
@@ -86,7 +129,7 @@ class PreviewImageDialog(QDialog):
         them the results of the current image"""
         self.database = database
         self.user_uuid = user_uuid
-        self.FILEPATH_OF_PAST_SCAN_IMAGE = ""
+        self.image_session_id = image_session.session_id
 
         self.setWindowTitle("Image Preview")
 
@@ -98,14 +141,8 @@ class PreviewImageDialog(QDialog):
         # Set size
         self.setFixedSize(600, 700)
 
-        # Path for the completed image
-        completed_img_path = os.path.join(
-            self.database.get_base_filepath(self.user_uuid),
-            "complete",
-            f"{image_session.session_id}-normal.jpg",
-        )
-        if self.FILEPATH_OF_PAST_SCAN_IMAGE == "":
-            self.FILEPATH_OF_PAST_SCAN_IMAGE = completed_img_path
+        # Highlighted image when there is a crack, the plain crop otherwise
+        self.scan_variant = "normal" if image_session.crack_detected == 1 else "cropped"
 
         # Make the crack status more readable by changing the status code to words
         if image_session.crack_detected == 1:
@@ -135,20 +172,11 @@ class PreviewImageDialog(QDialog):
         crack_detection_status.setFixedWidth(400)
         crack_detection_status.setAlignment(Qt.AlignCenter)  # type: ignore
 
-        # Creating the image label
-        completed_img_path_raw = os.path.join(
-            self.database.get_base_filepath(self.user_uuid),
-            "complete",
-            f"{image_session.session_id}-cropped.jpg",
-        )
-
+        # Creating the image label, the image is decoded off the GUI thread
         self.current_scan_image_label = QLabel()
-        if image_session.crack_detected == 1:
-            current_scan_pixmap = QPixmap(completed_img_path)
-        else:
-            current_scan_pixmap = QPixmap(completed_img_path_raw)
-        resized_current_scan_pixmap = current_scan_pixmap.scaled(400, 400)
-        self.current_scan_image_label.setPixmap(resized_current_scan_pixmap)
+        self.scan_image_loader = ScanImageLoader(self)
+        self.scan_image_loader.image_ready.connect(self._scan_image_ready)
+        self._show_current_scan_image()
         self.current_scan_image_label.setContentsMargins(0, 0, 0, 20)
 
         # Indicator label
@@ -195,52 +223,54 @@ class PreviewImageDialog(QDialog):
     def _swap_current_scan_image(self):
 
         """Swap between a highlighted image, a slightly more precise highlighted image (risk associated), and the
-        reqular raw image. Checks the filepath to see if it has the '-cropped' suffix. Changes the
-        FILEPATH_OF_PAST_SCAN_IMAGE string accordingly"""
+        reqular raw image. Cached images are only decoded once"""
+
+        self.scan_variant, indicator_text = NEXT_SCAN_VARIANT[self.scan_variant]
+        self._show_current_scan_image()
+        self.indicator_label.setText(indicator_text)
+
+    def _show_current_scan_image(self):
+        pixmap = self.scan_image_loader.request(
+            self.user_uuid, self.image_session_id, self.scan_variant
+        )
+        if pixmap is None:
+            pixmap = filler_pixmap()
+        self.current_scan_image_label.setPixmap(pixmap)
+
+    def _scan_image_ready(self, image_session_id, variant, pixmap):
+        self.current_scan_image_label.setPixmap(pixmap)
+
+    def scan_image_available(self, image_session_id, variant):
+        """Called when the analysis saved another image, shows it if it is the one waited on"""
+        if image_session_id == self.image_session_id and variant == self.scan_variant:
+            self._show_current_scan_image()
 
-        if "-cropped" in self.FILEPATH_OF_PAST_SCAN_IMAGE:
-            unhighlighted_file_path = self.FILEPATH_OF_PAST_SCAN_IMAGE.replace(
-                "-cropped", "-normal"
-            )
-            highlighted_output_pixmap = QPixmap(unhighlighted_file_path)
-            resized_highlighted_output_pixmap = highlighted_output_pixmap.scaled(
-                400, 400
-            )
-            self.current_scan_image_label.setPixmap(resized_highlighted_output_pixmap)
-            self.FILEPATH_OF_PAST_SCAN_IMAGE = unhighlighted_file_path
-            self.indicator_label.setText(
-                "The 'normal' image is shown (regular crack detection)"
-            )
-        elif "-normal" in self.FILEPATH_OF_PAST_SCAN_IMAGE:
-            highlighted_file_path = self.FILEPATH_OF_PAST_SCAN_IMAGE.replace(
-                "-normal", "-precise"
-            )
-            unhighlighted_output_pixmap = QPixmap(highlighted_file_path)
-            resized_unhighlighted_output_pixmap = unhighlighted_output_pixmap.scaled(
-                400, 400
-            )
-            self.current_scan_image_label.setPixmap(resized_unhighlighted_output_pixmap)
-            self.FILEPATH_OF_PAST_SCAN_IMAGE = highlighted_file_path
-            self.indicator_label.setText(
-                "The 'precise' image is shown (precise crack detection)"
-            )
-        elif "-precise" in self.FILEPATH_OF_PAST_SCAN_IMAGE:
-            precise_highlighted_file_path = self.FILEPATH_OF_PAST_SCAN_IMAGE.replace(
-                "-precise", "-cropped"
-            )
-            unhighlighted_output_pixmap = QPixmap(precise_highlighted_file_path)
-            resized_unhighlighted_output_pixmap = unhighlighted_output_pixmap.scaled(
-                400, 400
-            )
-            self.current_scan_image_label.setPixmap(resized_unhighlighted_output_pixmap)
-            self.FILEPATH_OF_PAST_SCAN_IMAGE = precise_highlighted_file_path
-            self.indicator_label.setText("The original image is displayed")
-        else:
-            print(
-                "There was a problem in reading the file name of the image. Make sure that the image "
-                "file path has the specified keywords in it. The keywords were specified in the "
-                "function call for the crack_detect_method_1"
-            )
+
+class PanoramaDialog(QDialog):
+    def __init__(self, pyramid_dir, parent=None):
+        super().__init__(parent=parent)
+        """Pop up window showing a saved panorama, scroll to zoom and drag to pan"""
+        self.setWindowTitle("Panorama")
+        self.resize(1000, 600)
+
+        self.viewer = TiledImageViewer(self)
+
+        # Buttons at the bottom of the form
+        QBtn = QDialogButtonBox.Ok  # type: ignore
+        self.buttonBox = QDialogButtonBox(QBtn)
+        self.buttonBox.accepted.connect(self.accept)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.viewer)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+        self.viewer.open_pyramid(pyramid_dir)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # The view only has its final size once shown
+        self.viewer.fit_to_view()
 
 
 class MainWindow(QMainWindow):
@@ -248,6 +278,9 @@ class MainWindow(QMainWindow):
     Main window for gui interface
     """
 
+    # Failed background database writes, raised on the writer thread
+    write_failed_signal = pyqtSignal(str)
+
     def __init__(self, database: nmlDB) -> None:
         super().__init__()
 
@@ -257,9 +290,11 @@ class MainWindow(QMainWindow):
         self.SELECTED_SESSION_ID = None
         self.USER_EMAIL = None
         self.MOST_RECENT_IMAGE_SESSION = 0
-        self.FILEPATH_OF_PAST_SCAN_IMAGE = ""
-        self.image_session_dict = {}
+        self.PAST_SCAN_VARIANT = ""
         self.session_id_to_thread_worker = {}
+        # Open preview dialogs by image session id, a second verdict can open one on top
+        self.preview_dialogs = {}
+        self.panorama_thread = None
 
         # Window Setup
         self.setWindowTitle("NML.ai")
@@ -272,21 +307,54 @@ class MainWindow(QMainWindow):
 
         self.crack_detection_thread_pool = QThreadPool()
 
+        # Writes queued with wait=False are not checked by their caller
+        self.write_failed_signal.connect(self.write_failed_handler)
+        self.database.on_write_failure = lambda description, e: (
+            self.write_failed_signal.emit(f"{description} failed: {e}")
+        )
+
+        # Past scan images are decoded off the GUI thread
+        self.scan_image_loader = ScanImageLoader(self)
+        self.scan_image_loader.image_ready.connect(self.past_scan_image_ready)
+
+        # Keep the write ahead log short without ever blocking captures, the checkpoint
+        # runs on the database writer thread, not the GUI thread
+        self.checkpoint_timer = QTimer(self)
+        self.checkpoint_timer.timeout.connect(self.database.queue_checkpoint_wal)
+        if SQLITE_CHECKPOINT_INTERVAL:
+            self.checkpoint_timer.start(SQLITE_CHECKPOINT_INTERVAL * 1000)
+
+        # Periodic backups on their own thread, see start_idle_backup
+        self.backup_thread_pool = QThreadPool()
+        self.backup_thread_pool.setMaxThreadCount(1)
+        self.backup_running = False
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.start_idle_backup)
+        if BACKUP_DIR:
+            self.backup_timer.start(BACKUP_INTERVAL * 1000)
+
     def init_widgets(self):
         self.user_selector = QListWidget()
         self.user_selector.setFixedSize(250, 300)
         self.user_selector.addItems(self.database.get_all_users_emails())
         self.user_selector.currentItemChanged.connect(self.user_selector_index_changed)
 
-        self.past_scan_date_selector = QListWidget()
+        self.past_scan_dates_model = PastScanDatesModel(self)
+        self.past_scan_date_selector = QListView()
+        self.past_scan_date_selector.setModel(self.past_scan_dates_model)
         self.past_scan_date_selector.setFixedSize(236, 250)
-        self.past_scan_date_selector.currentItemChanged.connect(
+        self.past_scan_date_selector.selectionModel().currentChanged.connect(
             self.past_scan_date_selector_index_changed
         )
 
-        self.past_scan_image_session_selector = QListWidget()
+        # The view asks the model for the next page of sessions when scrolled to the end
+        self.past_scan_sessions_model = PastScanSessionsModel(
+            self.database, parent=self
+        )
+        self.past_scan_image_session_selector = QListView()
+        self.past_scan_image_session_selector.setModel(self.past_scan_sessions_model)
         self.past_scan_image_session_selector.setFixedSize(236, 250)
-        self.past_scan_image_session_selector.currentItemChanged.connect(
+        self.past_scan_image_session_selector.selectionModel().currentChanged.connect(
             self.past_scan_image_session_selector_index_changed
         )
 
@@ -337,6 +405,9 @@ class MainWindow(QMainWindow):
         grey.fill(QColor("darkGray"))
         self.video_label.setPixmap(grey)
 
+        # Frames are scaled once into a reused buffer, then copied once into the pixmap
+        self.preview_renderer = PreviewRenderer((450, 800) if BETA_VERSION else None)
+
         # Placeholder for video thread, Will be initialized in set_user with complete info
         self.video_thread = VideoThread(
             self.USER_UUID if self.USER_UUID else "empty-uuid", self.database
@@ -349,12 +420,11 @@ class MainWindow(QMainWindow):
         self.video_thread.capture_complete_signal.connect(
             self.completed_capture_handler
         )
+        self.video_thread.capture_rejected_signal.connect(self.rejected_capture_handler)
 
         # Initialize the past scan image
         self.past_scan_image_label = QLabel()
-        filler_pixmap = QPixmap(400, 400)
-        filler_pixmap.fill(QColor(0, 0, 0, 25))
-        self.past_scan_image_label.setPixmap(filler_pixmap)
+        self.past_scan_image_label.setPixmap(filler_pixmap())
 
         self.current_scan_image_label = QLabel()
 
@@ -373,6 +443,18 @@ class MainWindow(QMainWindow):
         self.image_name_text = QLabel("Enter the Image Name:")
         self.image_name_box = QLineEdit()
 
+        # Live crack overlay, preview frames are sampled and analyzed off the GUI thread
+        self.live_overlay_checkbox = QCheckBox("Live Crack Overlay")
+        self.live_overlay_checkbox.setChecked(False)
+        self.live_overlay_checkbox.toggled.connect(self.live_overlay_toggled)
+        self.live_overlay_scheduler = LiveOverlayScheduler(parent=self)
+
+        # Records a panorama from the live feed until pressed again
+        self.panorama_button = QPushButton("Start Panorama")
+        self.panorama_button.setCheckable(True)
+        self.panorama_button.toggled.connect(self.panorama_toggled)
+        self.panorama_button.setEnabled(False)
+
         # Label for indicator showing which sensitivity image is being displayed
         self.indicator_label = QLabel(
             "The 'normal' image is shown (regular crack detection)"
@@ -419,9 +501,14 @@ class MainWindow(QMainWindow):
         image_name_layout.addWidget(self.image_name_text)
         image_name_layout.addWidget(self.image_name_box)
         new_scan_layout.addLayout(image_name_layout)
+        new_scan_layout.addWidget(self.live_overlay_checkbox)
+        new_scan_layout.setAlignment(self.live_overlay_checkbox, Qt.AlignHCenter)  # type: ignore
         self.capture_image_button.setFixedWidth(460)
         new_scan_layout.addWidget(self.capture_image_button)
         new_scan_layout.setAlignment(self.capture_image_button, Qt.AlignHCenter)  # type: ignore
+        self.panorama_button.setFixedWidth(460)
+        new_scan_layout.addWidget(self.panorama_button)
+        new_scan_layout.setAlignment(self.panorama_button, Qt.AlignHCenter)  # type: ignore
 
         new_scan_container = QWidget()
         new_scan_container.setLayout(new_scan_layout)
@@ -487,72 +574,42 @@ class MainWindow(QMainWindow):
         print(f"user_selector index = {i.text()}")
         self.USER_EMAIL = i.text()
 
-    def past_scan_date_selector_index_changed(self, i):
-        date = i.text()
+    def past_scan_date_selector_index_changed(self, current, previous):
+        # The list is being reset, nothing is selected
+        if not current.isValid():
+            return
+
+        date = self.past_scan_dates_model.date_at(current.row())
         print(f"past_scan_date_selector index = {date}")
         self.SELECTED_DATE = date
-        result = []
-
-        # Assigning names to the crack_status for readability in the second list widget
-        for image_session in self.image_session_dict[date]:
-            crack_status = ""
-            if image_session.crack_detected == 1:
-                crack_status = "CRACK"
-            elif image_session.crack_detected == 0:
-                crack_status = "NOCRACK"
-
-            # Final string will be the concatenated fields from the database: session id, crack_status, image name
-            final_str = (
-                f"{image_session.session_id}_{crack_status}_{image_session.image_name}"
-            )
 
-            # Result is the list of all the final strings (concatenated fields) to pass into the second list widget
-            result.append(final_str)
-
-        # Reset the filepath of the displayed image
-        self.FILEPATH_OF_PAST_SCAN_IMAGE = ""
+        # Reset the displayed image
+        self.SELECTED_SESSION_ID = None
+        self.PAST_SCAN_VARIANT = ""
 
         # Remove the current image from the pixmap and put a filler, in the case user wants to select a different date
-        filler_pixmap = QPixmap(400, 400)
-        filler_pixmap.fill(QColor(0, 0, 0, 25))
-        self.past_scan_image_label.setPixmap(filler_pixmap)
+        self.scan_image_loader.cancel()
+        self.past_scan_image_label.setPixmap(filler_pixmap())
 
         self.switch_image_button.setEnabled(False)
 
-        # Blocks the .clear() signal, since .clear() triggers the .connect of the second list widget, causing a crash
-        self.past_scan_image_session_selector.blockSignals(True)
-        self.past_scan_image_session_selector.clear()
-        self.past_scan_image_session_selector.blockSignals(False)
-
-        self.past_scan_image_session_selector.addItems(result)
+        # Shows the first page of the date's sessions, the rest load as the list is scrolled
+        self.past_scan_sessions_model.set_query(self.USER_UUID, date)
 
-    def past_scan_image_session_selector_index_changed(self, i):
-        # session_info contains the session_id, crack_status, and image_name all concatenated to be displayed on the list
-        session_info = i.text()
-        print(f"past_scan_date_selector index = {session_info}")
+    def past_scan_image_session_selector_index_changed(self, current, previous):
+        # The list is being reset, nothing is selected
+        if not current.isValid():
+            return
 
-        # Gets the actual session id from the name
-        session_id, crack_status, img_name = session_info.split("_")
-        completed_img_path = os.path.join(
-            self.database.get_base_filepath(self.USER_UUID),  # type: ignore
-            "complete",  # type: ignore
-            f"{session_id}-normal.jpg",  # type: ignore
-        )
+        record = self.past_scan_sessions_model.record_at(current.row())
+        print(f"past_scan_image_session_selector index = {record}")
 
-        if crack_status == "CRACK":
-            completed_img_path = os.path.join(
-                self.database.get_base_filepath(self.USER_UUID),  # type: ignore
-                "complete",  # type: ignore
-                f"{session_id}-normal.jpg",  # type: ignore
-            )
+        if record.crack_detected == 1:
+            variant = "normal"
             crack_detection_str = "Oh no! Crack detected!"
             background_color_css = "background-color: rgba(255, 0, 0, 0.25);"
         else:
-            completed_img_path = os.path.join(
-                self.database.get_base_filepath(self.USER_UUID),  # type: ignore
-                "complete",  # type: ignore
-                f"{session_id}-cropped.jpg",  # type: ignore
-            )
+            variant = "cropped"
             crack_detection_str = "Good job! No crack detected!"
             background_color_css = "background-color: rgba(0, 255, 0, 0.25);"
 
@@ -561,56 +618,37 @@ class MainWindow(QMainWindow):
             'font: 24 13pt "Fira Code";' + background_color_css
         )
 
-        # Sets the filepath of the image, then displays it
-        self.FILEPATH_OF_PAST_SCAN_IMAGE = completed_img_path
-        highlighted_output_pixmap = QPixmap(completed_img_path)
-        resized_highlighted_output_pixmap = highlighted_output_pixmap.scaled(400, 400)
-        self.past_scan_image_label.setPixmap(resized_highlighted_output_pixmap)
+        # Remember which image is displayed, then display it
+        self.SELECTED_SESSION_ID = record.session_id
+        self.PAST_SCAN_VARIANT = variant
+        self.show_past_scan_image()
         self.switch_image_button.setEnabled(True)
 
     def swap_past_scan_image(self):
 
         """Swap between a highlighted image, a slightly more precise highlighted image (risk associated), and the
-        reqgular raw image. Checks the filepath to see if it has the '-cropped' suffix. Changes the
-        FILEPATH_OF_PAST_SCAN_IMAGE string accordingly"""
+        reqgular raw image. Cached images are only decoded once"""
 
-        if "-cropped" in self.FILEPATH_OF_PAST_SCAN_IMAGE:
-            highlighted_file_path = self.FILEPATH_OF_PAST_SCAN_IMAGE.replace(
-                "-cropped", "-normal"
-            )
-            highlighted_output_pixmap = QPixmap(highlighted_file_path)
-            resized_highlighted_output_pixmap = highlighted_output_pixmap.scaled(
-                400, 400
-            )
-            self.past_scan_image_label.setPixmap(resized_highlighted_output_pixmap)
-            self.FILEPATH_OF_PAST_SCAN_IMAGE = highlighted_file_path
-            self.indicator_label.setText(
-                "The 'normal' image is shown (regular crack detection)"
-            )
-        elif "-normal" in self.FILEPATH_OF_PAST_SCAN_IMAGE:
-            highlighted_file_path = self.FILEPATH_OF_PAST_SCAN_IMAGE.replace(
-                "-normal", "-precise"
-            )
-            unhighlighted_output_pixmap = QPixmap(highlighted_file_path)
-            resized_unhighlighted_output_pixmap = unhighlighted_output_pixmap.scaled(
-                400, 400
-            )
-            self.past_scan_image_label.setPixmap(resized_unhighlighted_output_pixmap)
-            self.FILEPATH_OF_PAST_SCAN_IMAGE = highlighted_file_path
-            self.indicator_label.setText(
-                "The 'precise' image is shown (regular crack detection)"
-            )
-        elif "-precise" in self.FILEPATH_OF_PAST_SCAN_IMAGE:
-            highlighted_file_path = self.FILEPATH_OF_PAST_SCAN_IMAGE.replace(
-                "-precise", "-cropped"
-            )
-            unhighlighted_output_pixmap = QPixmap(highlighted_file_path)
-            resized_unhighlighted_output_pixmap = unhighlighted_output_pixmap.scaled(
-                400, 400
-            )
-            self.past_scan_image_label.setPixmap(resized_unhighlighted_output_pixmap)
-            self.FILEPATH_OF_PAST_SCAN_IMAGE = highlighted_file_path
-            self.indicator_label.setText("The original image is displayed")
+        if self.SELECTED_SESSION_ID is None:
+            return
+
+        self.PAST_SCAN_VARIANT, indicator_text = NEXT_SCAN_VARIANT[
+            self.PAST_SCAN_VARIANT
+        ]
+        self.show_past_scan_image()
+        self.indicator_label.setText(indicator_text)
+
+    def show_past_scan_image(self):
+        """Shows the selected image if cached, otherwise a filler until it is decoded"""
+        pixmap = self.scan_image_loader.request(
+            self.USER_UUID, self.SELECTED_SESSION_ID, self.PAST_SCAN_VARIANT  # type: ignore
+        )
+        if pixmap is None:
+            pixmap = filler_pixmap()
+        self.past_scan_image_label.setPixmap(pixmap)
+
+    def past_scan_image_ready(self, image_session_id, variant, pixmap):
+        self.past_scan_image_label.setPixmap(pixmap)
 
     def create_new_user(self):
         # Create a pop up with form
@@ -668,17 +706,11 @@ class MainWindow(QMainWindow):
             self.video_thread.set_user(self.USER_UUID)
             self.video_thread.start()  # TODO restart thread if changed user. Maybe? -> https://stackoverflow.com/questions/44006024/restart-qthread-with-gui
 
-            # Populate past scans initially
-            all_image_session = self.database.get_all_img_sessions_for_uuid(
+            # Populate past scan dates initially, sessions are loaded when a date is selected
+            image_session_dates = self.database.get_img_session_dates_for_uuid(
                 self.USER_UUID  # type: ignore
             )
-
-            for image_session in all_image_session:
-                date = str(image_session.date.date())
-                if self.image_session_dict.get(date, None) is None:
-                    self.image_session_dict[date] = []
-                self.image_session_dict[date].append(image_session)
-            self.past_scan_date_selector.addItems(self.image_session_dict.keys())
+            self.past_scan_dates_model.set_dates(image_session_dates)
 
             # Swap layouts
             self.stacked_layout.setCurrentIndex(1)
@@ -699,15 +731,84 @@ class MainWindow(QMainWindow):
 
     # @pyqtSlot(np.ndarray)
     def update_image(self, cv_img: np.ndarray) -> None:
-        qt_image = self._convert_cv_to_qt(cv_img)
-        if BETA_VERSION:
-            # qt_image = qt_image.scaled(720, 1280)
-            qt_image = qt_image.scaled(450, 800)
-        self.video_label.setPixmap(qt_image)
+        pixmap = self._convert_cv_to_qt(cv_img)
+        if self.live_overlay_checkbox.isChecked():
+            # Skipped when the previous frame is still being analyzed
+            self.live_overlay_scheduler.submit(cv_img)
+            self._draw_live_overlay(pixmap, cv_img.shape)
+        self.video_label.setPixmap(pixmap)
+
+    def _draw_live_overlay(self, pixmap: QPixmap, frame_shape) -> None:
+        """Draws the latest live overlay over the analyzed region of the preview"""
+        overlay_image = self.live_overlay_scheduler.overlay_image
+        if overlay_image is None:
+            return
+
+        # The overlay is low resolution, it is stretched over the region in preview pixels
+        scale_x = pixmap.width() / frame_shape[1]
+        scale_y = pixmap.height() / frame_shape[0]
+        y, x, h, w = roi_box()
+        painter = QPainter(pixmap)
+        painter.drawImage(
+            QRect(
+                int(x * scale_x), int(y * scale_y), int(w * scale_x), int(h * scale_y)
+            ),
+            overlay_image,
+        )
+        painter.end()
+
+    def live_overlay_toggled(self, checked: bool) -> None:
+        if not checked:
+            self.live_overlay_scheduler.clear()
 
     # @pyqtSlot(bool)
     def enable_initial_capture_toggle(self, toggle_state: bool) -> None:
         self.capture_image_button.setEnabled(toggle_state)
+        self.panorama_button.setEnabled(toggle_state)
+
+    def panorama_toggled(self, checked: bool) -> None:
+        if checked:
+            output_dir = os.path.join(
+                self.database.get_base_filepath(self.USER_UUID),
+                "panorama",
+                str(int(time.time() * 1000)),
+            )
+            self.panorama_thread = PanoramaThread(output_dir)
+            self.panorama_thread.progress_signal.connect(self.panorama_progress_handler)
+            self.panorama_thread.panorama_saved_signal.connect(
+                self.panorama_saved_handler
+            )
+            self.panorama_thread.start()
+            self.video_thread.set_panorama_thread(self.panorama_thread)
+            self.panorama_button.setText("Stop Panorama")
+        elif self.panorama_thread is not None:
+            self.video_thread.set_panorama_thread(None)
+            self.panorama_thread.stop()
+            # Enabled again once the panorama is saved
+            self.panorama_button.setEnabled(False)
+            self.panorama_button.setText("Saving Panorama...")
+
+    # @pyqtSlot(int)
+    def panorama_progress_handler(self, keyframes: int) -> None:
+        self.panorama_button.setText(f"Stop Panorama ({keyframes} frames)")
+
+    # @pyqtSlot(str)
+    def panorama_saved_handler(self, pyramid_dir: str) -> None:
+        self.panorama_thread.wait()  # type: ignore
+        self.panorama_thread = None
+        self.panorama_button.setText("Start Panorama")
+        self.panorama_button.setEnabled(True)
+
+        if pyramid_dir:
+            print(f"Panorama saved to {pyramid_dir}")
+            PanoramaDialog(pyramid_dir, parent=self).exec()
+            return
+
+        panorama_alert = QMessageBox(self)
+        panorama_alert.setStandardButtons(QMessageBox.Ok)  # type: ignore
+        panorama_alert.setWindowTitle("Panorama")
+        panorama_alert.setText("No frames could be stitched, please try again")
+        panorama_alert.exec()
 
     # @pyqtSlot(bool)
     def completed_capture_handler(self, capture_status: bool) -> None:
@@ -716,9 +817,16 @@ class MainWindow(QMainWindow):
             image_crack_detection_worker = CrackDetectHighlight(
                 self.database, self.MOST_RECENT_IMAGE_SESSION, self.USER_UUID
             )
-            image_crack_detection_worker.signals.finished.connect(
+            # Results are shown stage by stage, the verdict first then each image
+            image_crack_detection_worker.signals.verdict_ready.connect(
                 self.update_past_scans_list
             )
+            image_crack_detection_worker.signals.image_ready.connect(
+                self.scan_image_ready_handler
+            )
+            image_crack_detection_worker.signals.finished.connect(
+                self.crack_detection_finished_handler
+            )
             self.session_id_to_thread_worker[
                 self.MOST_RECENT_IMAGE_SESSION
             ] = image_crack_detection_worker
@@ -726,66 +834,102 @@ class MainWindow(QMainWindow):
 
         self.capture_image_button.setEnabled(capture_status)
 
-    # @pyqtSlot(int)
+    # @pyqtSlot(str)
+    def rejected_capture_handler(self, reasons: str) -> None:
+        """Handler when a capture fails the quality check, nothing was analyzed"""
+        print(f"Capture rejected: {reasons}")
+        self.capture_image_button.setEnabled(True)
+
+        retake_alert = QMessageBox(self)
+        retake_alert.setStandardButtons(QMessageBox.Ok)  # type: ignore
+        retake_alert.setWindowTitle("Please Retake")
+        retake_alert.setText(f"Please retake the image: {reasons}")
+        retake_alert.exec()
+
+    # @pyqtSlot(str)
+    def write_failed_handler(self, message: str) -> None:
+        """Handler when a background database write fails"""
+        write_alert = QMessageBox(self)
+        write_alert.setStandardButtons(QMessageBox.Ok)  # type: ignore
+        write_alert.setWindowTitle("Database Error")
+        write_alert.setText(message)
+        write_alert.exec()
+
+    # @pyqtSlot(str)
     def update_past_scans_list(self, image_session_id):
-        """Updates the list of past scans after an image session computation is completed"""
+        """Updates the list of past scans as soon as a session's verdict is ready"""
         image_session_id = int(image_session_id)
         image_session = self.database.get_img_session_for_uuid(
             self.USER_UUID, image_session_id  # type: ignore
         )
-        self.session_id_to_thread_worker[image_session_id].stop_thread()
 
-        crack_status = ""
-        if image_session.crack_detected == 1:
-            crack_status = "CRACK"
-        elif image_session.crack_detected == 0:
-            crack_status = "NOCRACK"
-
-        final_str = (
-            f"{image_session.session_id}_{crack_status}_{image_session.image_name}"
-        )
-
-        date = str(image_session.date.date())
-        # If no dates in date list, add date
-        current_list_widget_dates = [
-            self.past_scan_date_selector.item(x).text()
-            for x in range(self.past_scan_date_selector.count())
-        ]
-        if not date in current_list_widget_dates:
-            self.past_scan_date_selector.addItem(date)
+        # Both are constant time, no matter how many dates and sessions are listed
+        record = PastScanRecord.from_image_session(image_session)
+        self.past_scan_dates_model.add_date(str(record.date.date()))
+        self.past_scan_sessions_model.add_session(record)
 
-        if self.image_session_dict.get(date, None) is None:
-            self.image_session_dict[date] = []
-        self.image_session_dict[date].append(image_session)
-
-        if self.SELECTED_DATE == date:
-            self.past_scan_image_session_selector.addItem(final_str)  # type: ignore
-
-        print("Crack detection is done")
-        show_current_scan_result = PreviewImageDialog(
+        print("Crack detection verdict is ready")
+        preview_dialog = PreviewImageDialog(
             self.USER_UUID,
             image_session,
             self.database,
             parent=self,
         )
 
-        dialog_action = show_current_scan_result.exec()
+        # The images fill in while the dialog is open, see scan_image_ready_handler
+        self.preview_dialogs[image_session_id] = preview_dialog
+        dialog_action = preview_dialog.exec()
+        self.preview_dialogs.pop(image_session_id, None)
         if dialog_action:
             print("Closed!")
 
+    # @pyqtSlot(str, str)
+    def scan_image_ready_handler(self, image_session_id, variant):
+        """Shows a newly saved image wherever that session and variant is displayed"""
+        image_session_id = int(image_session_id)
+        preview_dialog = self.preview_dialogs.get(image_session_id)
+        if preview_dialog is not None:
+            preview_dialog.scan_image_available(image_session_id, variant)
+
+        if (
+            self.SELECTED_SESSION_ID == image_session_id
+            and self.PAST_SCAN_VARIANT == variant
+        ):
+            self.show_past_scan_image()
+
+    # @pyqtSlot(str)
+    def crack_detection_finished_handler(self, image_session_id):
+        """Every image of the session is saved, release the worker"""
+        worker = self.session_id_to_thread_worker.pop(int(image_session_id), None)
+        if worker is not None:
+            worker.stop_thread()
+        print("Crack detection is done")
+
     def _convert_cv_to_qt(self, cv_img) -> QPixmap:
-        """Convert from an opencv image to QPixmap"""
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        convert_to_Qt_format = QImage(
-            rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888  # type: ignore
-        )
-        return QPixmap.fromImage(convert_to_Qt_format)
+        """Convert from an opencv image (grayscale or BGR) to a QPixmap at the preview size"""
+        return QPixmap.fromImage(self.preview_renderer.render(cv_img))
+
+    def start_idle_backup(self):
+        """
+        Starts a backup unless one is running or captures are still being analyzed
+        """
+        if self.backup_running or self.crack_detection_thread_pool.activeThreadCount():
+            return
+
+        self.backup_running = True
+        backup_task = BackupTask(BACKUP_DIR, self.database.db_name)  # type: ignore
+        backup_task.signals.finished.connect(self.backup_finished_handler)
+        self.backup_thread_pool.start(backup_task)
+
+    def backup_finished_handler(self):
+        self.backup_running = False
 
     def closeEvent(self, event):
         if self.video_thread:
             self.video_thread.stop()
+        if self.panorama_thread is not None:
+            self.panorama_thread.stop()
+            self.panorama_thread.wait()
         event.accept()
 
 
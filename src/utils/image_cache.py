@@ -0,0 +1,162 @@
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from PyQt5.QtCore import QObject, QRunnable, QSize, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+
+from utils.database import nmlDB
+from utils.version import SCAN_DISPLAY_SIZE, PIXMAP_CACHE_MB, PANORAMA_TILE_CACHE_MB
+
+
+class LRUCache:
+    """
+    Keeps the most recently used values until their total size passes max_bytes,
+    size_of gives the size in bytes of a value
+    """
+
+    def __init__(self, max_bytes: int, size_of: Callable[[Any], int]) -> None:
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.discard(key)
+        size = self.size_of(value)
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+
+        # Always keep the newest value, even if it is bigger than the cap on its own
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+
+
+def get_scan_img_path(user_uuid: str, image_session_id: int, variant: str) -> str:
+    return os.path.join(
+        nmlDB.get_base_filepath(user_uuid),
+        "complete",
+        f"{image_session_id}-{variant}.jpg",
+    )
+
+
+def load_scaled_image(img_path: str, size: int = SCAN_DISPLAY_SIZE) -> QImage:
+    """
+    Decodes an image straight to size x size, JPEGs are decoded at a reduced scale
+    instead of decoding the full image and scaling it afterwards
+    """
+    reader = QImageReader(img_path)
+    reader.setScaledSize(QSize(size, size))
+    return reader.read()
+
+
+def _pixmap_bytes(pixmap: QPixmap) -> int:
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+# Ready to display past scan images, keyed by (image session id, variant)
+scan_pixmap_cache = LRUCache(PIXMAP_CACHE_MB * 1024 * 1024, _pixmap_bytes)
+
+# Panorama tiles, keyed by (pyramid folder, level, column, row)
+panorama_tile_cache = LRUCache(PANORAMA_TILE_CACHE_MB * 1024 * 1024, _pixmap_bytes)
+
+
+class ScanImageLoadSignals(QObject):
+    # (cache key, request generation, decoded image)
+    finished = pyqtSignal(object, int, QImage)
+
+
+class ScanImageLoadTask(QRunnable):
+    def __init__(self, img_path: str, key: Hashable, generation: int) -> None:
+        super().__init__()
+        self.img_path = img_path
+        self.key = key
+        self.generation = generation
+        self.signals = ScanImageLoadSignals()
+
+    def run(self):
+        # QImage is safe to use off the GUI thread, QPixmap is not
+        self.signals.finished.emit(
+            self.key, self.generation, load_scaled_image(self.img_path)
+        )
+
+
+class ScanImageLoader(QObject):
+    """
+    Decodes past scan images on a worker thread so browsing never blocks the GUI thread
+    and the live camera feed. Only the newest request is delivered through image_ready,
+    older ones still waiting are dropped
+    """
+
+    # (image session id, variant, pixmap), session ids do not fit a C++ int
+    image_ready = pyqtSignal(object, str, QPixmap)
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.generation = 0
+
+    def request(
+        self, user_uuid: str, image_session_id: int, variant: str
+    ) -> Optional[QPixmap]:
+        """
+        Returns the pixmap right away if it is cached, otherwise returns None and emits
+        image_ready once it is decoded
+        """
+        self.cancel()
+
+        key = (image_session_id, variant)
+        pixmap = scan_pixmap_cache.get(key)
+        if pixmap is not None:
+            return pixmap
+
+        task = ScanImageLoadTask(
+            get_scan_img_path(user_uuid, image_session_id, variant),
+            key,
+            self.generation,
+        )
+        task.signals.finished.connect(self._task_finished)
+        self.thread_pool.start(task)
+        return None
+
+    def cancel(self) -> None:
+        """
+        Drops every pending request, the user moved on
+        """
+        self.generation += 1
+        self.thread_pool.clear()
+
+    def _task_finished(self, key, generation: int, image: QImage) -> None:
+        # Missing images are not cached, they may still be being written
+        if image.isNull():
+            return
+
+        # Decoded anyway, so keep it even if the user already moved on
+        pixmap = QPixmap.fromImage(image)
+        scan_pixmap_cache.put(key, pixmap)
+        if generation == self.generation:
+            self.image_ready.emit(key[0], key[1], pixmap)
@@ -1,8 +1,23 @@
 import cv2
 import os
 import glob
+import numpy as np
+from typing import Iterable, Iterator, Optional, Tuple
 
-def save_all_frames_from_video(video_path, dir_to_save_frames, basename_of_frames, ext='jpg'):
+from utils.tile_pyramid import write_tile_pyramid
+from utils.version import (
+    STITCH_KEYFRAME_OVERLAP,
+    STITCH_MOTION_SCALE,
+    STITCH_REGISTRATION_SCALE,
+    STITCH_ORB_FEATURES,
+    STITCH_MIN_MATCHES,
+    STITCH_MAX_CANVAS_MP,
+)
+
+
+def save_all_frames_from_video(
+    video_path, dir_to_save_frames, basename_of_frames, ext="jpg"
+):
 
     # video_path is the path to the input video
     # dir_path is the path where the images, or "frames", should be saved
@@ -24,29 +39,336 @@ def save_all_frames_from_video(video_path, dir_to_save_frames, basename_of_frame
     while True:
         ret, frame = cap.read()
         if ret:
-            cv2.imwrite('{}_{}.{}'.format(base_path, str(n).zfill(digit), ext), frame)
+            cv2.imwrite("{}_{}.{}".format(base_path, str(n).zfill(digit), ext), frame)
             n += 1
         else:
             return
 
-def image_stitch(sensitivity_factor, images_folder, ext='jpg'):
+
+def image_stitch(sensitivity_factor, images_folder, ext="jpg"):
 
     # images_folder is where all the images, or "frames", of the input video are
-    image_path = glob.glob(images_folder + '/*.' + ext)
+    # Frame numbers are zero padded, sorting puts them back in video order
+    image_path = sorted(glob.glob(images_folder + "/*." + ext))
     image_path = image_path[0::sensitivity_factor]
     images = []
 
     for image in image_path:
         img = cv2.imread(image)
         images.append(img)
-        #cv2.imshow("Image", img)
-        #cv2.waitKey(0)
+        # cv2.imshow("Image", img)
+        # cv2.waitKey(0)
+
+    stitched_img = stitch_frames(images)
+
+    if stitched_img is not None:
+        # Tiles instead of one huge image, see TiledImageViewer
+        write_tile_pyramid(stitched_img, "stitchedOutput")
+
+
+def iter_video_frames(video_path: str) -> Iterator[np.ndarray]:
+    """
+    Decodes the video one frame at a time, nothing is written to disk
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def motion_frame(frame: np.ndarray, scale: float = STITCH_MOTION_SCALE) -> np.ndarray:
+    """
+    Small grayscale float copy of a frame to measure motion on
+    """
+    small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.float32)
+
+
+def frame_shift(
+    previous: np.ndarray, current: np.ndarray, window: Optional[np.ndarray] = None
+) -> Tuple[float, float]:
+    """
+    (dx, dy) translation between two motion frames by phase correlation, in motion frame
+    pixels. window is an optional Hanning window of the frame size, it keeps the frame
+    edges from dominating the estimate
+    """
+    (dx, dy), _ = cv2.phaseCorrelate(previous, current, window)
+    return dx, dy
+
+
+def iter_keyframes(
+    frames: Iterable[np.ndarray],
+    min_overlap: float = STITCH_KEYFRAME_OVERLAP,
+    scale: float = STITCH_MOTION_SCALE,
+) -> Iterator[np.ndarray]:
+    """
+    Keeps the frames the stitcher needs out of a stream of video frames. The motion
+    between consecutive frames is added up and a frame is kept once its overlap with the
+    last kept frame would drop below min_overlap, so a slow pan keeps few frames and a
+    fast one keeps many. The first frame is always kept and the last one too if the camera
+    moved since the last kept frame
+    """
+    window = None
+    previous = None
+    last_frame = None
+    shift_x = shift_y = 0.0
+
+    for frame in frames:
+        current = motion_frame(frame, scale)
+        if previous is None:
+            window = cv2.createHanningWindow(current.shape[::-1], cv2.CV_32F)
+            previous = current
+            yield frame
+            continue
+
+        dx, dy = frame_shift(previous, current, window)
+        previous = current
+        shift_x += dx
+        shift_y += dy
+
+        h, w = current.shape
+        overlap = max(1 - abs(shift_x) / w, 0) * max(1 - abs(shift_y) / h, 0)
+        if overlap < min_overlap:
+            shift_x = shift_y = 0.0
+            last_frame = None
+            yield frame
+        else:
+            last_frame = frame
+
+    # Less than a motion pixel is jitter, not coverage
+    if last_frame is not None and max(abs(shift_x), abs(shift_y)) >= 1:
+        yield last_frame
+
+
+def stitch_frames(frames: Iterable[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Stitches the frames into one panorama, returns None if OpenCV could not stitch them
+    """
+    images = list(frames)
+    if len(images) < 2:
+        return images[0] if images else None
 
     imageStitcher = cv2.Stitcher_create()
 
     error, stitched_img = imageStitcher.stitch(images)
+    if error:
+        print(f"Stitching failed with status {error}")
+        return None
+    return stitched_img
+
+
+def stitch_video(
+    video_path: str,
+    output_dir: str = "stitchedOutput",
+    min_overlap: float = STITCH_KEYFRAME_OVERLAP,
+) -> Optional[np.ndarray]:
+    """
+    Stitches a scan video in one pass, the video is decoded once and only the keyframes
+    are kept in memory. Saves the panorama as a tile pyramid in output_dir and returns it
+    """
+    keyframes = list(iter_keyframes(iter_video_frames(video_path), min_overlap))
+    print(f"Stitching {len(keyframes)} keyframes of {video_path}")
+
+    stitched_img = stitch_frames(keyframes)
+    if stitched_img is not None:
+        write_tile_pyramid(stitched_img, output_dir)
+    return stitched_img
+
+
+class IncrementalStitcher:
+    """
+    Builds a panorama one frame at a time, so it can run while frames still arrive and
+    a frame that cannot be registered is dropped instead of failing the whole panorama.
+
+    Every frame is registered against the last keyframe with ORB features found on a
+    downscaled copy, the transforms are chained into panorama coordinates. A frame
+    becomes a keyframe once its overlap with the last one drops below min_overlap and
+    only keyframes are drawn, once, at full resolution onto a canvas that grows with the
+    panorama up to max_canvas_mp megapixels
+    """
+
+    def __init__(
+        self,
+        scale: float = STITCH_REGISTRATION_SCALE,
+        min_overlap: float = STITCH_KEYFRAME_OVERLAP,
+        n_features: int = STITCH_ORB_FEATURES,
+        min_matches: int = STITCH_MIN_MATCHES,
+        max_canvas_mp: float = STITCH_MAX_CANVAS_MP,
+    ) -> None:
+        self.scale = scale
+        self.min_overlap = min_overlap
+        self.min_matches = min_matches
+        self.max_canvas_pixels = int(max_canvas_mp * 1_000_000)
+        self.orb = cv2.ORB_create(n_features)
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+
+        self.canvas: Optional[np.ndarray] = None
+        self.coverage: Optional[np.ndarray] = None
+        # Canvas position (x, y) of the first frame's top left corner
+        self.origin = np.zeros(2)
+
+        # Points (full resolution), descriptors and panorama transform of the last keyframe
+        self._reference: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+        # Latest frame that was registered but not drawn, and its panorama transform
+        self._latest: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+        self.keyframes = 0
+        self.dropped = 0
+
+    def _features(self, frame: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        small = cv2.resize(
+            frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+        )
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        keypoints, descriptors = self.orb.detectAndCompute(small, None)
+        points = np.float32([keypoint.pt for keypoint in keypoints]) / self.scale
+        return points.reshape(-1, 2), descriptors
+
+    def _register(
+        self, points: np.ndarray, descriptors: Optional[np.ndarray]
+    ) -> Optional[np.ndarray]:
+        """
+        Affine transform (2x3) from the frame to the last keyframe, None if the frame
+        cannot be registered
+        """
+        reference_points, reference_descriptors, _ = self._reference  # type: ignore
+        if descriptors is None or len(points) < self.min_matches:
+            return None
+
+        try:
+            matches = self.matcher.match(descriptors, reference_descriptors)
+        except cv2.error as e:
+            print(f"Frame could not be matched: {e}")
+            return None
+        if len(matches) < self.min_matches:
+            return None
+
+        src = points[[match.queryIdx for match in matches]]
+        dst = reference_points[[match.trainIdx for match in matches]]
+        # Rotation, translation and uniform scale, a handheld probe does not shear
+        affine, inliers = cv2.estimateAffinePartial2D(
+            src, dst, method=cv2.RANSAC, ransacReprojThreshold=3 / self.scale
+        )
+        if affine is None or int(inliers.sum()) < self.min_matches:
+            return None
+        return affine
+
+    def add(self, frame: np.ndarray) -> bool:
+        """
+        Registers frame and draws it if it is a new keyframe, returns whether it was drawn
+        """
+        points, descriptors = self._features(frame)
+        if self._reference is None:
+            # Later frames are registered against it, a dark or blank frame cannot be
+            if descriptors is None or len(points) < self.min_matches:
+                self.dropped += 1
+                return False
+            transform = np.eye(3)
+        else:
+            affine = self._register(points, descriptors)
+            if affine is None:
+                self.dropped += 1
+                return False
+
+            h, w = frame.shape[:2]
+            shift_x, shift_y = affine[:, 2]
+            overlap = max(1 - abs(shift_x) / w, 0) * max(1 - abs(shift_y) / h, 0)
+            transform = self._reference[2] @ np.vstack([affine, [0, 0, 1]])
+            if overlap >= self.min_overlap:
+                self._latest = (frame, transform)
+                return False
+
+        if not self._composite(frame, transform):
+            self.dropped += 1
+            return False
+
+        self._reference = (points, descriptors, transform)  # type: ignore
+        self._latest = None
+        self.keyframes += 1
+        return True
+
+    def finish(self) -> None:
+        """
+        Draws the latest frame if it was not a keyframe, so the panorama reaches as far as
+        the camera went
+        """
+        if self._latest is not None and self._composite(*self._latest):
+            self.keyframes += 1
+        self._latest = None
+
+    def _grow_canvas(self, x0: int, y0: int, x1: int, y1: int, margin: int) -> bool:
+        """
+        Makes the canvas cover the box (x0, y0, x1, y1), growing it with margin to spare so
+        it is not copied for every keyframe. Returns False if it would get too big
+        """
+        h, w = self.canvas.shape[:2]  # type: ignore
+        left = margin if x0 < 0 else 0
+        top = margin if y0 < 0 else 0
+        right = margin if x1 > w else 0
+        bottom = margin if y1 > h else 0
+        if not (left or top or right or bottom):
+            return True
+
+        left, top = max(left, -x0), max(top, -y0)
+        right, bottom = max(right, x1 - w), max(bottom, y1 - h)
+        new_w, new_h = w + left + right, h + top + bottom
+        if new_w * new_h > self.max_canvas_pixels:
+            print("Panorama is at its size limit, dropping frame")
+            return False
+
+        canvas = np.zeros((new_h, new_w, *self.canvas.shape[2:]), dtype=self.canvas.dtype)  # type: ignore
+        canvas[top : top + h, left : left + w] = self.canvas
+        coverage = np.zeros((new_h, new_w), dtype=np.uint8)
+        coverage[top : top + h, left : left + w] = self.coverage
+        self.canvas, self.coverage = canvas, coverage
+        self.origin += (left, top)
+        return True
+
+    def _composite(self, frame: np.ndarray, transform: np.ndarray) -> bool:
+        h, w = frame.shape[:2]
+        if self.canvas is None:
+            self.canvas = np.zeros_like(frame)
+            self.coverage = np.zeros((h, w), dtype=np.uint8)
+
+        corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        corners = cv2.transform(corners, transform[:2]).reshape(-1, 2)
+        x0, y0 = np.floor(corners.min(axis=0) + self.origin).astype(int)
+        x1, y1 = np.ceil(corners.max(axis=0) + self.origin).astype(int)
+        if not self._grow_canvas(x0, y0, x1, y1, max(h, w) // 2):
+            return False
+
+        # Growing to the left or top moved the origin
+        x0, y0 = np.floor(corners.min(axis=0) + self.origin).astype(int)
+        x1, y1 = np.ceil(corners.max(axis=0) + self.origin).astype(int)
+        affine = transform[:2].copy()
+        affine[:, 2] += self.origin - (x0, y0)
+        size = (x1 - x0, y1 - y0)
+
+        # Only the box the frame lands in is warped, never the whole canvas
+        warped = cv2.warpAffine(frame, affine, size, flags=cv2.INTER_LINEAR)
+        mask = cv2.warpAffine(
+            np.full((h, w), 255, dtype=np.uint8), affine, size, flags=cv2.INTER_NEAREST
+        )
+        # The outermost pixels are blended with the black border, leave them out
+        mask = cv2.erode(mask, np.ones((3, 3), np.uint8)) > 0
+        self.canvas[y0:y1, x0:x1][mask] = warped[mask]  # type: ignore
+        self.coverage[y0:y1, x0:x1][mask] = 255  # type: ignore
+        return True
 
-    if not error:
-        cv2.imwrite("stitchedOutput.png", stitched_img)
-        cv2.imshow("Stitched Image", stitched_img)
-        #cv2.waitKey(0)
\ No newline at end of file
+    def panorama(self) -> Optional[np.ndarray]:
+        """
+        The panorama so far, cropped to the part covered by frames
+        """
+        if self.canvas is None:
+            return None
+        x, y, w, h = cv2.boundingRect(self.coverage)
+        return self.canvas[y : y + h, x : x + w].copy()
@@ -0,0 +1,125 @@
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from utils.quality import crop_roi
+from utils.version import (
+    LIVE_OVERLAY_INTERVAL_MS,
+    LIVE_OVERLAY_SCALE,
+    LIVE_OVERLAY_SENSITIVITY,
+)
+
+# BGRA, which is the byte order of QImage.Format_ARGB32
+OVERLAY_COLOR = (0, 0, 255, 200)
+
+
+def fast_crack_mask(
+    roi: np.ndarray,
+    sensitivity: int = LIVE_OVERLAY_SENSITIVITY,
+    scale: float = LIVE_OVERLAY_SCALE,
+) -> np.ndarray:
+    """
+    Quick version of CrackDetectHighlight.highlight_cracks for the live preview. Runs on a
+    downscaled region with smaller filters and skips the feature drawing, returns a
+    0/255 mask of the downscaled region
+    """
+    small = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    blur = cv2.GaussianBlur(small, (5, 5), 0)
+
+    # Same logarithmic transform, as a lookup table
+    max_value = max(int(blur.max()), 1)
+    lut = np.log(np.arange(256) + 1) / np.log(1 + max_value) * 255
+    img_log = cv2.LUT(blur, np.clip(lut, 0, 255).astype(np.uint8))
+
+    bilateral = cv2.bilateralFilter(img_log, 9, 22, 22)
+    edges = cv2.Canny(bilateral, sensitivity, sensitivity)
+    return cv2.morphologyEx(edges, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+
+
+def mask_to_overlay(mask: np.ndarray) -> np.ndarray:
+    """Transparent BGRA image with the mask drawn in OVERLAY_COLOR"""
+    overlay = np.zeros((*mask.shape, 4), dtype=np.uint8)
+    overlay[mask > 0] = OVERLAY_COLOR
+    return overlay
+
+
+class LiveOverlaySignals(QObject):
+    # (request generation, BGRA overlay)
+    finished = pyqtSignal(int, object)
+
+
+class LiveOverlayTask(QRunnable):
+    def __init__(self, roi: np.ndarray, generation: int) -> None:
+        super().__init__()
+        self.roi = roi
+        self.generation = generation
+        self.signals = LiveOverlaySignals()
+
+    def run(self):
+        self.signals.finished.emit(
+            self.generation, mask_to_overlay(fast_crack_mask(self.roi))
+        )
+
+
+class LiveOverlayScheduler(QObject):
+    """
+    Samples preview frames for the live overlay. A frame is only analyzed when the
+    interval passed and the previous analysis finished, every other frame is skipped,
+    so the preview never waits on the analysis
+    """
+
+    overlay_ready = pyqtSignal()
+
+    def __init__(self, interval_ms: int = LIVE_OVERLAY_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.interval = interval_ms / 1000
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.busy = False
+        self.last_submit = 0.0
+        self.generation = 0
+        self.overlay_image: Optional[QImage] = None
+        self._overlay: Optional[np.ndarray] = None
+
+    def submit(self, frame: np.ndarray) -> bool:
+        """
+        Starts analyzing frame unless it has to be skipped, returns whether it was started
+        """
+        now = time.monotonic()
+        if self.busy or now - self.last_submit < self.interval:
+            return False
+
+        self.busy = True
+        self.last_submit = now
+        # Copy the small region, the worker must not hold on to the frame
+        task = LiveOverlayTask(np.array(crop_roi(frame)), self.generation)
+        task.signals.finished.connect(self._task_finished)
+        self.thread_pool.start(task)
+        return True
+
+    def clear(self) -> None:
+        """
+        Forgets the current overlay, e.g. when the live overlay is turned off. An
+        analysis still running is dropped when it finishes
+        """
+        self.generation += 1
+        self.overlay_image = None
+        self._overlay = None
+
+    def _task_finished(self, generation: int, overlay: np.ndarray) -> None:
+        self.busy = False
+        if generation != self.generation:
+            return
+
+        # The QImage wraps the array, keep it alive with it
+        self._overlay = overlay
+        h, w = overlay.shape[:2]
+        self.overlay_image = QImage(overlay.data, w, h, w * 4, QImage.Format_ARGB32)
+        self.overlay_ready.emit()
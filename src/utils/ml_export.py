@@ -0,0 +1,111 @@
+import os
+import json
+from typing import Dict, List, Tuple, Union, Literal
+
+import numpy as np
+
+from utils.database import nmlDB
+
+MANIFEST_FILE = "manifest.json"
+
+
+class _ShardWriter:
+    """
+    Fills one fixed size shard buffer for images of a single shape and dtype, the buffer is
+    reused for every shard so memory only depends on the shard size
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        shape: Tuple[int, ...],
+        dtype: np.dtype,
+        shard_size: int,
+        manifest: dict,
+    ):
+        self.out_dir = out_dir
+        self.shape = shape
+        self.dtype = dtype
+        self.manifest = manifest
+        self.data = np.empty((shard_size, *shape), dtype=dtype)
+        self.labels = np.empty(shard_size, dtype=np.int64)
+        self.count = 0
+
+    def add(self, img: np.ndarray, classifier: int) -> None:
+        self.data[self.count] = img
+        self.labels[self.count] = classifier
+        self.count += 1
+        if self.count == len(self.data):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.count:
+            return
+
+        shard_index = len(self.manifest["shards"])
+        data_file = f"data_{shard_index:05d}.npy"
+        labels_file = f"labels_{shard_index:05d}.npy"
+        np.save(os.path.join(self.out_dir, data_file), self.data[: self.count])
+        np.save(os.path.join(self.out_dir, labels_file), self.labels[: self.count])
+
+        self.manifest["shards"].append(
+            {
+                "data": data_file,
+                "labels": labels_file,
+                "rows": self.count,
+                "shape": list(self.shape),
+                "dtype": str(self.dtype),
+            }
+        )
+        self.manifest["total_rows"] += self.count
+        self.count = 0
+
+
+def export_ml_data_shards(
+    db: nmlDB,
+    out_dir: str,
+    shard_size: int = 2048,
+    classifier: Union[Literal["ALL"], Literal["CRACK"], Literal["NO_CRACK"]] = "ALL",
+) -> dict:
+    """
+    Streams the ml data table into .npy shards of at most shard_size rows plus a matching
+    labels file per shard and a manifest. Images of different shapes (e.g. 158x158 and
+    325x325 crops) go to separate shards, legacy rows without a shape are flat uint8.
+    Returns the manifest
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"total_rows": 0, "shards": []}
+    writers: Dict[Tuple[Tuple[int, ...], str], _ShardWriter] = {}
+
+    for _, entry_classifier, img in db.iter_ml_data(classifier):
+        writer_key = (img.shape, str(img.dtype))
+        writer = writers.get(writer_key)
+        if writer is None:
+            writer = _ShardWriter(out_dir, img.shape, img.dtype, shard_size, manifest)
+            writers[writer_key] = writer
+        writer.add(img, entry_classifier)
+
+    for writer in writers.values():
+        writer.flush()
+
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Exported {manifest['total_rows']} rows in {len(manifest['shards'])} shards")
+    return manifest
+
+
+def load_ml_shards(out_dir: str) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Opens every exported shard memory mapped, nothing is read until it is used
+    """
+    with open(os.path.join(out_dir, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+
+    return [
+        (
+            np.load(os.path.join(out_dir, shard["data"]), mmap_mode="r"),
+            np.load(os.path.join(out_dir, shard["labels"]), mmap_mode="r"),
+        )
+        for shard in manifest["shards"]
+    ]
@@ -0,0 +1,73 @@
+import queue
+from typing import Optional
+
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from utils.image_stitcher import IncrementalStitcher
+from utils.tile_pyramid import write_tile_pyramid
+from utils.version import STITCH_QUEUE_SIZE
+
+
+class PanoramaThread(QThread):
+    """
+    Stitches camera frames into a panorama while they arrive. VideoThread hands frames
+    over with offer, frames that arrive while the queue is full are dropped so the camera
+    never waits on the stitcher
+    """
+
+    # Keyframes drawn so far
+    progress_signal = pyqtSignal(int)
+    # Tile pyramid folder of the saved panorama, empty if nothing could be stitched
+    panorama_saved_signal = pyqtSignal(str)
+
+    def __init__(self, output_dir: str, queue_size: int = STITCH_QUEUE_SIZE):
+        super().__init__()
+        self._run_flag = True
+        self.output_dir = output_dir
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.stitcher = IncrementalStitcher()
+
+    def offer(self, frame: np.ndarray) -> bool:
+        """Queues frame unless the queue is full, returns whether it was queued"""
+        try:
+            self.frame_queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        try:
+            return self.frame_queue.get(timeout=0.1)
+        except queue.Empty:
+            return None
+
+    def run(self):
+        saved_dir = ""
+        try:
+            # Frames queued before stop are still stitched
+            while self._run_flag or not self.frame_queue.empty():
+                frame = self._next_frame()
+                if frame is not None and self.stitcher.add(frame):
+                    self.progress_signal.emit(self.stitcher.keyframes)
+
+            self.stitcher.finish()
+            panorama = self.stitcher.panorama()
+            if panorama is None:
+                return
+
+            print(
+                f"Panorama of {self.stitcher.keyframes} keyframes, {self.stitcher.dropped} frames dropped"
+            )
+            write_tile_pyramid(panorama, self.output_dir)
+            saved_dir = self.output_dir
+        finally:
+            # The GUI waits on this to give the panorama button back, even after an error
+            self.panorama_saved_signal.emit(saved_dir)
+
+    def stop(self):
+        """
+        Stops taking frames, the panorama is saved in the background and announced with
+        panorama_saved_signal
+        """
+        self._run_flag = False
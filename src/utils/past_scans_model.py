@@ -0,0 +1,214 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from utils.database import nmlDB, ImageSession
+from utils.version import PAST_SCAN_PAGE_SIZE
+
+
+class PastScanRecord:
+    """
+    What the past scans list needs to know about an image session, detached from the
+    database session it was loaded with
+    """
+
+    def __init__(
+        self,
+        session_id: int,
+        date: datetime,
+        crack_detected: Optional[int],
+        image_name: str,
+    ) -> None:
+        self.session_id = session_id
+        self.date = date
+        self.crack_detected = crack_detected
+        self.image_name = image_name
+
+    def __repr__(self) -> str:
+        return f"PastScanRecord=({self.session_id}, {self.date}, {self.crack_detected}, {self.image_name})"
+
+    @classmethod
+    def from_image_session(cls, image_session: ImageSession) -> "PastScanRecord":
+        return cls(
+            image_session.session_id,
+            image_session.date,
+            image_session.crack_detected,
+            image_session.image_name,
+        )
+
+    @property
+    def crack_status(self) -> str:
+        if self.crack_detected == 1:
+            return "CRACK"
+        elif self.crack_detected == 0:
+            return "NOCRACK"
+        return ""
+
+    @property
+    def display_text(self) -> str:
+        return f"{self.session_id}_{self.crack_status}_{self.image_name}"
+
+
+class PastScanDatesModel(QAbstractListModel):
+    """
+    Dates (YYYY-MM-DD) that have image sessions and how many sessions each has, with
+    constant time membership checks
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self._dates: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._counts: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._dates)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):  # type: ignore
+        if not index.isValid() or role != Qt.DisplayRole:  # type: ignore
+            return None
+        date = self._dates[index.row()]
+        count = self._counts[date]
+        return f"{date} ({count} scan{'' if count == 1 else 's'})"
+
+    def __contains__(self, date: str) -> bool:
+        return date in self._counts
+
+    def date_at(self, row: int) -> str:
+        return self._dates[row]
+
+    def count_on(self, date: str) -> int:
+        return self._counts.get(date, 0)
+
+    def set_dates(self, date_counts: List[Tuple[str, int]]) -> None:
+        """
+        Lists the (date, number of sessions) pairs, as get_img_session_dates_for_uuid returns
+        """
+        self.beginResetModel()
+        self._dates = [date for date, _ in date_counts]
+        self._rows = {date: row for row, date in enumerate(self._dates)}
+        self._counts = dict(date_counts)
+        self.endResetModel()
+
+    def add_date(self, date: str) -> bool:
+        """
+        Counts a new session on date, appending date unless it is already listed. Returns
+        whether it was added
+        """
+        if date in self._counts:
+            self._counts[date] += 1
+            row = self._rows[date]
+            self.dataChanged.emit(self.index(row), self.index(row))
+            return False
+
+        row = len(self._dates)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._dates.append(date)
+        self._rows[date] = row
+        self._counts[date] = 1
+        self.endInsertRows()
+        return True
+
+
+class PastScanSessionsModel(QAbstractListModel):
+    """
+    Image sessions of one user on one date. Sessions are fetched from the database a page
+    at a time as the view scrolls, so opening a date costs one page no matter how many
+    sessions it has
+    """
+
+    def __init__(
+        self, database: nmlDB, page_size: int = PAST_SCAN_PAGE_SIZE, parent=None
+    ) -> None:
+        super().__init__(parent)
+        self.database = database
+        self.page_size = page_size
+        self.user_uuid = ""
+        self.date: Optional[str] = None
+        self.all_loaded = True
+        self._records: List[PastScanRecord] = []
+        self._rows_by_id: Dict[int, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._records)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):  # type: ignore
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        if role == Qt.DisplayRole:  # type: ignore
+            return record.display_text
+        elif role == Qt.UserRole:  # type: ignore
+            return record
+        return None
+
+    def record_at(self, row: int) -> PastScanRecord:
+        return self._records[row]
+
+    def set_query(self, user_uuid: str, date: Optional[str]) -> None:
+        """
+        Shows the sessions of user_uuid on date, starting with the first page
+        """
+        self.beginResetModel()
+        self.user_uuid = user_uuid
+        self.date = date
+        self.all_loaded = date is None
+        self._records = []
+        self._rows_by_id = {}
+        self.endResetModel()
+
+        self.fetchMore(QModelIndex())
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and not self.all_loaded
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        if not self.canFetchMore(parent):
+            return
+
+        image_sessions = self.database.get_img_sessions_for_uuid_on_date(
+            self.user_uuid,
+            self.date,  # type: ignore
+            offset=len(self._records),
+            limit=self.page_size,
+        )
+        self.all_loaded = len(image_sessions) < self.page_size
+        if not image_sessions:
+            return
+
+        first_row = len(self._records)
+        self.beginInsertRows(
+            QModelIndex(), first_row, first_row + len(image_sessions) - 1
+        )
+        for image_session in image_sessions:
+            self._rows_by_id[image_session.session_id] = len(self._records)
+            self._records.append(PastScanRecord.from_image_session(image_session))
+        self.endInsertRows()
+
+    def add_session(self, record: PastScanRecord) -> bool:
+        """
+        Shows a newly analyzed session if it belongs to the listed date. A session that is
+        already listed is updated in place. Returns whether the list changed
+        """
+        row = self._rows_by_id.get(record.session_id)
+        if row is not None:
+            self._records[row] = record
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+            return True
+
+        # Not loaded yet, it comes with the page it belongs to
+        if str(record.date.date()) != self.date or not self.all_loaded:
+            return False
+
+        row = len(self._records)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows_by_id[record.session_id] = row
+        self._records.append(record)
+        self.endInsertRows()
+        return True
@@ -0,0 +1,53 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PyQt5.QtGui import QImage
+
+
+class PreviewRenderer:
+    """
+    Turns camera frames into QImages for the live preview. Frames are scaled once by
+    OpenCV into a buffer that is reused for every frame, and the buffer is wrapped by the
+    QImage instead of being copied
+    """
+
+    def __init__(self, size: Optional[Tuple[int, int]] = None) -> None:
+        # (width, height) to show the frames at, None keeps the frame size
+        self.size = size
+        self._buffer: Optional[np.ndarray] = None
+        self._rendered: Optional[np.ndarray] = None
+
+    def _scaled(self, frame: np.ndarray) -> np.ndarray:
+        if self.size is None or (frame.shape[1], frame.shape[0]) == self.size:
+            return np.ascontiguousarray(frame)
+
+        buffer_shape = (self.size[1], self.size[0], *frame.shape[2:])
+        if (
+            self._buffer is None
+            or self._buffer.shape != buffer_shape
+            or self._buffer.dtype != frame.dtype
+        ):
+            self._buffer = np.empty(buffer_shape, dtype=frame.dtype)
+
+        # Bilinear is ~10x cheaper than area averaging at this non integer ratio and
+        # still smoother than the nearest neighbour QPixmap.scaled used before
+        cv2.resize(frame, self.size, dst=self._buffer, interpolation=cv2.INTER_LINEAR)
+        return self._buffer
+
+    def render(self, frame: np.ndarray) -> QImage:
+        """
+        Returns a QImage that shares memory with the scaled frame. It is only valid until
+        the next render, turn it into a QPixmap (which copies it) right away
+        """
+        scaled = self._scaled(frame)
+        h, w = scaled.shape[:2]
+        if scaled.ndim == 2:
+            image_format = QImage.Format_Grayscale8
+        else:
+            # OpenCV's BGR order as is, no cvtColor needed
+            image_format = QImage.Format_BGR888
+
+        # The QImage does not own the memory, keep the array alive until the next render
+        self._rendered = scaled
+        return QImage(scaled.data, w, h, scaled.strides[0], image_format)
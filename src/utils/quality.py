@@ -0,0 +1,85 @@
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from utils.version import BETA_VERSION, CAPTURE_QUALITY_THRESHOLDS
+
+# Pixels at or above this are treated as saturated, at or below as background
+SATURATED_LEVEL = 250
+BACKGROUND_LEVEL = 20
+
+
+class CaptureQuality:
+    def __init__(
+        self,
+        focus: float,
+        exposure: float,
+        saturation: float,
+        roi_coverage: float,
+        reasons: List[str],
+    ) -> None:
+        self.focus = focus
+        self.exposure = exposure
+        self.saturation = saturation
+        self.roi_coverage = roi_coverage
+        self.reasons = reasons
+
+    def __repr__(self) -> str:
+        return f"CaptureQuality=({self.focus:.1f}, {self.exposure:.1f}, {self.saturation:.3f}, {self.roi_coverage:.3f}, {self.reasons})"
+
+    @property
+    def passed(self) -> bool:
+        return not self.reasons
+
+
+def roi_box(beta_version: bool = BETA_VERSION) -> Tuple[int, int, int, int]:
+    """(y, x, h, w) of the region the models look at, shared with NMLModel.ml_crop_box"""
+    y = 245  # Starting at top
+    x = 187  # Starting at left
+    h = 158  # Height
+    w = 158  # Width
+    if beta_version:
+        y = 815  # Starting at top
+        x = 445  # Starting at left
+        h = 325  # Height
+        w = 325  # Width
+    return y, x, h, w
+
+
+def crop_roi(frame: np.ndarray) -> np.ndarray:
+    y, x, h, w = roi_box()
+    return frame[y : y + h, x : x + w]
+
+
+def assess_capture_quality(
+    frame: np.ndarray, thresholds: Dict[str, float] = CAPTURE_QUALITY_THRESHOLDS
+) -> CaptureQuality:
+    """
+    Measures focus, exposure, saturation and how much of the region is covered by the tooth.
+    Runs on the cropped region only so it takes a few milliseconds per capture
+    """
+    roi = crop_roi(frame)
+    if roi.size == 0:
+        return CaptureQuality(0.0, 0.0, 0.0, 0.0, ["frame is smaller than the region"])
+    if roi.ndim == 3:
+        roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+
+    focus = float(cv2.Laplacian(roi, cv2.CV_64F).var())
+    exposure = float(roi.mean())
+    saturation = float(np.count_nonzero(roi >= SATURATED_LEVEL)) / roi.size
+    roi_coverage = float(np.count_nonzero(roi > BACKGROUND_LEVEL)) / roi.size
+
+    reasons = []
+    if focus < thresholds["min_focus"]:
+        reasons.append("image is blurry")
+    if exposure < thresholds["min_exposure"]:
+        reasons.append("image is too dark")
+    elif exposure > thresholds["max_exposure"]:
+        reasons.append("image is too bright")
+    if saturation > thresholds["max_saturation"]:
+        reasons.append("image is saturated")
+    if roi_coverage < thresholds["min_roi_coverage"]:
+        reasons.append("tooth does not fill the frame")
+
+    return CaptureQuality(focus, exposure, saturation, roi_coverage, reasons)
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.database import nmlDB, ImageSession
+from utils.version import BETA_VERSION
+
+CHECKPOINT_FILE = "reanalyze_checkpoint.json"
+
+
+def get_model_fingerprints() -> Dict[str, str]:
+    """
+    Fingerprints of the models the cascade scores with
+    """
+    # Only hashes the saved model files, the parent process still never loads the models
+    from utils.crack_detect import NMLModel
+
+    model_names = ["nmlModelV2", "nmlModelV3"] if BETA_VERSION else ["nmlModelV2"]
+    return {
+        model_name: NMLModel.get_model_fingerprint(model_name)
+        for model_name in model_names
+    }
+
+
+def load_checkpoint(checkpoint_path: str, fingerprints: Dict[str, str]) -> Set[int]:
+    """
+    Returns the session ids that a previous run with the same models already finished.
+    A checkpoint from other models is ignored, every session has to be scored again
+    """
+    if not os.path.isfile(checkpoint_path):
+        return set()
+    with open(checkpoint_path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("fingerprints") != fingerprints:
+        print("Checkpoint was made with other models, starting over")
+        return set()
+    return set(checkpoint.get("completed", []))
+
+
+def save_checkpoint(
+    checkpoint_path: str, completed: Set[int], fingerprints: Dict[str, str]
+) -> None:
+    # Write to a temporary file first so an interruption never leaves a corrupt checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"fingerprints": fingerprints, "completed": sorted(completed)}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def get_pending_sessions(db: nmlDB, completed: Set[int]) -> List[Tuple[str, int]]:
+    """
+    Walks image_sessions_table and returns the (user_uuid, session_id) of every session that
+    has a raw image and is not in the checkpoint
+    """
+    pending = []
+    rows = (
+        db.session.query(ImageSession.user_uuid, ImageSession.session_id)
+        .order_by(ImageSession.session_id)
+        .all()
+    )
+    for user_uuid, session_id in rows:
+        if session_id in completed:
+            continue
+        raw_img_path = os.path.join(
+            db.get_base_filepath(user_uuid), "raw", f"{session_id}.jpg"
+        )
+        if not os.path.isfile(raw_img_path):
+            print(f"Skipping {session_id}, no raw image at {raw_img_path}")
+            continue
+        pending.append((user_uuid, session_id))
+    return pending
+
+
+def analyze_session(
+    user_uuid: str, session_id: int, highlight: bool = True
+) -> Tuple[int, int, Dict[str, Tuple[str, float]], Optional[float], str]:
+    """
+    Runs the model cascade and the highlight pipeline for one archived session. Runs inside a
+    worker process, the database is only written to by the parent process
+    """
+    # Imported here so the parent process never loads the models
+    from utils.crack_detect import CrackDetectHighlight, NMLModel
+
+    raw_img_path = CrackDetectHighlight.get_raw_img_path(user_uuid, session_id)
+    ml_result, model_scores, inference_path, confidence = NMLModel.session_predict(
+        raw_img_path
+    )
+    if highlight:
+        CrackDetectHighlight.save_all_highlights(user_uuid, session_id)
+    return session_id, ml_result, model_scores, confidence, inference_path
+
+
+def reanalyze_sessions(
+    db_name: str = "nml.db",
+    workers: int = 2,
+    checkpoint_path: str = CHECKPOINT_FILE,
+    checkpoint_every: int = 50,
+    highlight: bool = True,
+    limit: Optional[int] = None,
+) -> int:
+    """
+    Re-scores every archived image session with the current models without the GUI.
+    Progress is checkpointed so an interrupted run resumes where it stopped, the checkpoint
+    is removed once every session is done. Returns the number of sessions analyzed by this run
+    """
+    db = nmlDB(db_name)
+    fingerprints = get_model_fingerprints()
+    completed = load_checkpoint(checkpoint_path, fingerprints)
+    all_pending = get_pending_sessions(db, completed)
+    pending = all_pending if limit is None else all_pending[:limit]
+    print(
+        f"Re-analyzing {len(pending)} sessions with {workers} workers "
+        f"({len(completed)} already done)"
+    )
+
+    analyzed = 0
+    start_time = time.time()
+    pending_iter = iter(pending)
+    # Future -> session id, so failures can be traced back to their session
+    in_flight = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Only keep a few jobs queued per worker so memory does not grow with the archive
+        def submit_next() -> bool:
+            next_session = next(pending_iter, None)
+            if next_session is None:
+                return False
+            future = pool.submit(analyze_session, *next_session, highlight)
+            in_flight[future] = next_session[1]
+            return True
+
+        for _ in range(workers * 4):
+            if not submit_next():
+                break
+
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    submitted_session_id = in_flight.pop(future)
+                    submit_next()
+
+                    try:
+                        (
+                            session_id,
+                            ml_result,
+                            model_scores,
+                            confidence,
+                            inference_path,
+                        ) = future.result()
+                    except Exception as e:
+                        print(f"Failed to analyze session {submitted_session_id}: {e}")
+                        continue
+
+                    # Queued on the writer thread, results are committed in groups
+                    db.update_img_session_crack_detection(
+                        session_id,
+                        ml_result,
+                        model_scores,
+                        confidence,
+                        inference_path,
+                        wait=False,
+                    )
+                    completed.add(session_id)
+                    analyzed += 1
+
+                    if analyzed % checkpoint_every == 0:
+                        # Never checkpoint a session whose result is not committed yet
+                        db.flush_writes()
+                        save_checkpoint(checkpoint_path, completed, fingerprints)
+                        elapsed = time.time() - start_time
+                        print(
+                            f"{analyzed}/{len(pending)} sessions, "
+                            f"{analyzed / elapsed:.2f} images/s"
+                        )
+        finally:
+            db.flush_writes()
+            save_checkpoint(checkpoint_path, completed, fingerprints)
+
+    # Nothing left to resume, the next run (e.g. for new models) starts from scratch
+    if len(pending) == len(all_pending):
+        os.remove(checkpoint_path)
+
+    elapsed = time.time() - start_time
+    if analyzed:
+        print(
+            f"Finished {analyzed} sessions in {elapsed:.1f}s "
+            f"({analyzed / elapsed:.2f} images/s)"
+        )
+    return analyzed
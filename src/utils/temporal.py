@@ -0,0 +1,50 @@
+from typing import Dict, List, Tuple, Union, Literal
+
+import numpy as np
+
+CascadeResult = Tuple[Union[Literal[0], Literal[1]], Dict[str, Tuple[str, float]], str]
+
+
+def aggregate_cascade_results(
+    results: List[CascadeResult], aggregation: str = "mean"
+) -> Tuple[Union[Literal[0], Literal[1]], Dict[str, Tuple[str, float]], str, float]:
+    """
+    Combines the cascade results of several frames of the same tooth into one verdict.
+    Returns the verdict, the mean (fingerprint, crack probability) of every model over
+    the frames it scored, the path and the confidence in the verdict. For "mean" the
+    confidence is the aggregated probability of the verdict, for "vote" the fraction of
+    frames that voted for it
+    """
+    if not results:
+        raise ValueError("No frames to aggregate")
+
+    verdicts = [verdict for verdict, _, _ in results]
+    if aggregation == "vote":
+        # Missing a crack is worse than a false alarm, a tie is a crack
+        verdict = 1 if sum(verdicts) * 2 >= len(verdicts) else 0
+        confidence = verdicts.count(verdict) / len(verdicts)
+    elif aggregation == "mean":
+        # A crack from either model is a crack, so a frame counts with its highest score
+        frame_probabilities = [
+            max(probability for _, probability in model_scores.values())
+            for _, model_scores, _ in results
+        ]
+        crack_probability = float(np.mean(frame_probabilities))
+        verdict = 1 if crack_probability > 0.5 else 0
+        confidence = crack_probability if verdict else 1 - crack_probability
+    else:
+        raise ValueError(f"Unknown aggregation {aggregation}")
+
+    model_probabilities: Dict[str, List[float]] = {}
+    fingerprints: Dict[str, str] = {}
+    for _, model_scores, _ in results:
+        for model_name, (fingerprint, probability) in model_scores.items():
+            model_probabilities.setdefault(model_name, []).append(probability)
+            fingerprints[model_name] = fingerprint
+    mean_model_scores = {
+        model_name: (fingerprints[model_name], float(np.mean(probabilities)))
+        for model_name, probabilities in model_probabilities.items()
+    }
+
+    path = "v2->v3" if any(path == "v2->v3" for _, _, path in results) else "v2"
+    return verdict, mean_model_scores, f"{path} x{len(results)}", confidence
@@ -0,0 +1,69 @@
+import os
+import json
+import math
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+from utils.version import TILE_SIZE
+
+PYRAMID_FILE = "pyramid.json"
+
+
+def get_tile_path(
+    pyramid_dir: str, level: int, column: int, row: int, ext: str = "jpg"
+) -> str:
+    return os.path.join(pyramid_dir, str(level), f"{column}_{row}.{ext}")
+
+
+def write_tile_pyramid(
+    image: np.ndarray, pyramid_dir: str, tile_size: int = TILE_SIZE, ext: str = "jpg"
+) -> Dict[str, Any]:
+    """
+    Saves image as a deep zoom style pyramid, level 0 is the full resolution and every
+    level after it is half the size of the one before, down to a single tile. Each level
+    is cut into tile_size tiles saved as <level>/<column>_<row>.<ext>. pyramid.json
+    describes the levels and is written last, a pyramid without it is incomplete
+    """
+    levels = []
+    level_img = image
+    level = 0
+    while True:
+        h, w = level_img.shape[:2]
+        columns, rows = math.ceil(w / tile_size), math.ceil(h / tile_size)
+        os.makedirs(os.path.join(pyramid_dir, str(level)), exist_ok=True)
+        for row in range(rows):
+            for column in range(columns):
+                tile = level_img[
+                    row * tile_size : (row + 1) * tile_size,
+                    column * tile_size : (column + 1) * tile_size,
+                ]
+                cv2.imwrite(get_tile_path(pyramid_dir, level, column, row, ext), tile)
+        levels.append({"width": w, "height": h, "columns": columns, "rows": rows})
+
+        if columns == 1 and rows == 1:
+            break
+        level_img = cv2.resize(
+            level_img, ((w + 1) // 2, (h + 1) // 2), interpolation=cv2.INTER_AREA
+        )
+        level += 1
+
+    pyramid = {
+        "width": image.shape[1],
+        "height": image.shape[0],
+        "tile_size": tile_size,
+        "format": ext,
+        "levels": levels,
+    }
+    # Write to a temporary file first so a reader never sees a partial description
+    pyramid_path = os.path.join(pyramid_dir, PYRAMID_FILE)
+    with open(f"{pyramid_path}.tmp", "w") as f:
+        json.dump(pyramid, f)
+    os.replace(f"{pyramid_path}.tmp", pyramid_path)
+    return pyramid
+
+
+def load_tile_pyramid(pyramid_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(pyramid_dir, PYRAMID_FILE), "r") as f:
+        return json.load(f)
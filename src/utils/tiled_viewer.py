@@ -0,0 +1,136 @@
+import math
+from typing import Any, Dict, Optional, Set, Tuple
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap, QTransform
+from PyQt5.QtWidgets import QGraphicsPixmapItem, QGraphicsScene, QGraphicsView
+
+from utils.image_cache import panorama_tile_cache
+from utils.tile_pyramid import get_tile_path, load_tile_pyramid
+
+ZOOM_STEP = 1.25
+
+
+class TiledImageViewer(QGraphicsView):
+    """
+    Pans and zooms through a tile pyramid (see write_tile_pyramid). Only the tiles in view
+    are on the scene, taken from the pyramid level closest to the zoom, so opening and
+    panning cost the same no matter how big the image is
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setScene(QGraphicsScene(self))
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setBackgroundBrush(Qt.black)  # type: ignore
+
+        self.pyramid_dir: Optional[str] = None
+        self.pyramid: Optional[Dict[str, Any]] = None
+        self.level: Optional[int] = None
+        # Tiles of the current level on the scene, by (column, row)
+        self._tiles: Dict[Tuple[int, int], QGraphicsPixmapItem] = {}
+
+    def open_pyramid(self, pyramid_dir: str) -> None:
+        self.scene().clear()
+        self._tiles = {}
+        self.level = None
+        self.pyramid_dir = pyramid_dir
+        self.pyramid = load_tile_pyramid(pyramid_dir)
+        self.scene().setSceneRect(0, 0, self.pyramid["width"], self.pyramid["height"])
+        self.fit_to_view()
+
+    def fit_to_view(self) -> None:
+        self.fitInView(self.sceneRect(), Qt.KeepAspectRatio)  # type: ignore
+        self.update_tiles()
+
+    def zoom(self, factor: float) -> None:
+        self.scale(factor, factor)
+        self.update_tiles()
+
+    def wheelEvent(self, event) -> None:
+        self.zoom(ZOOM_STEP if event.angleDelta().y() > 0 else 1 / ZOOM_STEP)
+
+    def scrollContentsBy(self, dx: int, dy: int) -> None:
+        super().scrollContentsBy(dx, dy)
+        self.update_tiles()
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self.update_tiles()
+
+    def level_for_zoom(self) -> int:
+        """Smallest level that still has at least one tile pixel per screen pixel"""
+        zoom = self.transform().m11()
+        level = math.floor(math.log2(1 / zoom)) if zoom < 1 else 0
+        return min(level, len(self.pyramid["levels"]) - 1)  # type: ignore
+
+    def visible_tiles(self, level: int) -> Set[Tuple[int, int]]:
+        level_info = self.pyramid["levels"][level]  # type: ignore
+        tile_width, tile_height = self._tile_scene_size(level)
+        visible = (
+            self.mapToScene(self.viewport().rect())
+            .boundingRect()
+            .intersected(self.sceneRect())
+        )
+        if visible.isEmpty():
+            return set()
+
+        first_column = max(int(visible.left() // tile_width), 0)
+        last_column = min(int(visible.right() // tile_width), level_info["columns"] - 1)
+        first_row = max(int(visible.top() // tile_height), 0)
+        last_row = min(int(visible.bottom() // tile_height), level_info["rows"] - 1)
+        return {
+            (column, row)
+            for column in range(first_column, last_column + 1)
+            for row in range(first_row, last_row + 1)
+        }
+
+    def _tile_scene_size(self, level: int) -> Tuple[float, float]:
+        level_info = self.pyramid["levels"][level]  # type: ignore
+        tile_size = self.pyramid["tile_size"]  # type: ignore
+        return (
+            tile_size * self.pyramid["width"] / level_info["width"],  # type: ignore
+            tile_size * self.pyramid["height"] / level_info["height"],  # type: ignore
+        )
+
+    def _tile_pixmap(self, level: int, column: int, row: int) -> QPixmap:
+        key = (self.pyramid_dir, level, column, row)
+        pixmap = panorama_tile_cache.get(key)
+        if pixmap is None:
+            pixmap = QPixmap(
+                get_tile_path(
+                    self.pyramid_dir, level, column, row, self.pyramid["format"]  # type: ignore
+                )
+            )
+            panorama_tile_cache.put(key, pixmap)
+        return pixmap
+
+    def update_tiles(self) -> None:
+        """Puts the tiles in view on the scene and takes the others off"""
+        if self.pyramid is None:
+            return
+
+        level = self.level_for_zoom()
+        if level != self.level:
+            # The new level's tiles are added before the next repaint, no flicker
+            for item in self._tiles.values():
+                self.scene().removeItem(item)
+            self._tiles = {}
+            self.level = level
+
+        visible = self.visible_tiles(level)
+        for key in list(self._tiles):
+            if key not in visible:
+                self.scene().removeItem(self._tiles.pop(key))
+
+        tile_width, tile_height = self._tile_scene_size(level)
+        tile_size = self.pyramid["tile_size"]
+        for column, row in visible - self._tiles.keys():
+            item = self.scene().addPixmap(self._tile_pixmap(level, column, row))
+            item.setTransformationMode(Qt.SmoothTransformation)  # type: ignore
+            item.setPos(column * tile_width, row * tile_height)
+            item.setTransform(
+                QTransform.fromScale(tile_width / tile_size, tile_height / tile_size)
+            )
+            self._tiles[(column, row)] = item
@@ -2,3 +2,93 @@
 BETA_VERSION = True
 
 CAMERA_PORT = 0
+
+# Crack probability range in which the cheap v2 model is considered unsure.
+# Only captures whose v2 score lands inside (low, high) are escalated to v3.
+CASCADE_UNCERTAINTY_BAND = (0.2, 0.8)
+
+# Address ("host:port") of a shared headless analysis server, see main.py --serve.
+# When None every GUI loads and runs its own models
+ANALYSIS_SERVER = None
+ANALYSIS_SERVER_PORT = 8765
+
+# Requests arriving within this window are scored together, up to the batch size
+ANALYSIS_BATCH_SIZE = 8
+ANALYSIS_BATCH_WINDOW_MS = 20
+# Seconds the GUI waits on the server before analyzing the capture itself
+ANALYSIS_TIMEOUT = 30
+
+# Reject captures that would give unreliable verdicts before running the models.
+# Measured on the region the models look at
+CAPTURE_QUALITY_GATE = False
+CAPTURE_QUALITY_THRESHOLDS = {
+    "min_focus": 15.0,  # variance of the laplacian, lower is blurrier
+    "min_exposure": 30.0,  # mean intensity 0-255
+    "max_exposure": 225.0,
+    "max_saturation": 0.05,  # fraction of clipped white pixels
+    "min_roi_coverage": 0.5,  # fraction of the region that is not dark background
+}
+
+# SQLite settings applied to every new connection of a database file.
+# WAL lets the past scans browsing read while captures and workers write
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,  # ms to wait for a lock before "database is locked"
+    "synchronous": "NORMAL",  # safe with WAL, fsync on checkpoint only
+    "cache_size": -16000,  # negative is KiB
+    "mmap_size": 268435456,  # bytes
+    "wal_autocheckpoint": 1000,  # pages
+}
+
+# Seconds between the GUI's explicit (non blocking) WAL checkpoints, 0 disables them
+SQLITE_CHECKPOINT_INTERVAL = 300
+
+# Image sessions loaded at a time in the past scans list, more load when scrolled to the end
+PAST_SCAN_PAGE_SIZE = 50
+
+# Folder the GUI backs nml.db and nml_img/ up to while idle, None disables it.
+# The database is copied in full a few pages at a time, images only when new or changed.
+# A write during the database copy starts it over, after BACKUP_MAX_RESTARTS restarts
+# it is copied in one step
+BACKUP_DIR = None
+BACKUP_INTERVAL = 3600  # seconds
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.01  # seconds between steps, lets writers in
+BACKUP_MAX_RESTARTS = 3
+
+# Past scan images are shown at this size (px), decoded straight to it
+SCAN_DISPLAY_SIZE = 400
+# Memory cap of the decoded past scan images kept for instant browsing
+PIXMAP_CACHE_MB = 64
+
+# Live crack overlay on the camera preview, frames are sampled at most this often and
+# skipped while the previous one is still being analyzed
+LIVE_OVERLAY_INTERVAL_MS = 200
+LIVE_OVERLAY_SCALE = 0.5  # the region is analyzed at this fraction of its resolution
+LIVE_OVERLAY_SENSITIVITY = 6  # canny threshold, same as the "normal" highlight
+
+# Score the last N preview frames of the model region together at capture time instead of
+# the single captured frame, 0 or 1 disables it. "mean" averages the crack probabilities,
+# "vote" takes the majority verdict (a tie counts as a crack)
+TEMPORAL_INFERENCE_FRAMES = 0
+TEMPORAL_AGGREGATION = "mean"
+
+# Frames of a scan video are kept for stitching once their overlap with the last kept
+# frame drops below STITCH_KEYFRAME_OVERLAP. The motion between frames is measured at
+# STITCH_MOTION_SCALE of their resolution
+STITCH_KEYFRAME_OVERLAP = 0.6
+STITCH_MOTION_SCALE = 0.25
+
+# Live panoramas, every frame is registered with ORB features at STITCH_REGISTRATION_SCALE
+# of its resolution and composited at full resolution once it becomes a keyframe. Frames
+# the stitcher cannot keep up with are dropped from a queue of STITCH_QUEUE_SIZE
+STITCH_REGISTRATION_SCALE = 0.5
+STITCH_ORB_FEATURES = 1000
+STITCH_MIN_MATCHES = 20
+STITCH_MAX_CANVAS_MP = 100  # megapixels, frames that would grow it further are dropped
+STITCH_QUEUE_SIZE = 4
+
+# Panoramas are saved as a pyramid of TILE_SIZE px tiles, the viewer only decodes the
+# tiles in view and keeps up to PANORAMA_TILE_CACHE_MB of them for panning back
+TILE_SIZE = 256
+PANORAMA_TILE_CACHE_MB = 32
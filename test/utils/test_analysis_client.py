@@ -0,0 +1,96 @@
+import json
+import time
+import base64
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.utils.analysis_client import analyze_image_remote
+
+RESPONSE = {
+    "crack_detected": 1,
+    "inference_path": "v2->v3",
+    "model_scores": {
+        "nmlModelV2": {"fingerprint": "fp-v2", "crack_probability": 0.6},
+        "nmlModelV3": {"fingerprint": "fp-v3", "crack_probability": 0.9},
+    },
+    "highlights": {"cropped": base64.b64encode(b"jpeg bytes").decode()},
+}
+
+
+class StubAnalysisHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    reply = None
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.requests.append((self.path, body))
+        time.sleep(self.delay)
+        encoded = self.reply or json.dumps(RESPONSE).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubAnalysisHandler.delay = 0.0
+    StubAnalysisHandler.reply = None
+    StubAnalysisHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAnalysisHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def raw_img(tmp_path):
+    img_path = tmp_path / "1.jpg"
+    img_path.write_bytes(b"raw capture")
+    return str(img_path)
+
+
+def test_analyze_image_remote(stub_server, raw_img):
+    result = analyze_image_remote(raw_img, stub_server)
+
+    assert result == (
+        1,
+        {"nmlModelV2": ("fp-v2", 0.6), "nmlModelV3": ("fp-v3", 0.9)},
+        "v2->v3",
+        {"cropped": b"jpeg bytes"},
+    )
+    assert StubAnalysisHandler.requests == [("/analyze?highlight=1", b"raw capture")]
+
+
+def test_analyze_image_remote_without_highlights(stub_server, raw_img):
+    analyze_image_remote(raw_img, stub_server, highlight=False)
+    assert StubAnalysisHandler.requests[0][0] == "/analyze?highlight=0"
+
+
+def test_analyze_image_remote_timeout(stub_server, raw_img):
+    StubAnalysisHandler.delay = 1.0
+    with pytest.raises(OSError):
+        analyze_image_remote(raw_img, stub_server, timeout=0.1)
+
+
+def test_analyze_image_remote_unreachable(raw_img):
+    # Nothing listens on port 1
+    with pytest.raises(OSError):
+        analyze_image_remote(raw_img, "127.0.0.1:1", timeout=1)
+
+
+def test_analyze_image_remote_bad_reply(stub_server, raw_img):
+    StubAnalysisHandler.reply = b'{"crack_detected": 1, "model_sc'
+    with pytest.raises(ValueError):
+        analyze_image_remote(raw_img, stub_server)
+
+    StubAnalysisHandler.reply = json.dumps({"crack_detected": 1}).encode()
+    with pytest.raises(KeyError):
+        analyze_image_remote(raw_img, stub_server)
@@ -0,0 +1,131 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+keras = pytest.importorskip("keras")
+
+from src.utils.analysis_server import AnalysisBatcher, AnalysisServer, NMLModel
+
+
+def encoded_img(h, w):
+    return cv2.imencode(".png", np.zeros((h, w, 3), dtype=np.uint8))[1].tobytes()
+
+
+def score_crops(cropped_imgs):
+    return [(0, {"nmlModelV2": ("fp-v2", 0.1)}, "v2") for _ in cropped_imgs]
+
+
+@patch.object(NMLModel, "cascade_predict_crops", side_effect=score_crops)
+def test_batcher_scores_requests_together(cascade_mock):
+    batcher = AnalysisBatcher(max_batch_size=8, batch_window_ms=50)
+    crops = [np.full((4, 4), i, dtype=np.uint8) for i in range(3)]
+    futures = [batcher.submit(crop) for crop in crops]
+    batcher.start()
+
+    results = [future.result(timeout=5) for future in futures]
+    batcher.stop()
+
+    cascade_mock.assert_called_once()
+    assert len(cascade_mock.call_args[0][0]) == 3
+    assert results == score_crops(crops)
+
+
+def test_batcher_failure_only_fails_the_bad_request():
+    bad_crop = np.zeros((2, 2), dtype=np.uint8)
+
+    def cascade(cropped_imgs):
+        if len(cropped_imgs) > 1:
+            raise ValueError("setting an array element with a sequence")
+        if cropped_imgs[0] is bad_crop:
+            raise ValueError("bad crop")
+        return score_crops(cropped_imgs)
+
+    batcher = AnalysisBatcher(max_batch_size=8, batch_window_ms=50)
+    good_future = batcher.submit(np.zeros((4, 4), dtype=np.uint8))
+    bad_future = batcher.submit(bad_crop)
+    with patch.object(NMLModel, "cascade_predict_crops", side_effect=cascade):
+        batcher.start()
+        assert good_future.result(timeout=5) == score_crops([None])[0]
+        with pytest.raises(ValueError) as e_info:
+            bad_future.result(timeout=5)
+        batcher.stop()
+
+    assert "bad crop" in str(e_info.value)
+
+
+@pytest.fixture
+def analysis_server():
+    batcher = AnalysisBatcher(batch_window_ms=1)
+    batcher.start()
+    server = AnalysisServer("127.0.0.1", 0, batcher)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    batcher.stop()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=body, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_health(analysis_server):
+    with urllib.request.urlopen(f"{analysis_server}/health", timeout=10) as response:
+        assert json.loads(response.read())["status"] == "ok"
+
+
+def test_unknown_paths_are_404(analysis_server):
+    with pytest.raises(urllib.error.HTTPError) as e_info:
+        urllib.request.urlopen(f"{analysis_server}/missing", timeout=10)
+    assert e_info.value.code == 404
+
+    status, body = post(f"{analysis_server}/other", encoded_img(4, 4))
+    assert status == 404
+
+
+def test_undecodable_image_is_400(analysis_server):
+    status, body = post(f"{analysis_server}/analyze", b"not an image")
+    assert status == 400
+    assert "decode" in body["error"]
+
+
+def test_image_smaller_than_crop_is_400(analysis_server):
+    with patch.object(NMLModel, "cascade_predict_crops") as cascade_mock:
+        status, body = post(f"{analysis_server}/analyze", encoded_img(100, 100))
+
+    assert status == 400
+    assert "smaller" in body["error"]
+    cascade_mock.assert_not_called()
+
+
+@patch.object(NMLModel, "cascade_predict_crops", side_effect=RuntimeError("OOM"))
+def test_inference_error_is_500(cascade_mock, analysis_server):
+    status, body = post(f"{analysis_server}/analyze", encoded_img(1920, 1080))
+    assert status == 500
+    assert "OOM" in body["error"]
+
+
+@patch.object(NMLModel, "cascade_predict_crops", side_effect=score_crops)
+def test_analyze(cascade_mock, analysis_server):
+    status, body = post(
+        f"{analysis_server}/analyze?highlight=0", encoded_img(1920, 1080)
+    )
+    assert status == 200
+    assert body == {
+        "crack_detected": 0,
+        "inference_path": "v2",
+        "model_scores": {
+            "nmlModelV2": {"fingerprint": "fp-v2", "crack_probability": 0.1}
+        },
+    }
@@ -0,0 +1,176 @@
+import os
+import shutil
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from src.utils.backup import (
+    BACKUP_MANIFEST_FILE,
+    backup_database,
+    backup_images,
+    file_digest,
+    load_manifest,
+    run_backup,
+)
+
+
+def _make_db(db_path, rows):
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY, v TEXT)")
+    connection.executemany("INSERT INTO t (v) VALUES (?)", [("x" * 100,)] * rows)
+    connection.commit()
+    return connection
+
+
+def _make_images(img_root):
+    os.makedirs(os.path.join(img_root, "uuid-1", "raw"))
+    os.makedirs(os.path.join(img_root, "uuid-1", "complete"))
+    for name in ("1.jpg", "2.jpg"):
+        with open(os.path.join(img_root, "uuid-1", "raw", name), "wb") as f:
+            f.write(os.urandom(1000))
+
+
+def test_backup_database_while_open(tmp_path):
+    db_path = str(tmp_path / "nml.db")
+    dest_path = str(tmp_path / "backup.db")
+    # The app keeps its connection open with uncheckpointed WAL pages
+    connection = _make_db(db_path, 2000)
+
+    backup_database(db_path, dest_path, pages=5, sleep=0)
+    connection.close()
+
+    backup = sqlite3.connect(dest_path)
+    assert backup.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2000
+    assert backup.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    backup.close()
+    assert not os.path.exists(f"{dest_path}.tmp")
+
+
+def test_backup_images_incremental(tmp_path):
+    img_root = str(tmp_path / "nml_img")
+    dest_root = str(tmp_path / "backup" / "nml_img")
+    manifest_path = str(tmp_path / "backup" / BACKUP_MANIFEST_FILE)
+    _make_images(img_root)
+    os.makedirs(os.path.dirname(manifest_path))
+
+    assert backup_images(img_root, dest_root, manifest_path) == 2
+    assert set(load_manifest(manifest_path)) == {
+        os.path.join("uuid-1", "raw", "1.jpg"),
+        os.path.join("uuid-1", "raw", "2.jpg"),
+    }
+
+    # Nothing changed
+    assert backup_images(img_root, dest_root, manifest_path) == 0
+
+    # Touched but same content is hashed and not copied
+    raw_1 = os.path.join(img_root, "uuid-1", "raw", "1.jpg")
+    os.utime(raw_1, ns=(0, 10**9))
+    assert backup_images(img_root, dest_root, manifest_path) == 0
+
+    # New and changed files are copied
+    with open(raw_1, "wb") as f:
+        f.write(b"changed")
+    with open(os.path.join(img_root, "uuid-1", "complete", "1-normal.jpg"), "wb") as f:
+        f.write(b"new")
+    assert backup_images(img_root, dest_root, manifest_path) == 2
+    with open(os.path.join(dest_root, "uuid-1", "raw", "1.jpg"), "rb") as f:
+        assert f.read() == b"changed"
+
+
+def test_run_backup(tmp_path):
+    db_path = str(tmp_path / "nml.db")
+    img_root = str(tmp_path / "nml_img")
+    dest_dir = str(tmp_path / "backup")
+    _make_db(db_path, 10).close()
+    _make_images(img_root)
+
+    run_backup(dest_dir, db_path, img_root)
+
+    assert os.path.isfile(os.path.join(dest_dir, "nml.db"))
+    assert os.path.isfile(os.path.join(dest_dir, "nml_img", "uuid-1", "raw", "2.jpg"))
+    assert os.path.isfile(os.path.join(dest_dir, BACKUP_MANIFEST_FILE))
+
+
+def test_backup_database_under_concurrent_writes(tmp_path, capsys):
+    db_path = str(tmp_path / "nml.db")
+    dest_path = str(tmp_path / "backup.db")
+    connection = _make_db(db_path, 2000)
+
+    # The app writes between every step, each write starts the copy over
+    def write(seconds):
+        connection.execute("INSERT INTO t (v) VALUES ('y')")
+        connection.commit()
+
+    with patch("src.utils.backup.time.sleep", side_effect=write) as sleep_mock:
+        backup_database(db_path, dest_path, pages=5, sleep=0, max_restarts=2)
+    connection.close()
+
+    assert "Backup restarted 3 times" in capsys.readouterr().out
+    backup = sqlite3.connect(dest_path)
+    assert backup.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2000 + len(
+        sleep_mock.call_args_list
+    )
+    assert backup.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    backup.close()
+
+
+def test_backup_database_missing(tmp_path):
+    db_path = str(tmp_path / "missing.db")
+
+    with pytest.raises(FileNotFoundError):
+        run_backup(str(tmp_path / "backup"), db_path, str(tmp_path / "nml_img"))
+    # Not created as an empty database
+    assert not os.path.exists(db_path)
+
+
+def test_backup_images_skips_files_being_written(tmp_path):
+    img_root = str(tmp_path / "nml_img")
+    dest_root = str(tmp_path / "backup" / "nml_img")
+    manifest_path = str(tmp_path / "backup" / BACKUP_MANIFEST_FILE)
+    _make_images(img_root)
+    os.makedirs(os.path.dirname(manifest_path))
+    with open(
+        os.path.join(img_root, "uuid-1", "complete", "1-normal.jpg.tmp"), "wb"
+    ) as f:
+        f.write(b"partial")
+
+    # 2.jpg is renamed away after it was listed
+    digest = file_digest
+
+    def renamed_away(path):
+        if path.endswith("2.jpg"):
+            raise FileNotFoundError(path)
+        return digest(path)
+
+    with patch("src.utils.backup.file_digest", side_effect=renamed_away):
+        assert backup_images(img_root, dest_root, manifest_path) == 1
+
+    assert set(load_manifest(manifest_path)) == {os.path.join("uuid-1", "raw", "1.jpg")}
+    assert not os.path.exists(os.path.join(dest_root, "uuid-1", "complete"))
+
+
+def test_backup_images_saves_manifest_on_failure(tmp_path):
+    img_root = str(tmp_path / "nml_img")
+    dest_root = str(tmp_path / "backup" / "nml_img")
+    manifest_path = str(tmp_path / "backup" / BACKUP_MANIFEST_FILE)
+    _make_images(img_root)
+    os.makedirs(os.path.dirname(manifest_path))
+
+    copy = shutil.copy2
+    copies = []
+
+    def disk_full_on_second_copy(src, dest):
+        copies.append(src)
+        if len(copies) == 2:
+            raise OSError("No space left on device")
+        return copy(src, dest)
+
+    with patch("src.utils.backup.shutil.copy2", side_effect=disk_full_on_second_copy):
+        with pytest.raises(OSError):
+            backup_images(img_root, dest_root, manifest_path)
+
+    # The file copied before the failure is not copied again
+    assert len(load_manifest(manifest_path)) == 1
+    assert backup_images(img_root, dest_root, manifest_path) == 1
@@ -1,5 +1,7 @@
 import os
 import pytest
+import numpy as np
+from collections import deque
 from unittest.mock import patch, Mock, ANY, call
 
 from src.utils.camera import (
@@ -27,6 +29,9 @@ test_VideoThread.camera_available_signal.emit
 test_VideoThread.capture_complete_signal = Mock()
 test_VideoThread.capture_complete_signal.emit
 
+test_VideoThread.capture_rejected_signal = Mock()
+test_VideoThread.capture_rejected_signal.emit
+
 # test_VideoThread.video_writer = Mock()
 # test_VideoThread.video_writer.write
 
@@ -189,13 +194,20 @@ mocked_video_valid_with_capture.isOpened.return_value = True
 mocked_video_valid_with_capture.read.side_effect = [(True, "Frame3"), (False, "Frame4")]
 
 
+@patch("src.utils.camera.CAPTURE_QUALITY_GATE", True)
+@patch("src.utils.camera.assess_capture_quality", return_value=Mock(passed=True))
 @patch("src.utils.camera.VideoThread._save_image")
 @patch("src.utils.camera.VideoThread._video_close")
 @patch("cv2.rotate", return_value="rotated_frame")
 @patch("cv2.cvtColor", return_value="color_rotated_frame")
 @patch("cv2.VideoCapture", return_value=mocked_video_valid_with_capture)
 def test_VideoThread_run_valid_with_capture(
-    VideoCapture_mock, cvtColor_mock, cvtRotate_mock, video_close_mock, save_image_mock
+    VideoCapture_mock,
+    cvtColor_mock,
+    cvtRotate_mock,
+    video_close_mock,
+    save_image_mock,
+    assess_capture_quality_mock,
 ):
     test_VideoThread.USER_UUID = "test-uuid-capture-flag"
     test_VideoThread._DATABASE = Mock()
@@ -221,6 +233,140 @@ def test_VideoThread_run_valid_with_capture(
     test_VideoThread.camera_available_signal.emit.assert_has_calls([call(True)])
     test_VideoThread.capture_complete_signal.emit.assert_called_once_with(True)
     save_image_mock.assert_called_once_with("color_rotated_frame")
+    assess_capture_quality_mock.assert_called_once_with("color_rotated_frame")
+    test_VideoThread.capture_rejected_signal.emit.assert_not_called()
+
+
+mocked_video_valid_rejected_capture = Mock()
+mocked_video_valid_rejected_capture.isOpened.return_value = True
+mocked_video_valid_rejected_capture.read.side_effect = [
+    (True, "Frame5"),
+    (False, "Frame6"),
+]
+
+
+@patch("src.utils.camera.CAPTURE_QUALITY_GATE", True)
+@patch(
+    "src.utils.camera.assess_capture_quality",
+    return_value=Mock(passed=False, reasons=["image is blurry", "image is too dark"]),
+)
+@patch("src.utils.camera.VideoThread._save_image")
+@patch("src.utils.camera.VideoThread._video_close")
+@patch("cv2.rotate", return_value="rotated_frame")
+@patch("cv2.cvtColor", return_value="color_rotated_frame")
+@patch("cv2.VideoCapture", return_value=mocked_video_valid_rejected_capture)
+def test_VideoThread_run_valid_rejected_capture(
+    VideoCapture_mock,
+    cvtColor_mock,
+    cvtRotate_mock,
+    video_close_mock,
+    save_image_mock,
+    assess_capture_quality_mock,
+):
+    test_VideoThread.USER_UUID = "test-uuid-rejected-capture"
+    test_VideoThread._DATABASE = Mock()
+    test_VideoThread.capture_complete_signal = Mock()
+    test_VideoThread.capture_rejected_signal = Mock()
+    test_VideoThread.image_session_id = 5
+    test_VideoThread._capture_flag = True
+    test_VideoThread.run()
+    assert test_VideoThread._capture_flag == False
+
+    assess_capture_quality_mock.assert_called_once_with("color_rotated_frame")
+    test_VideoThread._DATABASE.delete_img_session.assert_called_once_with(5, wait=False)
+    test_VideoThread.capture_rejected_signal.emit.assert_called_once_with(
+        "image is blurry, image is too dark"
+    )
+    test_VideoThread.capture_complete_signal.emit.assert_not_called()
+    save_image_mock.assert_not_called()
+    test_VideoThread.change_image_signal.emit.assert_has_calls(
+        [call("color_rotated_frame")]
+    )
+
+
+mocked_video_valid_temporal_capture = Mock()
+mocked_video_valid_temporal_capture.isOpened.return_value = True
+mocked_video_valid_temporal_capture.read.side_effect = [
+    (True, "Frame7"),
+    (True, "Frame8"),
+    (False, "Frame9"),
+]
+
+
+@patch("src.utils.camera.TEMPORAL_INFERENCE_FRAMES", 2)
+@patch("src.utils.camera.crop_roi", side_effect=lambda frame: np.zeros((2, 2)))
+@patch("src.utils.camera.assess_capture_quality", return_value=Mock(passed=True))
+@patch("src.utils.camera.VideoThread._save_recent_rois")
+@patch("src.utils.camera.VideoThread._save_image")
+@patch("src.utils.camera.VideoThread._video_close")
+@patch("cv2.rotate", return_value="rotated_frame")
+@patch("cv2.cvtColor", return_value="color_rotated_frame")
+@patch("cv2.VideoCapture", return_value=mocked_video_valid_temporal_capture)
+def test_VideoThread_run_valid_temporal_capture(
+    VideoCapture_mock,
+    cvtColor_mock,
+    cvtRotate_mock,
+    video_close_mock,
+    save_image_mock,
+    save_recent_rois_mock,
+    assess_capture_quality_mock,
+    crop_roi_mock,
+):
+    test_VideoThread.USER_UUID = "test-uuid-temporal-capture"
+    test_VideoThread._DATABASE = Mock()
+    test_VideoThread.capture_complete_signal = Mock()
+    test_VideoThread.capture_rejected_signal = Mock()
+    test_VideoThread.recent_rois = deque(maxlen=2)
+    test_VideoThread._capture_flag = True
+    test_VideoThread.run()
+
+    # The frame being captured is part of the saved frames
+    assert len(test_VideoThread.recent_rois) == 2
+    crop_roi_mock.assert_has_calls([call("color_rotated_frame")] * 2)
+    save_image_mock.assert_called_once_with("color_rotated_frame")
+    save_recent_rois_mock.assert_called_once_with()
+    test_VideoThread.capture_complete_signal.emit.assert_called_once_with(True)
+
+
+mocked_video_valid_panorama = Mock()
+mocked_video_valid_panorama.isOpened.return_value = True
+mocked_video_valid_panorama.read.side_effect = [(True, "Frame10"), (False, "Frame11")]
+
+
+@patch("src.utils.camera.VideoThread._video_close")
+@patch("cv2.rotate", return_value="rotated_frame")
+@patch("cv2.cvtColor", return_value="color_rotated_frame")
+@patch("cv2.VideoCapture", return_value=mocked_video_valid_panorama)
+def test_VideoThread_run_feeds_panorama(
+    VideoCapture_mock,
+    cvtColor_mock,
+    cvtRotate_mock,
+    video_close_mock,
+):
+    test_VideoThread._DATABASE = Mock()
+    test_VideoThread._capture_flag = False
+    test_VideoThread.set_panorama_thread(Mock())
+    test_VideoThread.run()
+
+    test_VideoThread.panorama_thread.offer.assert_called_once_with(
+        "color_rotated_frame"
+    )
+    test_VideoThread.set_panorama_thread(None)
+
+
+def test__save_recent_rois(tmp_path):
+    os.makedirs(tmp_path / "raw")
+    test_VideoThread._DATABASE = Mock()
+    test_VideoThread._DATABASE.get_base_filepath.return_value = str(tmp_path)
+    test_VideoThread.image_session_id = 7
+    test_VideoThread.recent_rois = deque(
+        [np.full((2, 3), i, dtype=np.uint8) for i in range(3)]
+    )
+    test_VideoThread._save_recent_rois()
+
+    frames = np.load(tmp_path / "raw" / "7-frames.npy")
+    assert frames.shape == (3, 2, 3)
+    assert frames[2, 0, 0] == 2
 
 
 @patch("cv2.destroyAllWindows")
@@ -317,7 +463,7 @@ def test_init_capture_image():
         "test-uuid-init-capture-image"
     )
     test_VideoThread._DATABASE.insert_new_image_session.assert_called_once_with(
-        "test-uuid-init-capture-image", "test-image-name"
+        "test-uuid-init-capture-image", "test-image-name", wait=False
     )
     assert ret == 0
 
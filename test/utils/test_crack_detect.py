@@ -0,0 +1,272 @@
+import os
+import json
+import urllib.error
+
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import Mock, call, patch
+
+keras = pytest.importorskip("keras")
+
+from src.utils.crack_detect import CrackDetectHighlight, NMLModel
+from src.utils.quality import roi_box
+
+
+def fake_model(fingerprint, probabilities):
+    model = Mock()
+    model.fingerprint = fingerprint
+    model.predict_proba_batch.return_value = np.array(probabilities)
+    return model
+
+
+def patch_models(v2_probabilities, v3_probabilities=()):
+    models = {
+        "nmlModelV2": fake_model("fp-v2", v2_probabilities),
+        "nmlModelV3": fake_model("fp-v3", v3_probabilities),
+    }
+    return models, patch.object(NMLModel, "get_shared", side_effect=models.get)
+
+
+crops = [np.zeros((325, 325), dtype=np.uint8) + i for i in range(3)]
+
+
+def test_predict_proba_batch_softmax():
+    model = NMLModel.__new__(NMLModel)
+    model.crack_detect_model = lambda batch: np.array([[0.3, 0.7]] * len(batch))
+
+    result = model.predict_proba_batch(crops[:2])
+    assert result.tolist() == [0.7, 0.7]
+
+
+def test_predict_proba_batch_sigmoid():
+    model = NMLModel.__new__(NMLModel)
+    model.crack_detect_model = lambda batch: np.array([[0.6]] * len(batch))
+
+    assert model.predict_proba_batch(crops[:1]).tolist() == [0.6]
+
+
+@patch.object(NMLModel, "ml_img_crop", return_value=crops[0])
+def test_predict_proba(ml_img_crop_mock):
+    model = NMLModel.__new__(NMLModel)
+    model.crack_detect_model = lambda batch: np.array([[0.4, 0.6]])
+
+    assert model.predict_proba("raw.jpg") == pytest.approx(0.6)
+    assert model.predict("raw.jpg") == 1
+    ml_img_crop_mock.assert_called_with("raw.jpg")
+
+
+@patch("src.utils.crack_detect.BETA_VERSION", True)
+@patch("src.utils.crack_detect.CASCADE_UNCERTAINTY_BAND", (0.2, 0.8))
+def test_cascade_confident_v2_skips_v3():
+    models, get_shared_patch = patch_models([0.95, 0.05])
+    with get_shared_patch:
+        results = NMLModel.cascade_predict_crops(crops[:2])
+
+    assert results == [
+        (1, {"nmlModelV2": ("fp-v2", 0.95)}, "v2"),
+        (0, {"nmlModelV2": ("fp-v2", 0.05)}, "v2"),
+    ]
+    models["nmlModelV3"].predict_proba_batch.assert_not_called()
+
+
+@patch("src.utils.crack_detect.BETA_VERSION", True)
+@patch("src.utils.crack_detect.CASCADE_UNCERTAINTY_BAND", (0.2, 0.8))
+def test_cascade_uncertain_v2_escalates_to_v3():
+    models, get_shared_patch = patch_models([0.6, 0.3], [0.1, 0.9])
+    with get_shared_patch:
+        results = NMLModel.cascade_predict_crops(crops[:2])
+
+    # A crack from either model is a crack
+    assert results == [
+        (1, {"nmlModelV2": ("fp-v2", 0.6), "nmlModelV3": ("fp-v3", 0.1)}, "v2->v3"),
+        (1, {"nmlModelV2": ("fp-v2", 0.3), "nmlModelV3": ("fp-v3", 0.9)}, "v2->v3"),
+    ]
+
+
+@patch("src.utils.crack_detect.BETA_VERSION", True)
+@patch("src.utils.crack_detect.CASCADE_UNCERTAINTY_BAND", (0.2, 0.8))
+def test_cascade_escalates_only_uncertain_crops():
+    models, get_shared_patch = patch_models([0.95, 0.4, 0.05], [0.3])
+    with get_shared_patch:
+        results = NMLModel.cascade_predict_crops(crops)
+
+    # One v3 forward pass with only the uncertain crop
+    models["nmlModelV3"].predict_proba_batch.assert_called_once()
+    (escalated,), _ = models["nmlModelV3"].predict_proba_batch.call_args
+    assert len(escalated) == 1 and escalated[0] is crops[1]
+
+    assert [path for _, _, path in results] == ["v2", "v2->v3", "v2"]
+    assert [verdict for verdict, _, _ in results] == [1, 0, 0]
+
+
+@patch("src.utils.crack_detect.BETA_VERSION", False)
+def test_cascade_without_beta_runs_v2_only():
+    models, get_shared_patch = patch_models([0.6, 0.4])
+    with get_shared_patch:
+        results = NMLModel.cascade_predict_crops(crops[:2])
+
+    assert results == [
+        (1, {"nmlModelV2": ("fp-v2", 0.6)}, "v2"),
+        (0, {"nmlModelV2": ("fp-v2", 0.4)}, "v2"),
+    ]
+    models["nmlModelV3"].predict_proba_batch.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "server_error",
+    [
+        urllib.error.URLError("Connection refused"),
+        json.JSONDecodeError("Unterminated string", "{", 1),
+        KeyError("model_scores"),
+    ],
+)
+@patch("src.utils.crack_detect.ANALYSIS_SERVER", "127.0.0.1:1")
+@patch("src.utils.crack_detect.analyze_image_remote")
+@patch.object(CrackDetectHighlight, "save_all_highlights")
+@patch.object(NMLModel, "session_predict", return_value=(1, {}, "v2", None))
+def test_run_falls_back_to_local_analysis(
+    session_predict_mock,
+    save_all_highlights_mock,
+    analyze_image_remote_mock,
+    server_error,
+):
+    analyze_image_remote_mock.side_effect = server_error
+    database = Mock()
+    worker = CrackDetectHighlight(database, 5, "test-uuid")
+    worker.signals = Mock()
+    worker.continueThread = False
+    worker.run()
+
+    raw_img_path = CrackDetectHighlight.get_raw_img_path("test-uuid", 5)
+    session_predict_mock.assert_called_once_with(raw_img_path)
+    database.update_img_session_crack_detection.assert_called_once_with(
+        5, 1, {}, None, "v2"
+    )
+    save_all_highlights_mock.assert_called_once()
+    worker.signals.finished.emit.assert_called_once_with("5")
+
+
+@patch("src.utils.crack_detect.BETA_VERSION", False)
+def test_ml_crop_box_matches_quality_roi():
+    assert NMLModel.ml_crop_box() == roi_box(False)
+
+
+def test_write_completed_img(tmp_path):
+    completed_img_path = str(tmp_path / "1-normal.jpg")
+
+    CrackDetectHighlight.write_completed_img(completed_img_path, b"jpeg bytes")
+
+    with open(completed_img_path, "rb") as f:
+        assert f.read() == b"jpeg bytes"
+    assert os.listdir(tmp_path) == ["1-normal.jpg"]
+
+
+def test_write_completed_img_failure_leaves_no_partial_file(tmp_path):
+    completed_img_path = str(tmp_path / "1-normal.jpg")
+    with open(completed_img_path, "wb") as f:
+        f.write(b"previous")
+
+    with patch("src.utils.crack_detect.os.replace", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            CrackDetectHighlight.write_completed_img(completed_img_path, b"new")
+
+    # Readers still see the previous image and nothing half written is left behind
+    with open(completed_img_path, "rb") as f:
+        assert f.read() == b"previous"
+    assert os.listdir(tmp_path) == ["1-normal.jpg"]
+
+
+def run_worker(tmp_path):
+    """Runs a worker on a blank capture, returns every database and signal call in order"""
+    cv2.imwrite(str(tmp_path / "5.jpg"), np.zeros((1920, 1080, 3), dtype=np.uint8))
+    events = Mock()
+    worker = CrackDetectHighlight(events.database, 5, "test-uuid")
+    worker.signals = events.signals
+    worker.continueThread = False
+    with patch.object(
+        CrackDetectHighlight, "get_raw_img_path", return_value=str(tmp_path / "5.jpg")
+    ), patch.object(
+        CrackDetectHighlight,
+        "get_completed_img_path",
+        side_effect=lambda user_uuid, image_session_id, suffix: str(
+            tmp_path / f"{image_session_id}-{suffix}.jpg"
+        ),
+    ):
+        worker.run()
+    return events.mock_calls
+
+
+@patch("src.utils.crack_detect.ANALYSIS_SERVER", None)
+@patch.object(CrackDetectHighlight, "highlight_cracks", side_effect=lambda img, _: img)
+@patch.object(NMLModel, "session_predict", return_value=(1, {}, "v2", None))
+def test_run_signal_order(session_predict_mock, highlight_cracks_mock, tmp_path):
+    calls = run_worker(tmp_path)
+
+    # Verdict once it is stored, then each image once it is on disk, then finished
+    assert calls == [
+        call.database.update_img_session_crack_detection(5, 1, {}, None, "v2"),
+        call.database.remove_session(),
+        call.signals.verdict_ready.emit("5"),
+        call.signals.image_ready.emit("5", "cropped"),
+        call.signals.image_ready.emit("5", "normal"),
+        call.signals.image_ready.emit("5", "precise"),
+        call.signals.finished.emit("5"),
+    ]
+    for suffix in ("cropped", "normal", "precise"):
+        assert os.path.isfile(tmp_path / f"5-{suffix}.jpg")
+
+
+@patch("src.utils.crack_detect.ANALYSIS_SERVER", "127.0.0.1:1")
+@patch(
+    "src.utils.crack_detect.analyze_image_remote",
+    return_value=(0, {}, "v2", {"cropped": b"cropped", "normal": b"normal"}),
+)
+@patch.object(NMLModel, "session_predict")
+def test_run_signal_order_remote(
+    session_predict_mock, analyze_image_remote_mock, tmp_path
+):
+    calls = run_worker(tmp_path)
+
+    session_predict_mock.assert_not_called()
+    assert calls[2:] == [
+        call.signals.verdict_ready.emit("5"),
+        call.signals.image_ready.emit("5", "cropped"),
+        call.signals.image_ready.emit("5", "normal"),
+        call.signals.finished.emit("5"),
+    ]
+    with open(tmp_path / "5-normal.jpg", "rb") as f:
+        assert f.read() == b"normal"
+
+
+@patch("src.utils.crack_detect.ANALYSIS_SERVER", "127.0.0.1:1")
+@patch("src.utils.crack_detect.analyze_image_remote")
+@patch.object(CrackDetectHighlight, "highlight_cracks", side_effect=lambda img, _: img)
+@patch.object(NMLModel, "session_predict", return_value=(1, {}, "v2 x2", 0.7))
+def test_run_scores_saved_frames_locally(
+    session_predict_mock, highlight_cracks_mock, analyze_image_remote_mock, tmp_path
+):
+    np.save(tmp_path / "5-frames.npy", np.zeros((2, 4, 4), dtype=np.uint8))
+    calls = run_worker(tmp_path)
+
+    # The server would only see the captured image, not the frames
+    analyze_image_remote_mock.assert_not_called()
+    session_predict_mock.assert_called_once_with(str(tmp_path / "5.jpg"))
+    assert calls[0] == call.database.update_img_session_crack_detection(
+        5, 1, {}, 0.7, "v2 x2"
+    )
+
+
+@patch.object(
+    NMLModel, "cascade_predict_crops", side_effect=lambda crops: [(1, {}, "v2")] * 2
+)
+@patch.object(NMLModel, "cascade_predict", return_value=(0, {}, "v2"))
+def test_session_predict(cascade_predict_mock, cascade_predict_crops_mock, tmp_path):
+    raw_img_path = str(tmp_path / "5.jpg")
+    assert NMLModel.session_predict(raw_img_path) == (0, {}, "v2", None)
+
+    np.save(tmp_path / "5-frames.npy", np.zeros((2, 4, 4), dtype=np.uint8))
+    with patch("src.utils.crack_detect.aggregate_cascade_results") as aggregate_mock:
+        aggregate_mock.return_value = (1, {}, "v2 x2", 0.9)
+        assert NMLModel.session_predict(raw_img_path) == (1, {}, "v2 x2", 0.9)
+    cascade_predict_crops_mock.assert_called_once()
@@ -1,11 +1,15 @@
 import os
+import sqlite3
+import threading
 import pytest
 from unittest.mock import patch, Mock, MagicMock, ANY, call
 
 from datetime import datetime
 import numpy as np
 
-from src.utils.database import nmlDB, User, ImageSession
+from sqlalchemy import inspect
+
+from src.utils.database import nmlDB, User, ImageSession, MlData
 from src.utils.exceptions import UserAlreadyCreated, ImageSessionNotFound
 
 test_db = nmlDB(":memory:")
@@ -249,3 +253,410 @@ def test_get_all_ml_data_no_crack_class():
         after_img = np.frombuffer(entry.img, dtype=np.uint8)  # type: ignore
         assert entry.classifier == 0
         assert np.array_equal(after_img, ml_img_0.flatten())
+
+
+def test_update_img_session_crack_detection_with_model_scores():
+    score_uuid = test_db.insert_new_user("test_model_scores_email", "fname", "lname")
+    session_id = test_db.insert_new_image_session(score_uuid, "test_model_scores")
+
+    test_db.update_img_session_crack_detection(
+        session_id, 1, {"nmlModelV2": ("fp-v2", 0.6), "nmlModelV3": ("fp-v3", 0.9)}
+    )
+    assert test_db.get_model_scores_for_session(session_id) == {
+        "nmlModelV2": 0.6,
+        "nmlModelV3": 0.9,
+    }
+
+    # Re-scoring replaces the old scores
+    test_db.update_img_session_crack_detection(
+        session_id, 0, {"nmlModelV2": ("fp-v2", 0.1)}
+    )
+    assert test_db.get_model_scores_for_session(session_id) == {"nmlModelV2": 0.1}
+
+
+def test_update_img_session_crack_detection_with_confidence():
+    confidence_uuid = test_db.insert_new_user("test_confidence_email", "fname", "lname")
+    session_id = test_db.insert_new_image_session(confidence_uuid, "test_confidence")
+
+    test_db.update_img_session_crack_detection(
+        session_id, 1, {"nmlModelV2": ("fp-v2", 0.7)}, 0.7
+    )
+    image_session = test_db.get_img_session_for_uuid(confidence_uuid, session_id)
+    assert image_session.confidence == 0.7
+
+    # A single image has no confidence
+    test_db.update_img_session_crack_detection(session_id, 0)
+    image_session = test_db.get_img_session_for_uuid(confidence_uuid, session_id)
+    assert image_session.confidence is None
+
+
+def test_update_img_session_crack_detection_with_inference_path():
+    path_uuid = test_db.insert_new_user("test_inference_path_email", "fname", "lname")
+    session_id = test_db.insert_new_image_session(path_uuid, "test_inference_path")
+
+    test_db.update_img_session_crack_detection(session_id, 0, inference_path="v2->v3")
+    image_session = test_db.get_img_session_for_uuid(path_uuid, session_id)
+    assert image_session.inference_path == "v2->v3"
+
+
+def test_get_model_scores_for_session_no_scores():
+    assert test_db.get_model_scores_for_session(-1000) == {}
+
+
+def test_img_sessions_above_threshold():
+    threshold_uuid = test_db.insert_new_user("test_threshold_email", "fname", "lname")
+    with patch("time.time", return_value=10):
+        low_session = test_db.insert_new_image_session(threshold_uuid, "low")
+    with patch("time.time", return_value=11):
+        high_session = test_db.insert_new_image_session(threshold_uuid, "high")
+
+    test_db.update_img_session_crack_detection(
+        low_session, 0, {"nmlModelV3": ("fp-old", 0.3)}
+    )
+    test_db.update_img_session_crack_detection(
+        high_session, 1, {"nmlModelV3": ("fp-new", 0.7)}
+    )
+
+    result = test_db.get_img_sessions_above_threshold("nmlModelV3", 0.5, threshold_uuid)
+    assert [res.session_id for res in result] == [high_session]
+
+    result = test_db.get_img_sessions_above_threshold("nmlModelV3", 0.2, threshold_uuid)
+    assert sorted(res.session_id for res in result) == [low_session, high_session]
+
+    result = test_db.get_img_sessions_above_threshold(
+        "nmlModelV3", 0.2, threshold_uuid, model_fingerprint="fp-old"
+    )
+    assert [res.session_id for res in result] == [low_session]
+
+    assert test_db.count_img_sessions_above_threshold("nmlModelV3", 0.5) == 1
+    assert test_db.count_img_sessions_above_threshold("nmlModelV3", 0.2) == 2
+    assert (
+        test_db.count_img_sessions_above_threshold(
+            "nmlModelV3", 0.2, model_fingerprint="fp-new"
+        )
+        == 1
+    )
+
+
+def test_delete_img_session():
+    delete_uuid = test_db.insert_new_user("test_delete_session_email", "fname", "lname")
+    session_id = test_db.insert_new_image_session(delete_uuid, "test_delete")
+    assert len(test_db.get_all_img_sessions_for_uuid(delete_uuid)) == 1
+
+    test_db.delete_img_session(session_id)
+    assert test_db.get_all_img_sessions_for_uuid(delete_uuid) == []
+
+
+def test_delete_img_session_not_existing():
+    with pytest.raises(Exception) as e:
+        test_db.delete_img_session(-1000)
+
+    assert "This image session was not found" == str(e.value)
+
+
+def test_get_engine_shared_per_file(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    first_db = nmlDB(db_path)
+    second_db = nmlDB(db_path)
+
+    assert first_db.engine is second_db.engine
+    assert first_db.session is second_db.session
+
+
+def test_get_engine_memory_not_shared():
+    assert nmlDB(":memory:").engine is not test_db.engine
+
+
+def test_session_per_thread(tmp_path):
+    db = nmlDB(str(tmp_path / "threads.db"))
+    thread_user = db.insert_new_user("test_thread_email", "fname", "lname")
+    main_session = db.session
+    thread_results = {}
+
+    def worker():
+        thread_results["session"] = db.session
+        thread_results["uuid"] = db.get_uuid_by_email("test_thread_email")
+        db.remove_session()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert thread_results["session"] is not main_session
+    assert thread_results["uuid"] == thread_user
+
+
+def test_sqlite_pragmas(tmp_path):
+    db = nmlDB(str(tmp_path / "pragmas.db"))
+    with db.engine.connect() as connection:
+        journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+        busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        synchronous = connection.exec_driver_sql("PRAGMA synchronous").scalar()
+
+    assert journal_mode == "wal"
+    assert busy_timeout == 5000
+    assert synchronous == 1  # NORMAL
+
+
+def test_checkpoint_wal(tmp_path):
+    db = nmlDB(str(tmp_path / "checkpoint.db"))
+    db.insert_new_user("test_checkpoint_email", "fname", "lname")
+
+    busy, log_pages, checkpointed_pages = db.checkpoint_wal()
+    assert busy == 0
+    assert log_pages == checkpointed_pages
+
+
+def test_queue_checkpoint_wal(tmp_path):
+    db = nmlDB(str(tmp_path / "queued_checkpoint.db"))
+    db.insert_new_user("test_queued_checkpoint_email", "fname", "lname")
+
+    busy, log_pages, checkpointed_pages = db.queue_checkpoint_wal().result()
+    assert busy == 0
+    assert log_pages == checkpointed_pages
+
+    # Runs on the writer thread, never on the caller's
+    with patch.object(
+        nmlDB, "checkpoint_wal", side_effect=lambda mode: threading.current_thread()
+    ):
+        assert db.queue_checkpoint_wal().result() is not threading.current_thread()
+
+
+def test_get_img_session_for_uuid_wrong_user():
+    assert test_db.get_img_session_for_uuid("bad-uuid", 1000) is None
+
+
+def test_get_img_session_for_uuid_not_existing():
+    assert test_db.get_img_session_for_uuid(test_uuid, -1000) is None
+
+
+def test_image_session_queries_use_index():
+    with test_db.engine.connect() as connection:
+        plan = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM image_sessions_table "
+            "WHERE user_uuid = 'test-uuid' ORDER BY date"
+        ).all()
+
+    assert "ix_image_sessions_user_uuid_date" in str(plan)
+
+
+def test_migrate_adds_indexes_to_existing_database(tmp_path):
+    db_path = str(tmp_path / "old_schema.db")
+    connection = sqlite3.connect(db_path)
+    connection.execute(
+        "CREATE TABLE users_table (user_uuid VARCHAR PRIMARY KEY, user_email VARCHAR, "
+        "first_name VARCHAR, last_name VARCHAR)"
+    )
+    connection.execute(
+        "CREATE TABLE image_sessions_table (session_id INTEGER PRIMARY KEY, date DATETIME, "
+        "image_name VARCHAR, crack_detected INTEGER, user_uuid VARCHAR)"
+    )
+    connection.commit()
+    connection.close()
+
+    db = nmlDB(db_path)
+    index_names = [
+        index["name"]
+        for index in inspect(db.engine).get_indexes("image_sessions_table")
+    ]
+    assert "ix_image_sessions_user_uuid_date" in index_names
+
+
+def test_get_img_session_dates_for_uuid():
+    dates_db = nmlDB(":memory:")
+    dates_uuid = dates_db.insert_new_user("test_dates_email", "fname", "lname")
+    for count, date in enumerate(
+        [datetime(2023, 3, 1, 9), datetime(2023, 3, 1, 17), datetime(2023, 3, 2, 8)]
+    ):
+        dates_db.session.add(ImageSession(count, date, dates_uuid, f"img{count}"))
+    dates_db.session.commit()
+
+    assert dates_db.get_img_session_dates_for_uuid(dates_uuid) == [
+        ("2023-03-01", 2),
+        ("2023-03-02", 1),
+    ]
+    assert dates_db.get_img_session_dates_for_uuid("bad-uuid") == []
+
+    result = dates_db.get_img_sessions_for_uuid_on_date(dates_uuid, "2023-03-01")
+    assert [res.session_id for res in result] == [0, 1]
+
+    result = dates_db.get_img_sessions_for_uuid_on_date(
+        dates_uuid, "2023-03-01", offset=1, limit=5
+    )
+    assert [res.session_id for res in result] == [1]
+
+    result = dates_db.get_img_sessions_for_uuid_on_date(
+        dates_uuid, "2023-03-01", offset=0, limit=1
+    )
+    assert [res.session_id for res in result] == [0]
+
+    result = dates_db.get_img_sessions_for_uuid_on_date(dates_uuid, "2023-03-03")
+    assert result == []
+
+
+@patch("time.time", return_value=1)
+def test_insert_ml_data_unique_ids_same_millisecond(time_mock):
+    ml_db = nmlDB(":memory:")
+    first_id = ml_db.insert_ml_data(ml_img_0.tobytes(), 0)
+    second_id = ml_db.insert_ml_data(ml_img_1.tobytes(), 1)
+
+    assert first_id != second_id
+    assert ml_db.get_ml_data_len() == 2
+
+
+def test_bulk_insert_ml_data():
+    ml_db = nmlDB(":memory:")
+    ml_db.insert_ml_data(ml_img_0.tobytes(), 0)
+
+    entries = ((ml_img_1.tobytes(), count % 2) for count in range(25))
+    inserted = ml_db.bulk_insert_ml_data(entries, batch_size=10)
+
+    assert inserted == 25
+    assert ml_db.get_ml_data_len() == 26
+    all_ml_data = ml_db.get_all_ml_data()
+    assert len({entry.entry_id for entry in all_ml_data}) == 26
+    assert len(ml_db.get_all_ml_data("CRACK")) == 12
+    assert np.array_equal(
+        np.frombuffer(all_ml_data[-1].img, dtype=np.uint8), ml_img_1.flatten()  # type: ignore
+    )
+
+
+def test_bulk_insert_ml_data_empty():
+    ml_db = nmlDB(":memory:")
+    assert ml_db.bulk_insert_ml_data([]) == 0
+
+
+def test_insert_ml_data_array_keeps_shape():
+    ml_db = nmlDB(":memory:")
+    img = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    ml_db.insert_ml_data(img, 1, crop="815,445,325,325", version="v3")
+
+    entry = ml_db.get_first_ml_data()
+    assert entry.shape == "3,4"
+    assert entry.dtype == "uint16"
+    assert entry.compression is None
+    assert entry.crop == "815,445,325,325"
+    assert entry.version == "v3"
+
+    after_img = entry.get_img_array()
+    assert after_img.dtype == np.uint16
+    assert np.array_equal(after_img, img)
+    # Uncompressed rows are a view on the stored bytes
+    assert not after_img.flags.owndata
+
+
+def test_insert_ml_data_compressed():
+    ml_db = nmlDB(":memory:")
+    img = np.zeros((325, 325), dtype=np.uint8)
+    ml_db.insert_ml_data(img, 0, compress=True)
+
+    entry = ml_db.get_first_ml_data()
+    assert entry.compression == "zlib"
+    assert len(entry.img) < img.nbytes
+    assert np.array_equal(entry.get_img_array(), img)
+
+
+def test_get_img_array_legacy_bytes():
+    ret = test_db.get_first_ml_data()
+    assert ret.shape is None
+    assert np.array_equal(ret.get_img_array(), ml_img_0.flatten())
+
+
+def test_bulk_insert_ml_data_arrays():
+    ml_db = nmlDB(":memory:")
+    ml_db.bulk_insert_ml_data([(ml_img_0, 0), (ml_img_1, 1)], compress=True)
+
+    arrays = [img for _, _, img in ml_db.iter_ml_data()]
+    assert np.array_equal(arrays[0], ml_img_0)
+    assert np.array_equal(arrays[1], ml_img_1)
+
+
+def test_migrate_adds_ml_data_columns(tmp_path):
+    db_path = str(tmp_path / "old_ml_schema.db")
+    connection = sqlite3.connect(db_path)
+    connection.execute(
+        "CREATE TABLE ml_data_table (entry_id INTEGER PRIMARY KEY, classifier INTEGER, img BLOB)"
+    )
+    connection.execute(
+        "INSERT INTO ml_data_table VALUES (1, 1, ?)", (ml_img_1.tobytes(),)
+    )
+    connection.commit()
+    connection.close()
+
+    db = nmlDB(db_path)
+    column_names = [
+        column["name"] for column in inspect(db.engine).get_columns("ml_data_table")
+    ]
+    for column_name in ["shape", "dtype", "compression", "crop", "version"]:
+        assert column_name in column_names
+
+    entry = db.get_first_ml_data()
+    assert np.array_equal(entry.get_img_array(), ml_img_1.flatten())
+
+
+def _relabel_test_db():
+    ml_db = nmlDB(":memory:")
+    ml_db.bulk_insert_ml_data((ml_img_0, count % 2) for count in range(10))
+    ml_db.session.execute(
+        MlData.__table__.update().where(MlData.entry_id > 5).values(version="v3")
+    )
+    ml_db.session.commit()
+    return ml_db
+
+
+def test_count_ml_data():
+    ml_db = _relabel_test_db()
+
+    assert ml_db.count_ml_data() == 10
+    assert ml_db.count_ml_data(classifier=1) == 5
+    assert ml_db.count_ml_data(start_id=3, stop_id=7) == 4
+    assert ml_db.count_ml_data(version="v3") == 5
+
+
+def test_get_ml_data_ids():
+    ml_db = _relabel_test_db()
+
+    assert ml_db.get_ml_data_ids() == list(range(1, 11))
+    assert ml_db.get_ml_data_ids(classifier=0) == [1, 3, 5, 7, 9]
+    assert ml_db.get_ml_data_ids(classifier=0, version="v3") == [7, 9]
+
+
+def test_relabel_ml_data_by_range():
+    ml_db = _relabel_test_db()
+
+    assert ml_db.relabel_ml_data(1, start_id=1, stop_id=5) == 4
+    assert ml_db.get_ml_data_ids(classifier=1) == [1, 2, 3, 4, 6, 8, 10]
+
+
+def test_relabel_ml_data_by_predicate():
+    ml_db = _relabel_test_db()
+
+    assert ml_db.relabel_ml_data(2, classifier=1, version="v3") == 3
+    assert ml_db.get_ml_data_ids(classifier=2) == [6, 8, 10]
+
+
+def test_relabel_ml_data_by_ids():
+    ml_db = _relabel_test_db()
+
+    assert ml_db.relabel_ml_data(1, entry_ids=[1, 3, 2000]) == 2
+    assert ml_db.count_ml_data(classifier=1) == 7
+    assert ml_db.relabel_ml_data(1, entry_ids=[]) == 0
+
+    # Long id lists are split under the SQLite parameter limit
+    assert ml_db.relabel_ml_data(3, entry_ids=range(1, 5000)) == 10
+
+
+def test_change_ml_data_class_label():
+    ml_db = _relabel_test_db()
+
+    ml_db.change_ml_data_class_label(2, 5, 7)
+    assert ml_db.get_ml_data_ids(classifier=7) == [3, 4, 5]
+
+
+def test_change_ml_data_class_label_not_existing():
+    ml_db = _relabel_test_db()
+
+    with pytest.raises(Exception) as e:
+        ml_db.change_ml_data_class_label(20, 30, 1)
+
+    assert "This image session was not found" == str(e.value)
@@ -0,0 +1,115 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from src.utils.database import nmlDB, ImageSession
+from src.utils.db_writer import DatabaseWriter
+
+
+def _add_session(session_id, uuid):
+    def write(session):
+        session.add(ImageSession(session_id, datetime.now(), uuid, ""))
+        return session_id
+
+    return write
+
+
+def _fail(session):
+    raise ValueError("bad write")
+
+
+def test_writer_groups_queued_writes(tmp_path):
+    db = nmlDB(str(tmp_path / "writer_group.db"))
+    uuid = db.insert_new_user("test.writer.group@email.com", "first", "last")
+
+    writer = DatabaseWriter(db.engine)
+    batch_sizes = []
+    apply_batch = writer._apply
+
+    def record_apply(session, batch):
+        batch_sizes.append(len(batch))
+        apply_batch(session, batch)
+
+    writer._apply = record_apply
+
+    # Queued before the thread starts, so they all go in one transaction
+    futures = [writer.submit(_add_session(i, uuid)) for i in range(1, 21)]
+    writer.start()
+    writer.flush()
+
+    assert [future.result() for future in futures] == list(range(1, 21))
+    assert batch_sizes[0] == 20
+    assert len(db.get_all_img_sessions_for_uuid(uuid)) == 20
+
+    writer.stop()
+    assert not writer.is_alive()
+
+
+def test_writer_failure_only_fails_its_intent(tmp_path):
+    db = nmlDB(str(tmp_path / "writer_fail.db"))
+    uuid = db.insert_new_user("test.writer.fail@email.com", "first", "last")
+
+    writer = DatabaseWriter(db.engine)
+    good_1 = writer.submit(_add_session(1, uuid))
+    bad = writer.submit(_fail)
+    good_2 = writer.submit(_add_session(2, uuid))
+    writer.start()
+
+    assert good_1.result() == 1
+    assert good_2.result() == 2
+    with pytest.raises(ValueError):
+        bad.result()
+    assert len(db.get_all_img_sessions_for_uuid(uuid)) == 2
+
+    writer.stop()
+
+
+def test_writer_stop_commits_queued_writes(tmp_path):
+    db = nmlDB(str(tmp_path / "writer_stop.db"))
+    uuid = db.insert_new_user("test.writer.stop@email.com", "first", "last")
+
+    writer = DatabaseWriter(db.engine)
+    writer.start()
+    futures = [writer.submit(_add_session(i, uuid)) for i in range(1, 6)]
+    writer.stop()
+
+    assert all(future.done() for future in futures)
+    assert len(db.get_all_img_sessions_for_uuid(uuid)) == 5
+
+
+def test_nmlDB_queued_writes(tmp_path):
+    db = nmlDB(str(tmp_path / "writer_nmldb.db"))
+    uuid = db.insert_new_user("test.writer.nmldb@email.com", "first", "last")
+
+    for i in range(1, 11):
+        with patch("time.time", return_value=i):
+            db.insert_new_image_session(uuid, f"img-{i}", wait=False)
+    db.update_img_session_crack_detection(
+        10000, 1, {"nmlModelV2": ("abc", 0.9)}, wait=False
+    )
+    db.flush_writes()
+
+    assert len(db.get_all_img_sessions_for_uuid(uuid)) == 10
+    assert db.get_img_session_for_uuid(uuid, 10000).crack_detected == 1
+    assert db.get_model_scores_for_session(10000) == {"nmlModelV2": 0.9}
+
+    # Errors still reach the caller when it waits
+    with pytest.raises(Exception) as e:
+        db.delete_img_session(123)
+    assert str(e.value) == "This image session was not found"
+    db.delete_img_session(10000)
+    assert db.get_img_session_for_uuid(uuid, 10000) is None
+
+
+def test_nmlDB_reports_failed_queued_writes(tmp_path):
+    db = nmlDB(str(tmp_path / "writer_report.db"))
+    failures = []
+    db.on_write_failure = lambda description, e: failures.append((description, str(e)))
+
+    db.delete_img_session(123, wait=False)
+    db.flush_writes()
+
+    assert failures == [
+        ("Deleting image session 123", "This image session was not found")
+    ]
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+from src.utils.image_cache import LRUCache, ScanImageLoadTask, load_scaled_image
+
+
+def test_lru_cache_get_put():
+    cache = LRUCache(100, len)
+    cache.put((1, "normal"), "a" * 10)
+
+    assert cache.get((1, "normal")) == "a" * 10
+    assert cache.get((1, "precise")) is None
+    assert (1, "normal") in cache
+    assert cache.total_bytes == 10
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(30, len)
+    cache.put(1, "a" * 10)
+    cache.put(2, "b" * 10)
+    cache.put(3, "c" * 10)
+
+    # 1 was used last, so 2 goes first
+    cache.get(1)
+    cache.put(4, "d" * 10)
+
+    assert 2 not in cache
+    assert all(key in cache for key in (1, 3, 4))
+    assert cache.total_bytes == 30
+
+
+def test_lru_cache_replace_and_oversized():
+    cache = LRUCache(30, len)
+    cache.put(1, "a" * 10)
+    cache.put(1, "a" * 20)
+    assert len(cache) == 1
+    assert cache.total_bytes == 20
+
+    # A value bigger than the cap is still kept on its own
+    cache.put(2, "b" * 50)
+    assert len(cache) == 1
+    assert cache.get(2) == "b" * 50
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.total_bytes == 0
+
+
+def test_load_scaled_image(tmp_path):
+    img_path = str(tmp_path / "1-normal.jpg")
+    cv2.imwrite(img_path, np.full((300, 325, 3), 128, dtype=np.uint8))
+
+    image = load_scaled_image(img_path, 400)
+
+    assert not image.isNull()
+    assert (image.width(), image.height()) == (400, 400)
+
+
+def test_load_scaled_image_missing(tmp_path):
+    assert load_scaled_image(str(tmp_path / "missing.jpg")).isNull()
+
+
+def test_scan_image_load_task(tmp_path):
+    img_path = str(tmp_path / "1-cropped.jpg")
+    cv2.imwrite(img_path, np.full((300, 325, 3), 128, dtype=np.uint8))
+
+    results = []
+    task = ScanImageLoadTask(img_path, (1, "cropped"), 7)
+    task.signals.finished.connect(lambda *result: results.append(result))
+    task.run()
+
+    key, generation, image = results[0]
+    assert key == (1, "cropped")
+    assert generation == 7
+    assert (image.width(), image.height()) == (400, 400)
@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+
+from src.utils.image_stitcher import (
+    IncrementalStitcher,
+    frame_shift,
+    image_stitch,
+    iter_keyframes,
+    iter_video_frames,
+    motion_frame,
+)
+
+
+def textured_scene(h=240, w=1200):
+    rng = np.random.default_rng(0)
+    scene = rng.integers(0, 255, (h // 8, w // 8), dtype=np.uint8)
+    return cv2.resize(scene, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def pan(scene, step, count, w=320):
+    return [scene[:, i * step : i * step + w].copy() for i in range(count)]
+
+
+def test_frame_shift():
+    frames = pan(textured_scene(), 12, 2)
+    dx, dy = frame_shift(motion_frame(frames[0], 1), motion_frame(frames[1], 1))
+    assert abs(dx) == pytest.approx(12, abs=0.5)
+    assert dy == pytest.approx(0, abs=0.5)
+
+
+def test_iter_keyframes_by_overlap():
+    frames = pan(textured_scene(), 16, 40)
+    keyframes = list(iter_keyframes(frames, min_overlap=0.6, scale=0.5))
+
+    # Overlap drops below 60% after 128px of motion, every 9th frame
+    kept = [next(i for i, f in enumerate(frames) if f is k) for k in keyframes]
+    assert kept[0] == 0
+    assert kept[-1] == 39
+    steps = np.diff(kept[:-1])
+    assert all(8 <= step <= 10 for step in steps)
+
+
+def test_iter_keyframes_still_camera():
+    frame = pan(textured_scene(), 0, 1)[0]
+    keyframes = list(iter_keyframes([frame] * 10))
+    assert len(keyframes) == 1
+
+
+def test_iter_video_frames_missing_video(tmp_path):
+    assert list(iter_video_frames(str(tmp_path / "missing.avi"))) == []
+
+
+@patch("src.utils.image_stitcher.stitch_frames", return_value=None)
+@patch("cv2.imread", side_effect=lambda path: path)
+def test_image_stitch_sorted(imread_mock, stitch_frames_mock, tmp_path):
+    for i in (10, 2, 1, 0):
+        open(tmp_path / f"frame_{str(i).zfill(2)}.jpg", "w").close()
+
+    image_stitch(2, str(tmp_path))
+
+    stitch_frames_mock.assert_called_once_with(
+        [str(tmp_path / "frame_00.jpg"), str(tmp_path / "frame_02.jpg")]
+    )
+
+
+def blocky_scene(h=480, w=2000):
+    # Sharp corners for ORB, a smooth scene has too few features
+    rng = np.random.default_rng(1)
+    scene = rng.integers(0, 255, (h // 8, w // 8), dtype=np.uint8)
+    scene = cv2.resize(scene, (w, h), interpolation=cv2.INTER_NEAREST)
+    return cv2.GaussianBlur(scene, (0, 0), 1.5)
+
+
+def test_incremental_stitcher_pan():
+    scene = blocky_scene()
+    stitcher = IncrementalStitcher(scale=0.5)
+    for i in range(0, 1360, 20):
+        stitcher.add(scene[:, i : i + 640].copy())
+    stitcher.finish()
+
+    assert stitcher.dropped == 0
+    # Only frames that overlap the last keyframe less than 60% are drawn
+    assert 4 <= stitcher.keyframes <= 8
+
+    panorama = stitcher.panorama()
+    assert abs(panorama.shape[1] - 1980) <= 4
+    assert abs(panorama.shape[0] - 480) <= 4
+    h, w = min(panorama.shape[0], 480), min(panorama.shape[1], 1980)
+    assert np.abs(panorama[:h, :w].astype(int) - scene[:h, :w]).mean() < 10
+
+
+def test_incremental_stitcher_drops_unregistered_frames():
+    scene = blocky_scene()
+    stitcher = IncrementalStitcher(scale=0.5)
+    assert stitcher.add(scene[:, :640].copy())
+    assert not stitcher.add(np.zeros((480, 640), dtype=np.uint8))
+    assert stitcher.dropped == 1
+
+    # The panorama carries on from the last keyframe
+    assert stitcher.add(scene[:, 400:1040].copy())
+    assert stitcher.keyframes == 2
+
+
+def test_incremental_stitcher_canvas_limit():
+    scene = blocky_scene()
+    stitcher = IncrementalStitcher(scale=0.5, max_canvas_mp=0.4)
+    assert stitcher.add(scene[:, :640].copy())
+    assert not stitcher.add(scene[:, 400:1040].copy())
+    assert stitcher.dropped == 1
+    assert stitcher.panorama().shape == (480, 640)
+
+
+def test_incremental_stitcher_empty():
+    stitcher = IncrementalStitcher()
+    stitcher.finish()
+    assert stitcher.panorama() is None
+
+
+def test_incremental_stitcher_featureless_first_frame():
+    scene = blocky_scene()
+    stitcher = IncrementalStitcher(scale=0.5)
+    # Nothing to register later frames against, so it is not the reference
+    assert not stitcher.add(np.zeros((480, 640), dtype=np.uint8))
+    assert stitcher.dropped == 1
+
+    assert stitcher.add(scene[:, :640].copy())
+    assert stitcher.add(scene[:, 400:1040].copy())
+    assert stitcher.keyframes == 2
+
+
+def test_incremental_stitcher_match_error_drops_frame():
+    scene = blocky_scene()
+    stitcher = IncrementalStitcher(scale=0.5)
+    assert stitcher.add(scene[:, :640].copy())
+
+    stitcher.matcher = Mock()
+    stitcher.matcher.match.side_effect = cv2.error("batchDistance")
+    assert not stitcher.add(scene[:, 400:1040].copy())
+    assert stitcher.dropped == 1
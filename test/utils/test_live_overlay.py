@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+from unittest.mock import patch
+
+from src.utils.live_overlay import (
+    OVERLAY_COLOR,
+    LiveOverlayScheduler,
+    fast_crack_mask,
+    mask_to_overlay,
+)
+
+
+def test_fast_crack_mask_finds_line():
+    roi = np.full((325, 325), 120, dtype=np.uint8)
+    cv2.line(roi, (20, 160), (300, 170), 30, 3)
+
+    mask = fast_crack_mask(roi, sensitivity=6, scale=0.5)
+
+    assert mask.shape == (162, 162)
+    assert mask.dtype == np.uint8
+    assert np.count_nonzero(mask[70:95, 5:155]) > 0
+    # Flat areas stay empty
+    assert np.count_nonzero(mask[:40]) == 0
+
+
+def test_mask_to_overlay():
+    mask = np.zeros((4, 4), dtype=np.uint8)
+    mask[1, 2] = 255
+
+    overlay = mask_to_overlay(mask)
+
+    assert overlay.shape == (4, 4, 4)
+    assert tuple(overlay[1, 2]) == OVERLAY_COLOR
+    assert overlay[0, 0, 3] == 0
+
+
+@patch("src.utils.live_overlay.QThreadPool.start")
+def test_scheduler_skips_frames(mock_start):
+    scheduler = LiveOverlayScheduler(interval_ms=0)
+    frame = np.zeros((1920, 1080), dtype=np.uint8)
+
+    assert scheduler.submit(frame) == True
+    # Previous frame is still being analyzed
+    assert scheduler.submit(frame) == False
+    assert mock_start.call_count == 1
+
+    scheduler._task_finished(0, mask_to_overlay(np.zeros((162, 162), dtype=np.uint8)))
+    assert scheduler.overlay_image.width() == 162
+    assert scheduler.submit(frame) == True
+
+    scheduler.clear()
+    assert scheduler.overlay_image is None
+
+
+@patch("src.utils.live_overlay.QThreadPool.start")
+def test_scheduler_rate_limit(mock_start):
+    scheduler = LiveOverlayScheduler(interval_ms=10000)
+    frame = np.zeros((1920, 1080), dtype=np.uint8)
+
+    assert scheduler.submit(frame) == True
+    scheduler._task_finished(0, mask_to_overlay(np.zeros((2, 2), dtype=np.uint8)))
+    # Finished, but the interval did not pass yet
+    assert scheduler.submit(frame) == False
+
+
+@patch("src.utils.live_overlay.QThreadPool.start")
+def test_scheduler_drops_overlay_finished_after_clear(mock_start):
+    scheduler = LiveOverlayScheduler(interval_ms=0)
+    frame = np.zeros((1920, 1080), dtype=np.uint8)
+
+    assert scheduler.submit(frame) == True
+    (task,), _ = mock_start.call_args
+    # The overlay is turned off while the frame is being analyzed
+    scheduler.clear()
+    scheduler._task_finished(
+        task.generation, mask_to_overlay(np.zeros((2, 2), dtype=np.uint8))
+    )
+
+    assert scheduler.overlay_image is None
+    assert scheduler.busy == False
+    assert scheduler.submit(frame) == True
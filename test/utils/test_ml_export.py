@@ -0,0 +1,49 @@
+import json
+import numpy as np
+
+from src.utils.database import nmlDB
+from src.utils.ml_export import export_ml_data_shards, load_ml_shards
+
+test_db = nmlDB(":memory:")
+test_small_imgs = [np.full((3, 3), count, dtype=np.uint8) for count in range(5)]
+test_large_img = np.arange(16, dtype=np.uint8).reshape(4, 4)
+
+for count, img in enumerate(test_small_imgs):
+    test_db.insert_ml_data(img.tobytes(), count % 2)
+test_db.insert_ml_data(test_large_img, 1, compress=True)
+
+
+def test_iter_ml_data():
+    rows = list(test_db.iter_ml_data(batch_size=2))
+    assert len(rows) == 6
+    assert [classifier for _, classifier, _ in rows] == [0, 1, 0, 1, 0, 1]
+
+    crack_rows = list(test_db.iter_ml_data("CRACK"))
+    assert len(crack_rows) == 3
+
+
+def test_export_ml_data_shards(tmp_path):
+    manifest = export_ml_data_shards(test_db, str(tmp_path), shard_size=2)
+
+    assert manifest["total_rows"] == 6
+    assert [shard["rows"] for shard in manifest["shards"]] == [2, 2, 1, 1]
+    assert [shard["shape"] for shard in manifest["shards"]] == [[9], [9], [9], [4, 4]]
+    assert {shard["dtype"] for shard in manifest["shards"]} == {"uint8"}
+
+    with open(tmp_path / "manifest.json") as f:
+        assert json.load(f) == manifest
+
+
+def test_load_ml_shards(tmp_path):
+    export_ml_data_shards(test_db, str(tmp_path), shard_size=2)
+    shards = load_ml_shards(str(tmp_path))
+
+    data = np.concatenate([data for data, _ in shards[:3]])
+    labels = np.concatenate([labels for _, labels in shards[:3]])
+    assert isinstance(shards[0][0], np.memmap)
+    assert np.array_equal(data, np.array([img.flatten() for img in test_small_imgs]))
+    assert list(labels) == [0, 1, 0, 1, 0]
+
+    large_data, large_labels = shards[3]
+    assert np.array_equal(large_data[0], test_large_img)
+    assert list(large_labels) == [1]
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import Mock
+
+from src.utils.panorama import PanoramaThread
+from src.utils.tile_pyramid import load_tile_pyramid
+
+
+def test_offer_drops_frames_when_full():
+    panorama_thread = PanoramaThread("panorama", queue_size=2)
+    frame = np.zeros((4, 4), dtype=np.uint8)
+
+    assert panorama_thread.offer(frame)
+    assert panorama_thread.offer(frame)
+    assert not panorama_thread.offer(frame)
+    assert panorama_thread.frame_queue.qsize() == 2
+
+
+def test_run_stitches_queued_frames(tmp_path):
+    rng = np.random.default_rng(1)
+    scene = rng.integers(0, 255, (60, 125), dtype=np.uint8)
+    scene = cv2.resize(scene, (1000, 480), interpolation=cv2.INTER_NEAREST)
+
+    output_dir = str(tmp_path / "panorama" / "1")
+    panorama_thread = PanoramaThread(output_dir, queue_size=10)
+    panorama_thread.progress_signal = Mock()
+    panorama_thread.panorama_saved_signal = Mock()
+    for i in range(0, 400, 50):
+        panorama_thread.offer(scene[:, i : i + 600].copy())
+
+    # Stopped before it ran, the queued frames are still stitched
+    panorama_thread.stop()
+    panorama_thread.run()
+
+    assert panorama_thread.frame_queue.empty()
+    panorama_thread.progress_signal.emit.assert_called()
+    panorama_thread.panorama_saved_signal.emit.assert_called_once_with(output_dir)
+    assert load_tile_pyramid(output_dir)["width"] >= 900
+
+
+def test_run_without_frames():
+    panorama_thread = PanoramaThread("unused")
+    panorama_thread.panorama_saved_signal = Mock()
+    panorama_thread.stop()
+    panorama_thread.run()
+
+    panorama_thread.panorama_saved_signal.emit.assert_called_once_with("")
+
+
+def test_run_always_announces_the_end():
+    panorama_thread = PanoramaThread("unused")
+    panorama_thread.panorama_saved_signal = Mock()
+    panorama_thread.stitcher = Mock()
+    panorama_thread.stitcher.add.side_effect = ValueError("stitching failed")
+    panorama_thread.offer(np.zeros((4, 4), dtype=np.uint8))
+    panorama_thread.stop()
+
+    with pytest.raises(ValueError):
+        panorama_thread.run()
+    # The GUI gives the panorama button back
+    panorama_thread.panorama_saved_signal.emit.assert_called_once_with("")
@@ -0,0 +1,95 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from src.utils.database import nmlDB
+from src.utils.past_scans_model import (
+    PastScanRecord,
+    PastScanDatesModel,
+    PastScanSessionsModel,
+)
+
+test_db = nmlDB(":memory:")
+test_uuid = test_db.insert_new_user("test.past.scans@email.com", "first", "last")
+for i in range(1, 8):
+    with patch("time.time", return_value=i):
+        test_db.insert_new_image_session(test_uuid, f"tooth_{i}")
+test_date = str(test_db.get_all_img_sessions_for_uuid(test_uuid)[0].date.date())
+
+
+def test_past_scan_record_display_text():
+    record = PastScanRecord(1000, datetime(2023, 3, 1), 1, "upper_left_molar")
+
+    assert record.crack_status == "CRACK"
+    assert record.display_text == "1000_CRACK_upper_left_molar"
+    assert PastScanRecord(1000, datetime(2023, 3, 1), None, "").crack_status == ""
+
+
+def test_past_scan_dates_model():
+    model = PastScanDatesModel()
+    model.set_dates([("2023-03-01", 1), ("2023-03-02", 4)])
+
+    assert model.rowCount() == 2
+    assert "2023-03-02" in model
+    assert model.data(model.index(0)) == "2023-03-01 (1 scan)"
+    assert model.data(model.index(1)) == "2023-03-02 (4 scans)"
+
+    # A new session on a listed date only updates its count
+    assert model.add_date("2023-03-02") == False
+    assert model.count_on("2023-03-02") == 5
+    assert model.add_date("2023-03-03") == True
+    assert model.rowCount() == 3
+    assert model.date_at(2) == "2023-03-03"
+    assert model.data(model.index(2)) == "2023-03-03 (1 scan)"
+
+
+def test_past_scan_sessions_model_fetch_more():
+    model = PastScanSessionsModel(test_db, page_size=3)
+    model.set_query(test_uuid, test_date)
+
+    # Only the first page is loaded
+    assert model.rowCount() == 3
+    assert model.canFetchMore() == True
+
+    model.fetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 7
+    assert model.canFetchMore() == False
+    assert [model.record_at(row).session_id for row in range(7)] == [
+        1000 * i for i in range(1, 8)
+    ]
+    # Underscores in the image name are kept
+    assert model.record_at(0).image_name == "tooth_1"
+    assert model.data(model.index(0)) == "1000__tooth_1"
+
+
+def test_past_scan_sessions_model_add_session():
+    model = PastScanSessionsModel(test_db, page_size=3)
+    model.set_query(test_uuid, test_date)
+    new_record = PastScanRecord(9000, datetime.fromisoformat(test_date), 1, "new")
+
+    # Still paging, the new session comes with its page
+    assert model.add_session(new_record) == False
+    assert model.rowCount() == 3
+
+    model.fetchMore()
+    model.fetchMore()
+    assert model.add_session(new_record) == True
+    assert model.rowCount() == 8
+
+    # Already listed, updated in place
+    updated_record = PastScanRecord(1000, datetime.fromisoformat(test_date), 0, "")
+    assert model.add_session(updated_record) == True
+    assert model.rowCount() == 8
+    assert model.record_at(0).crack_detected == 0
+
+    # Another date is not shown
+    other_record = PastScanRecord(9001, datetime(2000, 1, 1), 1, "")
+    assert model.add_session(other_record) == False
+
+
+def test_past_scan_sessions_model_no_date():
+    model = PastScanSessionsModel(test_db)
+    model.set_query(test_uuid, None)
+
+    assert model.rowCount() == 0
+    assert model.canFetchMore() == False
@@ -0,0 +1,51 @@
+import numpy as np
+from PyQt5.QtGui import QImage
+
+from src.utils.preview import PreviewRenderer
+
+
+def test_render_grayscale_scaled():
+    renderer = PreviewRenderer((450, 800))
+    frame = np.full((1920, 1080), 200, dtype=np.uint8)
+
+    image = renderer.render(frame)
+
+    assert image.format() == QImage.Format_Grayscale8
+    assert (image.width(), image.height()) == (450, 800)
+    assert image.pixelColor(10, 10).red() == 200
+
+
+def test_render_reuses_buffer():
+    renderer = PreviewRenderer((450, 800))
+    frame = np.zeros((1920, 1080), dtype=np.uint8)
+
+    renderer.render(frame)
+    buffer = renderer._buffer
+    renderer.render(frame)
+
+    assert renderer._buffer is buffer
+
+
+def test_render_without_scaling_wraps_frame():
+    renderer = PreviewRenderer()
+    frame = np.zeros((640, 480), dtype=np.uint8)
+    frame[0, 0] = 255
+
+    image = renderer.render(frame)
+
+    assert (image.width(), image.height()) == (480, 640)
+    assert image.pixelColor(0, 0).red() == 255
+    # Nothing was copied or scaled
+    assert renderer._buffer is None
+
+
+def test_render_bgr():
+    renderer = PreviewRenderer((45, 80))
+    frame = np.zeros((1920, 1080, 3), dtype=np.uint8)
+    frame[:, :, 2] = 255
+
+    image = renderer.render(frame)
+
+    assert image.format() == QImage.Format_BGR888
+    assert image.pixelColor(5, 5).red() == 255
+    assert image.pixelColor(5, 5).blue() == 0
@@ -0,0 +1,55 @@
+import numpy as np
+
+from src.utils.quality import assess_capture_quality, crop_roi, roi_box
+
+# Sharp checkerboard texture filling the whole beta frame
+test_sharp_frame = np.kron(
+    (np.indices((96, 54)).sum(axis=0) % 2).astype(np.uint8),
+    np.ones((20, 20), dtype=np.uint8),
+)
+test_sharp_frame = (test_sharp_frame * 100 + 60).astype(np.uint8)
+
+
+def test_crop_roi():
+    assert crop_roi(test_sharp_frame).shape == (325, 325)
+
+
+def test_assess_capture_quality_passed():
+    quality = assess_capture_quality(test_sharp_frame)
+
+    assert quality.passed
+    assert quality.reasons == []
+    assert quality.saturation == 0
+    assert quality.roi_coverage == 1
+
+
+def test_assess_capture_quality_blurry_and_dark():
+    quality = assess_capture_quality(np.full((1920, 1080), 25, dtype=np.uint8))
+
+    assert not quality.passed
+    assert "image is blurry" in quality.reasons
+    assert "image is too dark" in quality.reasons
+
+
+def test_assess_capture_quality_saturated():
+    frame = test_sharp_frame.copy()
+    frame[815:1140, 445:770] = 255
+    quality = assess_capture_quality(frame)
+
+    assert "image is saturated" in quality.reasons
+    assert "image is too bright" in quality.reasons
+
+
+def test_assess_capture_quality_color_frame():
+    frame = np.dstack([test_sharp_frame] * 3)
+    assert assess_capture_quality(frame).passed
+
+
+def test_assess_capture_quality_small_frame():
+    quality = assess_capture_quality(np.zeros((100, 100), dtype=np.uint8))
+    assert not quality.passed
+
+
+def test_roi_box():
+    assert roi_box(False) == (245, 187, 158, 158)
+    assert roi_box(True) == (815, 445, 325, 325)
@@ -0,0 +1,71 @@
+import os
+from unittest.mock import patch
+
+from src.utils.database import nmlDB
+from src.utils.reanalyze import (
+    load_checkpoint,
+    save_checkpoint,
+    get_pending_sessions,
+    reanalyze_sessions,
+)
+
+fingerprints = {"nmlModelV2": "fp-v2", "nmlModelV3": "fp-v3"}
+
+test_db = nmlDB(":memory:")
+test_uuid = test_db.insert_new_user("test.reanalyze@email.com", "first", "last")
+with patch("time.time", return_value=1):
+    test_session_1 = test_db.insert_new_image_session(test_uuid, "one")
+with patch("time.time", return_value=2):
+    test_session_2 = test_db.insert_new_image_session(test_uuid, "two")
+
+
+def test_load_checkpoint_missing(tmp_path):
+    assert load_checkpoint(str(tmp_path / "missing.json"), fingerprints) == set()
+
+
+def test_save_load_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    save_checkpoint(checkpoint_path, {3, 1, 2}, fingerprints)
+
+    assert load_checkpoint(checkpoint_path, fingerprints) == {1, 2, 3}
+    assert not os.path.exists(f"{checkpoint_path}.tmp")
+
+
+def test_load_checkpoint_other_models(tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    save_checkpoint(checkpoint_path, {1, 2}, fingerprints)
+
+    # A new model release scores every session again
+    new_fingerprints = {**fingerprints, "nmlModelV3": "fp-v3-new"}
+    assert load_checkpoint(checkpoint_path, new_fingerprints) == set()
+
+
+@patch("os.path.isfile", return_value=True)
+def test_get_pending_sessions(isfile_mock):
+    pending = get_pending_sessions(test_db, set())
+    assert pending == [(test_uuid, test_session_1), (test_uuid, test_session_2)]
+
+
+@patch("os.path.isfile", return_value=True)
+def test_get_pending_sessions_skips_completed(isfile_mock):
+    pending = get_pending_sessions(test_db, {test_session_1})
+    assert pending == [(test_uuid, test_session_2)]
+
+
+@patch("os.path.isfile", return_value=False)
+def test_get_pending_sessions_skips_missing_raw(isfile_mock):
+    assert get_pending_sessions(test_db, set()) == []
+
+
+@patch("src.utils.reanalyze.get_model_fingerprints", return_value=fingerprints)
+def test_reanalyze_sessions_removes_finished_checkpoint(fingerprints_mock, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    save_checkpoint(checkpoint_path, {1}, fingerprints)
+
+    # No session has a raw image, so there is nothing left to do
+    analyzed = reanalyze_sessions(
+        str(tmp_path / "reanalyze.db"), workers=1, checkpoint_path=checkpoint_path
+    )
+
+    assert analyzed == 0
+    assert not os.path.exists(checkpoint_path)
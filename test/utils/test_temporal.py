@@ -0,0 +1,70 @@
+import pytest
+
+from src.utils.temporal import aggregate_cascade_results
+
+
+def v2_result(probability):
+    return (
+        1 if probability >= 0.8 else 0,
+        {"nmlModelV2": ("fp-v2", probability)},
+        "v2",
+    )
+
+
+def test_aggregate_cascade_results_mean():
+    results = [v2_result(0.9), v2_result(0.7), v2_result(0.1)]
+    verdict, model_scores, path, confidence = aggregate_cascade_results(results)
+
+    assert verdict == 1
+    assert model_scores["nmlModelV2"][0] == "fp-v2"
+    assert model_scores["nmlModelV2"][1] == pytest.approx(0.5667, abs=1e-3)
+    assert path == "v2 x3"
+    # The mean crack probability, only one of the frames was a crack on its own
+    assert confidence == pytest.approx(0.5667, abs=1e-3)
+
+
+def test_aggregate_cascade_results_mean_uses_highest_model():
+    escalated = (
+        1,
+        {"nmlModelV2": ("fp-v2", 0.4), "nmlModelV3": ("fp-v3", 0.9)},
+        "v2->v3",
+    )
+    results = [escalated, v2_result(0.3)]
+    verdict, model_scores, path, confidence = aggregate_cascade_results(results)
+
+    # (0.9 + 0.3) / 2 is a crack, (0.4 + 0.3) / 2 alone would not be
+    assert verdict == 1
+    assert model_scores["nmlModelV2"] == ("fp-v2", pytest.approx(0.35))
+    assert model_scores["nmlModelV3"] == ("fp-v3", pytest.approx(0.9))
+    assert path == "v2->v3 x2"
+    assert confidence == pytest.approx(0.6)
+
+
+def test_aggregate_cascade_results_mean_no_crack():
+    verdict, _, _, confidence = aggregate_cascade_results(
+        [v2_result(0.1), v2_result(0.2)]
+    )
+    assert verdict == 0
+    assert confidence == pytest.approx(0.85)
+
+
+def test_aggregate_cascade_results_vote():
+    results = [v2_result(0.9), v2_result(0.1), v2_result(0.2)]
+    verdict, _, _, confidence = aggregate_cascade_results(results, "vote")
+    assert verdict == 0
+    assert confidence == pytest.approx(2 / 3)
+
+    # A tie is a crack
+    verdict, _, _, confidence = aggregate_cascade_results(results[:2], "vote")
+    assert verdict == 1
+    assert confidence == 0.5
+
+
+def test_aggregate_cascade_results_invalid():
+    with pytest.raises(ValueError) as e_info:
+        aggregate_cascade_results([])
+    assert "No frames" in str(e_info.value)
+
+    with pytest.raises(ValueError) as e_info:
+        aggregate_cascade_results([v2_result(0.9)], "median")
+    assert "Unknown aggregation" in str(e_info.value)
@@ -0,0 +1,46 @@
+import os
+import cv2
+import numpy as np
+
+from src.utils.tile_pyramid import (
+    get_tile_path,
+    load_tile_pyramid,
+    write_tile_pyramid,
+)
+
+
+def test_write_tile_pyramid(tmp_path):
+    image = np.arange(600 * 1000, dtype=np.uint32).reshape(600, 1000)
+    image = (image % 251).astype(np.uint8)
+    pyramid_dir = str(tmp_path / "pyramid")
+
+    pyramid = write_tile_pyramid(image, pyramid_dir, tile_size=256, ext="png")
+
+    assert pyramid == load_tile_pyramid(pyramid_dir)
+    assert (pyramid["width"], pyramid["height"]) == (1000, 600)
+    assert [(level["width"], level["height"]) for level in pyramid["levels"]] == [
+        (1000, 600),
+        (500, 300),
+        (250, 150),
+    ]
+    assert [(level["columns"], level["rows"]) for level in pyramid["levels"]] == [
+        (4, 3),
+        (2, 2),
+        (1, 1),
+    ]
+    assert len(os.listdir(os.path.join(pyramid_dir, "0"))) == 12
+
+    # Full resolution tiles are cut straight from the image, edge tiles are smaller
+    tile = cv2.imread(get_tile_path(pyramid_dir, 0, 1, 2, "png"), cv2.IMREAD_GRAYSCALE)
+    assert np.array_equal(tile, image[512:600, 256:512])
+    tile = cv2.imread(get_tile_path(pyramid_dir, 0, 3, 0, "png"), cv2.IMREAD_GRAYSCALE)
+    assert tile.shape == (256, 1000 - 768)
+
+
+def test_write_tile_pyramid_single_tile(tmp_path):
+    image = np.zeros((100, 80, 3), dtype=np.uint8)
+    pyramid = write_tile_pyramid(image, str(tmp_path))
+
+    assert len(pyramid["levels"]) == 1
+    assert pyramid["format"] == "jpg"
+    assert os.path.isfile(get_tile_path(str(tmp_path), 0, 0, 0))
@@ -0,0 +1,58 @@
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+from src.utils.tile_pyramid import write_tile_pyramid
+from src.utils.tiled_viewer import TiledImageViewer
+
+app = QApplication.instance() or QApplication([])
+
+
+def make_viewer(tmp_path):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (2048, 4096), dtype=np.uint8)
+    pyramid_dir = str(tmp_path / "pyramid")
+    write_tile_pyramid(image, pyramid_dir, tile_size=256)
+
+    viewer = TiledImageViewer()
+    viewer.resize(512, 256)
+    viewer.show()
+    viewer.open_pyramid(pyramid_dir)
+    return viewer
+
+
+def test_open_pyramid_shows_a_coarse_level(tmp_path):
+    viewer = make_viewer(tmp_path)
+
+    # Fitted, the 4096 px wide image is shown a few hundred pixels wide
+    assert viewer.level >= 2
+    assert viewer.pyramid["levels"][viewer.level]["width"] >= viewer.viewport().width()
+    # The whole image is in view
+    level_info = viewer.pyramid["levels"][viewer.level]
+    assert len(viewer._tiles) == level_info["columns"] * level_info["rows"]
+    assert len(viewer.scene().items()) == len(viewer._tiles)
+
+
+def test_zoom_loads_only_visible_tiles(tmp_path):
+    viewer = make_viewer(tmp_path)
+    viewer.zoom(1 / viewer.transform().m11())
+
+    # Full resolution, the view covers a handful of the 16x8 tiles
+    assert viewer.level == 0
+    columns = viewer.viewport().width() // 256 + 2
+    rows = viewer.viewport().height() // 256 + 2
+    assert 0 < len(viewer._tiles) <= columns * rows
+    assert len(viewer.scene().items()) == len(viewer._tiles)
+    assert viewer.visible_tiles(0) == set(viewer._tiles)
+
+
+def test_pan_swaps_tiles(tmp_path):
+    viewer = make_viewer(tmp_path)
+    viewer.zoom(1 / viewer.transform().m11())
+    before = set(viewer._tiles)
+
+    viewer.horizontalScrollBar().setValue(viewer.horizontalScrollBar().maximum())
+    after = set(viewer._tiles)
+
+    assert before != after
+    assert max(column for column, _ in after) == 15
+    assert len(viewer.scene().items()) == len(after)